@@ -0,0 +1,300 @@
+"""
+Fixtures locales para los benchmarks: mercado sintético determinístico y dobles
+de yfinance, FMP (requests.Session) y Supabase (query builder de PostgREST).
+Nada sale a la red; `latency` simula el round-trip de cada upstream.
+"""
+
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+HISTORY_START = "2016-01-04"
+
+
+# ── Mercado sintético ─────────────────────────────────────────────────
+
+class SyntheticMarket:
+    """Cierres diarios (random walk con semilla fija) para `n_tickers` símbolos."""
+
+    def __init__(self, n_tickers: int, seed: int = 7, latency: float = 0.0):
+        self.latency = latency
+        self.tickers = [f"T{i:04d}" for i in range(n_tickers)]
+        self.dates = pd.bdate_range(HISTORY_START, pd.Timestamp.now().normalize())
+        rng = np.random.default_rng(seed)
+        steps = rng.normal(0.0003, 0.015, size=(len(self.dates), n_tickers))
+        start = rng.uniform(20, 400, size=n_tickers)
+        self.closes = pd.DataFrame(
+            start * np.exp(np.cumsum(steps, axis=0)), index=self.dates, columns=self.tickers
+        ).round(2)
+
+    def transactions(self, n: int, seed: int = 11) -> List[dict]:
+        """`n` transacciones: mayormente BUY, algunos SELL parciales y DIVIDEND."""
+        rng = np.random.default_rng(seed)
+        ticker_idx = rng.integers(0, len(self.tickers), size=n)
+        day_idx = rng.integers(0, len(self.dates) - 1, size=n)
+        kinds = rng.choice(["BUY", "SELL", "DIVIDEND"], size=n, p=[0.8, 0.15, 0.05])
+        shares = rng.integers(1, 50, size=n).astype(float)
+        shares = np.where(kinds == "SELL", np.maximum(1.0, shares // 10), shares)
+        prices = np.where(kinds == "DIVIDEND", 0.5, self.closes.to_numpy()[day_idx, ticker_idx])
+        days = self.dates[day_idx].strftime("%Y-%m-%d")
+        return [
+            {
+                "id": i,
+                "ticker": self.tickers[ticker_idx[i]],
+                "date": days[i],
+                "type": str(kinds[i]),
+                "shares": float(shares[i]),
+                "price": float(prices[i]),
+                "amount": round(float(shares[i] * prices[i]), 2),
+                "created_at": f"{days[i]}T12:00:{i % 60:02d}+00:00",
+            }
+            for i in range(n)
+        ]
+
+    def assets(self) -> List[dict]:
+        """Filas de assets como las deja daily_sync (frescas, con fundamentales)."""
+        updated = datetime.now(timezone.utc).isoformat()
+        last = self.closes.iloc[-1]
+        return [
+            {"ticker": t, "name": f"{t} Corp", "sector": "Technology", "last_price": float(last[t]),
+             "pe_ntm": 20.0, "fcf_share": 3.5, "last_updated": updated}
+            for t in self.tickers
+        ]
+
+    # ── yfinance ──
+
+    def download(self, symbols, period: Optional[str] = None, start: Optional[str] = None, **kwargs) -> pd.DataFrame:
+        time.sleep(self.latency)
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        closes = self.closes.reindex(columns=symbols)
+        if start is not None:
+            closes = closes.loc[pd.Timestamp(start):]
+        elif period and period.endswith("d"):
+            closes = closes.iloc[-int(period[:-1]):]
+        columns = pd.MultiIndex.from_product([["Close"], symbols], names=["Price", "Ticker"])
+        return pd.DataFrame(closes.to_numpy(), index=closes.index.rename("Date"), columns=columns)
+
+    def ticker(self, symbol: str) -> SimpleNamespace:
+        time.sleep(self.latency)
+        return SimpleNamespace(
+            info={"longName": f"{symbol} Corp", "sector": "Technology", "longBusinessSummary": ""},
+            fast_info={"shares": 1_000_000_000, "last_price": float(self.closes[symbol].iloc[-1])
+                       if symbol in self.closes else None},
+        )
+
+
+# ── FMP (requests.Session) ────────────────────────────────────────────
+
+class FakeResponse:
+    def __init__(self, payload, status_code: int = 200, text: Optional[str] = None):
+        self._payload = payload
+        self.status_code = status_code
+        self.text = text if text is not None else repr(payload)
+        self.content = self.text.encode()
+        self.headers: Dict[str, str] = {}
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class FakeFMPSession:
+    """Responde los endpoints de FMP que usa DataManager con datos fijos por ticker."""
+
+    def __init__(self, market: SyntheticMarket):
+        self.market = market
+        self.requests = 0
+
+    def get(self, url: str, params: dict = None, timeout=None, **kwargs) -> FakeResponse:
+        time.sleep(self.market.latency)
+        self.requests += 1
+        endpoint = re.split(r"/api/v\d/", url, maxsplit=1)[-1]
+        name, _, symbol = endpoint.partition("/")
+        symbols = symbol.split(",") if symbol else []
+        today = datetime.now()
+
+        if name == "analyst-estimates":
+            payload = [
+                {"symbol": symbol, "date": (today + timedelta(days=90 * q)).strftime("%Y-%m-%d"), "estimatedEpsAvg": 1.25}
+                for q in range(1, 7)
+            ]
+        elif name == "cash-flow-statement":
+            payload = [{"symbol": symbol, "netCashProvidedByOperatingActivities": 5e9,
+                        "capitalExpenditure": -1.5e9, "weightedAverageShsOutDil": 1e9}]
+        elif name == "earning_calendar":
+            payload = [
+                {"symbol": t, "date": (today + timedelta(days=3)).strftime("%Y-%m-%d"), "epsEstimated": 1.1}
+                for t in self.market.tickers[::10]
+            ]
+        elif name == "cash-flow-statement-bulk":
+            # Año en curso: solo la mitad ya presentó
+            year = int((params or {}).get("year", today.year))
+            tickers = self.market.tickers[::2] if year == today.year else self.market.tickers
+            rows = "\n".join(f"{t},{year}-03-31,5000000000,-1500000000" for t in tickers)
+            header = "symbol,date,netCashProvidedByOperatingActivities,capitalExpenditure"
+            return FakeResponse(None, text=f"{header}\n{rows}\n")
+        elif name == "quote":
+            payload = [
+                {"symbol": t, "price": float(self.market.closes[t].iloc[-1]), "sharesOutstanding": 1_000_000_000}
+                for t in symbols if t in self.market.closes
+            ]
+        elif name == "stock_news":
+            tickers = str((params or {}).get("tickers", "")).split(",")
+            payload = [
+                {
+                    "symbol": t, "title": f"{t} headline {i}", "text": f"{t} news body {i}.",
+                    "url": f"https://news.example/{t}/{i}", "publishedDate": f"2024-01-0{i + 1} 12:00:00",
+                }
+                for t in tickers for i in range(3)
+            ]
+        else:
+            payload = []
+        return FakeResponse(payload)
+
+
+# ── Supabase (PostgREST) ──────────────────────────────────────────────
+
+class FakeSupabase:
+    """Tablas en memoria con el subconjunto del query builder que usa la app."""
+
+    def __init__(self, tables: Dict[str, List[dict]], latency: float = 0.0):
+        self.tables = tables
+        self.latency = latency
+        self.queries = 0
+        self._indexes: Dict[str, Dict[str, dict]] = {}
+
+    def table(self, name: str) -> "FakeQuery":
+        return FakeQuery(self, name)
+
+    def lookup(self, table: str, ticker: str) -> Optional[dict]:
+        """Fila de `table` por ticker (para embeds por FK), con índice en memoria."""
+        if table not in self._indexes:
+            self._indexes[table] = {row.get("ticker"): row for row in self.tables.get(table, [])}
+        return self._indexes[table].get(ticker)
+
+    def invalidate(self, table: str) -> None:
+        self._indexes.pop(table, None)
+
+
+_EMBED = re.compile(r"(\w+)\(([^)]*)\)")
+
+
+class FakeQuery:
+    def __init__(self, db: FakeSupabase, table: str):
+        self.db = db
+        self.table_name = table
+        self.op = "select"
+        self.columns = "*"
+        self.payload = None
+        self.filters = []
+        self.order_by = None
+        self.row_range = None
+        self.row_limit = None
+        self.conflict = None
+
+    # ── builder ──
+    def select(self, columns: str = "*"):
+        self.op, self.columns = "select", columns
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows=None, on_conflict: str = None, **kwargs):
+        if rows is None:  # encadenado tras insert()
+            rows = self.payload
+        self.op, self.payload, self.conflict = "upsert", rows, on_conflict
+        return self
+
+    def update(self, data: dict):
+        self.op, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column: str, values):
+        allowed = set(values)
+        self.filters.append(lambda row: row.get(column) in allowed)
+        return self
+
+    def gte(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, n: int):
+        self.row_limit = n
+        return self
+
+    def range(self, start: int, end: int):
+        self.row_range = (start, end)
+        return self
+
+    # ── ejecución ──
+    def execute(self) -> SimpleNamespace:
+        time.sleep(self.db.latency)
+        self.db.queries += 1
+        rows = self.db.tables.setdefault(self.table_name, [])
+
+        if self.op in ("insert", "upsert", "delete"):
+            self.db.invalidate(self.table_name)
+        if self.op in ("insert", "upsert"):
+            new_rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            key = self.conflict or ("ticker" if self.table_name in ("assets", "watchlist") else None)
+            if key:
+                index = {row.get(key): i for i, row in enumerate(rows)}
+                for row in new_rows:
+                    if row.get(key) in index:
+                        rows[index[row[key]]].update(row)
+                    else:
+                        rows.append(dict(row))
+            else:
+                rows.extend(dict(row) for row in new_rows)
+            return SimpleNamespace(data=new_rows)
+
+        matched = [row for row in rows if all(f(row) for f in self.filters)] if self.filters else rows
+        if self.op == "update":
+            for row in matched:
+                row.update(self.payload)
+            return SimpleNamespace(data=matched)
+        if self.op == "delete":
+            self.db.tables[self.table_name] = [row for row in rows if row not in matched]
+            return SimpleNamespace(data=matched)
+
+        if self.order_by:
+            column, desc = self.order_by
+            matched = sorted(matched, key=lambda row: row.get(column), reverse=desc)
+        if self.row_limit is not None:
+            matched = matched[:self.row_limit]
+        if self.row_range is not None:
+            matched = matched[self.row_range[0]:self.row_range[1] + 1]
+        return SimpleNamespace(data=[self._project(row) for row in matched])
+
+    def _project(self, row: dict) -> dict:
+        if self.columns.strip() == "*":
+            return dict(row)
+        embeds = {name: cols for name, cols in _EMBED.findall(self.columns)}
+        plain = [c.strip() for c in _EMBED.sub("", self.columns).split(",") if c.strip()]
+        out = {c: row.get(c) for c in plain}
+        for name, cols in embeds.items():
+            # Embed por FK ticker -> tabla referenciada
+            related = self.db.lookup(name, row.get("ticker"))
+            out[name] = {c.strip(): related.get(c.strip()) for c in cols.split(",")} if related else None
+        return out
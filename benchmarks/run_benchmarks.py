@@ -0,0 +1,247 @@
+"""
+SmartFolio Benchmarks — hot paths de datos y analítica.
+
+Mide, con fixtures locales (benchmarks/fixtures.py, sin red):
+- State.load_data (pipeline de fetch_portfolio / fetch_dashboard_data)
+- State.fetch_watchlist
+- calculate_twr (con portfolio_history guardado y reconstruyendo el NAV desde precios)
+- run_sync (scripts/daily_sync.py, modo parallel)
+
+para 10, 100 y 1000 tickers x 10k y 100k transacciones. Cada caso reporta la corrida
+en frío (caches vacíos) y la mediana de las corridas en caliente.
+
+Uso:
+    python benchmarks/run_benchmarks.py [--quick] [--repeat 3] [--latency-ms 0] [--output results.json]
+
+El resultado es JSON (stdout o --output) para comparar regresiones entre commits.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+TICKER_COUNTS = [10, 100, 1000]
+TRANSACTION_COUNTS = [10_000, 100_000]
+
+# Entorno aislado: sin credenciales reales y caches en un directorio temporal.
+# Tiene que quedar armado antes de importar la app (lee el entorno al importar).
+CACHE_ROOT = tempfile.mkdtemp(prefix="smartfolio-bench-")
+os.environ["SMARTFOLIO_CACHE_DIR"] = CACHE_ROOT
+os.environ["SUPABASE_URL"] = "http://supabase.bench.local"
+os.environ["SUPABASE_KEY"] = "bench.bench.bench"
+# Sin cuota de FMP: el benchmark mide la app, no el rate limiter
+os.environ["FMP_RATE_PER_MINUTE"] = "0"
+os.environ["FMP_RATE_PER_DAY"] = "0"
+for var in ("GEMINI_API_KEY", "TELEGRAM_TOKEN", "TELEGRAM_CHAT_ID", "FMP_API_KEY"):
+    os.environ.pop(var, None)
+
+import pandas as pd  # noqa: E402
+import supabase as supabase_pkg  # noqa: E402
+import yfinance as yf  # noqa: E402
+
+from benchmarks.fixtures import FakeFMPSession, FakeSupabase, SyntheticMarket  # noqa: E402
+
+# Los módulos crean su cliente al importarse; cada escenario lo reemplaza después.
+supabase_pkg.create_client = lambda *args, **kwargs: FakeSupabase({})
+
+from reflex_app import state as state_module  # noqa: E402
+from scripts import daily_sync  # noqa: E402
+from utils.data_engine import DataManager  # noqa: E402
+from utils.finance_core import calculate_twr  # noqa: E402
+from utils.fundamentals_store import FundamentalsStore  # noqa: E402
+from utils.market_service import MarketDataService  # noqa: E402
+from utils.price_store import PriceStore  # noqa: E402
+
+
+# ── Entorno por escenario ─────────────────────────────────────────────
+
+class Scenario:
+    """Mercado + base sintética con `n_tickers` y `n_transactions`, cableados a la app."""
+
+    def __init__(self, n_tickers: int, n_transactions: int, latency: float):
+        self.market = SyntheticMarket(n_tickers, latency=latency)
+        self.transactions = self.market.transactions(n_transactions)
+        self.db = FakeSupabase(
+            {
+                "transactions": self.transactions,
+                "assets": self.market.assets(),
+                "watchlist": [{"ticker": t} for t in self.market.tickers],
+                "portfolio_history": [],
+                "market_news": [],
+            },
+            latency=latency,
+        )
+        yf.download = self.market.download
+        yf.Ticker = self.market.ticker
+        self.reset_caches()
+
+    def reset_caches(self) -> None:
+        """DataManager nuevo con caches vacíos (corrida en frío)."""
+        cache_dir = tempfile.mkdtemp(dir=CACHE_ROOT)
+        dm = DataManager(fundamentals_store=FundamentalsStore(os.path.join(cache_dir, "fundamentals.sqlite")))
+        dm.prices = PriceStore(download=dm._download_closes, path=os.path.join(cache_dir, "prices"))
+        dm.session = FakeFMPSession(self.market)
+
+        state_module.supabase = self.db
+        state_module.dm = dm
+        state_module.market = MarketDataService(dm)
+        daily_sync.supabase = self.db
+        daily_sync.dm = dm
+        self.dm = dm
+
+
+class Session:
+    """
+    Sesión mínima para correr los handlers de State fuera del runtime de Reflex:
+    reenvía atributos al State y soporta `async with self` como el StateProxy.
+    """
+
+    def __init__(self, state):
+        object.__setattr__(self, "_state", state)
+
+    def __getattr__(self, name):
+        return getattr(self._state, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._state, name, value)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+async def _drain(handler, session) -> None:
+    result = handler.fn(session)
+    if hasattr(result, "__aiter__"):
+        async for _ in result:
+            pass
+    elif asyncio.iscoroutine(result):
+        await result
+
+
+def run_handler(name: str) -> Callable[[], None]:
+    handler = getattr(state_module.State, name)
+
+    def run() -> None:
+        session = Session(state_module.State(_reflex_internal_init=True))
+        asyncio.run(_drain(handler, session))
+
+    return run
+
+
+# ── Medición ──────────────────────────────────────────────────────────
+
+def measure(fn: Callable[[], None], repeat: int, scenario: Scenario) -> Dict:
+    """Una corrida en frío (caches vacíos) y `repeat` en caliente, más los requests de la corrida en frío."""
+    scenario.reset_caches()
+    queries_before = scenario.db.queries
+    times, cold_calls = [], {}
+    for run in range(repeat + 1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        if run == 0:
+            cold_calls = {"supabase": scenario.db.queries - queries_before, "fmp": scenario.dm.session.requests}
+    warm = times[1:] or times
+    return {
+        "cold_s": round(times[0], 4),
+        "warm_median_s": round(statistics.median(warm), 4),
+        "warm_min_s": round(min(warm), 4),
+        "cold_upstream_calls": cold_calls,
+    }
+
+
+def benchmark_cases(scenario: Scenario, first_for_tickers: bool) -> Dict[str, Callable[[], None]]:
+    tx = pd.DataFrame(scenario.transactions)
+    value = float((scenario.market.closes.iloc[-1]).mean() * 1000)
+    closes = scenario.market.closes
+
+    cases = {
+        "run_sync": lambda: daily_sync.run_sync("parallel"),
+        "calculate_twr[prices]": lambda: calculate_twr(tx, value, prices=closes),
+        "calculate_twr[nav_history]": lambda: calculate_twr(tx, value, nav_history=_nav_history(scenario)),
+        # fetch_portfolio y fetch_dashboard_data delegan en load_data
+        "State.load_data": run_handler("load_data"),
+    }
+    if first_for_tickers:
+        # La watchlist no depende de la cantidad de transacciones
+        cases["State.fetch_watchlist"] = run_handler("fetch_watchlist")
+    return cases
+
+
+def _nav_history(scenario: Scenario) -> pd.DataFrame:
+    rows = scenario.db.tables["portfolio_history"]
+    history = pd.DataFrame(rows, columns=["date", "nav", "net_flow"])
+    history["date"] = pd.to_datetime(history["date"])
+    return history.set_index("date").astype(float)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SmartFolio hot-path benchmarks")
+    parser.add_argument("--quick", action="store_true", help="solo 10/100 tickers y 10k transacciones")
+    parser.add_argument("--repeat", type=int, default=3, help="corridas en caliente por caso")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latencia simulada por request upstream")
+    parser.add_argument("--output", help="archivo JSON de salida (default: stdout)")
+    args = parser.parse_args()
+
+    ticker_counts = TICKER_COUNTS[:2] if args.quick else TICKER_COUNTS
+    tx_counts = TRANSACTION_COUNTS[:1] if args.quick else TRANSACTION_COUNTS
+
+    results: List[Dict] = []
+    for n_tickers in ticker_counts:
+        for i, n_tx in enumerate(tx_counts):
+            scenario = Scenario(n_tickers, n_tx, latency=args.latency_ms / 1000)
+            # run_sync primero: deja portfolio_history como en producción
+            for name, fn in benchmark_cases(scenario, first_for_tickers=i == 0).items():
+                entry = {"name": name, "tickers": n_tickers, "transactions": n_tx}
+                try:
+                    entry.update(measure(fn, args.repeat, scenario))
+                except Exception as e:
+                    entry["error"] = f"{type(e).__name__}: {e}"
+                results.append(entry)
+                print(f"{name:<28} {n_tickers:>5} tickers {n_tx:>7} tx  {entry}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "latency_ms": args.latency_ms,
+        },
+        "results": results,
+    }
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
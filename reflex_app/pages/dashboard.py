@@ -1,38 +1,27 @@
 import reflex as rx
-from reflex_app.state import State
+from reflex_app.state import State, CHART_RANGES
 from reflex_app.components.sidebar import sidebar
 from reflex_app.components.topbar import topbar
 from reflex_app.components.kpi_cards import kpi_cards_grid
 from reflex_app.components.add_transaction_modal import add_transaction_modal
-import plotly.graph_objects as go
 
 
 # ── Chart ──────────────────────────────────────────────────────────────────────
 
 def portfolio_chart() -> rx.Component:
-    fig = go.Figure()
-    fig.update_layout(
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        font={"color": "#94a3b8", "family": "Inter, sans-serif"},
-        margin={"l": 10, "r": 10, "t": 10, "b": 10},
-        legend={"orientation": "h", "y": 1.1},
-        xaxis={"gridcolor": "rgba(255,255,255,0.05)", "showgrid": True, "zeroline": False},
-        yaxis={"gridcolor": "rgba(255,255,255,0.05)", "showgrid": True, "zeroline": False},
+    return rx.plotly(data=State.performance_chart, height="300px", width="100%")
+
+
+def range_button(label: str) -> rx.Component:
+    return rx.el.button(
+        label,
+        on_click=State.set_chart_range(label),
+        class_name=rx.cond(
+            State.chart_range == label,
+            "px-3 py-1 text-xs font-medium rounded-md transition-colors bg-slate-700 text-white shadow-sm",
+            "px-3 py-1 text-xs font-medium rounded-md transition-colors text-slate-400 hover:text-white",
+        ),
     )
-    fig.add_trace(go.Scatter(
-        y=[100, 105, 102, 112, 118, 115, 128, 136],
-        name="My Portfolio",
-        line={"color": "#2b8cee", "width": 3},
-        fill="tozeroy",
-        fillcolor="rgba(43,140,238,0.07)",
-    ))
-    fig.add_trace(go.Scatter(
-        y=[100, 101, 103, 104, 106, 105, 108, 111],
-        name="SPY Benchmark",
-        line={"color": "#475569", "width": 2, "dash": "dot"},
-    ))
-    return rx.plotly(data=fig, height="300px", width="100%")
 
 
 from reflex_app.state import State, RecentActivity
@@ -194,14 +183,7 @@ def dashboard_page() -> rx.Component:
                                 rx.el.p("vs S&P 500 (SPY)", class_name="text-sm text-slate-400"),
                             ),
                             rx.el.div(
-                                *[rx.el.button(
-                                    lbl,
-                                    class_name=(
-                                        "px-3 py-1 text-xs font-medium rounded-md transition-colors "
-                                        + ("bg-slate-700 text-white shadow-sm" if lbl == "1M"
-                                           else "text-slate-400 hover:text-white")
-                                    ),
-                                ) for lbl in ["1D", "1W", "1M", "YTD", "ALL"]],
+                                *[range_button(lbl) for lbl in CHART_RANGES],
                                 class_name="flex items-center gap-0.5 bg-slate-800/50 p-1 rounded-lg",
                             ),
                             class_name="flex items-center justify-between mb-4",
@@ -230,7 +212,8 @@ def dashboard_page() -> rx.Component:
             class_name="flex-1 flex flex-col h-screen overflow-hidden min-w-0",
         ),
 
-        on_mount=State.load_data,
+        on_mount=[State.load_data, State.start_quote_stream],
+        on_unmount=State.stop_quote_stream,
         class_name="flex h-screen w-screen overflow-hidden bg-[#101922] text-white",
         style={"fontFamily": "Inter, system-ui, sans-serif"},
     )
@@ -113,7 +113,8 @@ def portfolio_page() -> rx.Component:
     ),
     class_name="flex-1 flex flex-col h-screen overflow-hidden min-w-0"
 ),
-on_mount=State.load_data,
+on_mount=[State.load_data, State.start_quote_stream],
+on_unmount=State.stop_quote_stream,
         class_name="flex h-screen w-screen overflow-hidden bg-[#101922] text-white",
         style={"fontFamily": "Inter, system-ui, sans-serif"}
     )
@@ -1,6 +1,13 @@
+import hmac
+import os
 import reflex as rx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
 from reflex_app.pages import dashboard, portfolio, watchlist, research # Importación de páginas
 from reflex_app.state import State
+from utils.metrics import metrics
 
 def index():
     return dashboard.dashboard_page()
@@ -31,6 +38,25 @@ function configureTailwind() {
 configureTailwind();
 """
 
+
+# /metrics exige "Authorization: Bearer <METRICS_TOKEN>"; sin token configurado no existe (404)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Métricas del backend (latencias de upstreams, cache de cotizaciones) para Prometheus."""
+    if not METRICS_TOKEN:
+        return PlainTextResponse("Not Found", status_code=404)
+    if not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        return PlainTextResponse("Unauthorized", status_code=401)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# La API de Reflex se monta debajo de esta app, que solo agrega /metrics
+backend_api = Starlette(routes=[Route("/metrics", metrics_endpoint)])
+
 app = rx.App(
     stylesheets=[
         "https://fonts.googleapis.com/css2?family=Manrope:wght@300;400;500;600;700;800&display=swap",
@@ -41,7 +67,8 @@ app = rx.App(
     head_components=[
         rx.script(src="https://cdn.tailwindcss.com?plugins=forms,container-queries"),
         rx.script(tailwind_config_script)
-    ]
+    ],
+    api_transformer=backend_api,
 )
 app.add_page(index, route="/")
 app.add_page(dashboard.dashboard_page, route="/dashboard")
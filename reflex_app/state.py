@@ -1,11 +1,21 @@
 import reflex as rx
+import asyncio
 import os
+import time
+import uuid
 from supabase import create_client, Client
-from utils.data_engine import DataManager
-from utils.finance_core import calculate_twr
+from utils.data_engine import DataManager, QUOTE_COLUMNS
+from utils.market_service import FUNDAMENTAL_FIELDS, MarketDataService
+from utils.quote_stream import QuotePoller, QuoteChanges
+from utils.finance_core import build_nav_history, calculate_twr, compute_positions, performance_index
+from utils.timeseries import lttb
+from utils.metrics import metrics
+from utils.supabase_utils import execute, fetch_all
+import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
 from datetime import datetime
-import yfinance as yf
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
 
 # ── Supabase Init ─────────────────────────────────────────────────────
 url: str = os.environ.get("SUPABASE_URL", "")
@@ -18,6 +28,41 @@ else:
     supabase: Client = create_client(url, key)
 
 dm = DataManager()
+# Servicio compartido (single-flight + pool acotado): los handlers no llaman a dm directo
+market = MarketDataService(dm)
+# Un único poller de cotizaciones para todas las sesiones del proceso
+quote_poller = QuotePoller(market)
+# Gauges que se exportan en /metrics junto con los spans de upstreams
+metrics.register_collector("quote_cache", lambda: dm.quote_cache_stats())
+metrics.register_collector("market_data", lambda: {"coalesced_requests": market.coalesced})
+
+# Columnas de transactions que usa la app (evita select("*"))
+TRANSACTION_COLUMNS = "ticker,date,type,shares,price,amount,created_at"
+# Valores que daily_sync deja guardados en assets (primer render sin red)
+ASSET_COLUMNS = "last_price,pe_ntm,fcf_share,last_updated"
+# Antigüedad máxima de los fundamentales de assets antes de ir a FMP. daily_sync los
+# reescribe cada día; el margen sobre 24h cubre un cron demorado o un día salteado.
+FUNDAMENTALS_MAX_AGE_HOURS = float(os.getenv("FUNDAMENTALS_MAX_AGE_HOURS", "36"))
+# Tickers por tanda de cotizaciones en vivo; cada tanda se publica apenas llega
+LOAD_CHUNK_SIZE = int(os.getenv("LOAD_CHUNK_SIZE", "10"))
+
+# Gráfico de performance: rangos, benchmark y puntos máximos por serie (LTTB)
+CHART_RANGES = ["1M", "YTD", "1Y", "MAX"]
+BENCHMARK_TICKER = os.getenv("BENCHMARK_TICKER", "SPY")
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+
+# Stream de cotizaciones por sesión: cada cuánto re-sincroniza sus tickers con el
+# poller y vida máxima (una pestaña cerrada no dispara on_unmount).
+QUOTE_STREAM_RESYNC = float(os.getenv("QUOTE_STREAM_RESYNC", "5"))
+QUOTE_STREAM_MAX_SECONDS = float(os.getenv("QUOTE_STREAM_MAX_SECONDS", str(4 * 3600)))
+
+
+def _quote(quotes: pd.DataFrame, ticker: str, field: str) -> float:
+    """Lee un campo de un frame indexado por ticker; 0.0 si el ticker no tiene dato."""
+    if ticker not in quotes.index:
+        return 0.0
+    value = quotes.at[ticker, field]
+    return float(value) if pd.notna(value) else 0.0
 
 
 from pydantic import BaseModel
@@ -30,6 +75,8 @@ class Holding(BaseModel):
     price: float = 0.0
     value: float = 0.0
     pnl_pct: float = 0.0
+    realized_pnl: float = 0.0
+    weight: float = 0.0
     pe_ntm: float = 0.0
     fcf_share: float = 0.0
 
@@ -49,6 +96,256 @@ class WatchlistItem(BaseModel):
     market_cap: str = ""
     pe_ntm: float = 0.0
 
+class NewsHeadline(BaseModel):
+    """Typed data model for a headline behind an AI analysis."""
+    title: str = ""
+    site: str = ""
+    url: str = ""
+    excerpt: str = ""
+    published: str = ""
+
+class ResearchItem(BaseModel):
+    """Typed data model for the latest AI news analysis of a ticker."""
+    ticker: str = ""
+    name: str = ""
+    sector: str = ""
+    summary: str = ""
+    sentiment: float = 0.0
+    sentiment_label: str = "Neutral"
+    impact_level: str = "low"
+    updated: str = ""
+    headlines: list[NewsHeadline] = []
+
+
+# ── Lecturas (bloqueantes: Supabase con asyncio.to_thread, mercado con market.run) ──
+
+def _read_portfolio() -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Lee transactions junto con la fila de assets de cada ticker en una sola query
+    (embed de PostgREST). Retorna (transacciones, fila guardada de assets por ticker).
+    """
+    rows = fetch_all(
+        lambda: supabase.table("transactions").select(f"{TRANSACTION_COLUMNS},assets({ASSET_COLUMNS})"),
+        operation="transactions.select",
+    )
+    trans_df = pd.DataFrame(rows, columns=TRANSACTION_COLUMNS.split(","))
+    return trans_df, _stored_assets(rows)
+
+
+def _read_watchlist() -> Tuple[List[str], pd.DataFrame]:
+    """Tickers de la watchlist con su fila de assets, en una sola query."""
+    rows = fetch_all(
+        lambda: supabase.table("watchlist").select(f"ticker,assets({ASSET_COLUMNS})"), operation="watchlist.select"
+    )
+    return [row["ticker"] for row in rows], _stored_assets(rows)
+
+
+def _read_latest_news() -> List[dict]:
+    """
+    Último análisis de IA por ticker (vista latest_market_news, sobre el índice
+    (ticker, published_at)) con nombre y sector de assets. Lo escribe daily_sync:
+    leerlo nunca dispara una llamada al modelo.
+    """
+    rows = fetch_all(
+        lambda: supabase.table("latest_market_news")
+        .select("ticker,summary,sentiment,impact_level,headlines,published_at")
+        .order("published_at", desc=True),
+        operation="latest_market_news.select",
+    )
+    tickers = [row["ticker"] for row in rows]
+    assets = execute(
+        supabase.table("assets").select("ticker,name,sector").in_("ticker", tickers), "assets.select"
+    ).data if tickers else []
+    names = {a["ticker"]: a for a in assets or []}
+    for row in rows:
+        asset = names.get(row["ticker"], {})
+        row["name"], row["sector"] = asset.get("name"), asset.get("sector")
+    return rows
+
+
+def _stored_assets(rows: List[dict]) -> pd.DataFrame:
+    """Frame por ticker con last_price / pe_ntm / fcf_share / last_updated embebidos en `rows`."""
+    assets = {row["ticker"]: row.get("assets") or {} for row in rows}
+    stored = pd.DataFrame.from_dict(assets, orient="index").reindex(
+        index=list(assets), columns=ASSET_COLUMNS.split(",")
+    )
+    value_columns = ["last_price"] + FUNDAMENTAL_FIELDS
+    stored[value_columns] = stored[value_columns].apply(pd.to_numeric, errors="coerce").astype(float)
+    stored["last_updated"] = pd.to_datetime(
+        stored["last_updated"], utc=True, errors="coerce", format="ISO8601"
+    )
+    return stored
+
+
+def _stale_fundamentals(stored: pd.DataFrame, fields: Sequence[str] = FUNDAMENTAL_FIELDS) -> List[str]:
+    """
+    Read-through: tickers cuya fila de assets no sirve (sin dato o más vieja que
+    FUNDAMENTALS_MAX_AGE_HOURS) y que por lo tanto hay que pedir a FMP.
+    """
+    cutoff = pd.Timestamp.now(tz="UTC") - pd.Timedelta(hours=FUNDAMENTALS_MAX_AGE_HOURS)
+    fresh = (stored["last_updated"] >= cutoff) & stored[list(fields)].notna().all(axis=1)
+    return stored.index[~fresh].tolist()
+
+
+def _read_nav_history(start: str = None) -> pd.DataFrame:
+    """Lee portfolio_history (date, nav, net_flow) desde `start`, ordenado por fecha."""
+    def query():
+        q = supabase.table("portfolio_history").select("date,nav,net_flow")
+        if start:
+            q = q.gte("date", start)
+        return q.order("date")
+
+    try:
+        rows = fetch_all(query, operation="portfolio_history.select")
+    except Exception as e:
+        print(f"Error reading portfolio_history: {e}")
+        return pd.DataFrame(columns=["nav", "net_flow"], dtype=float)
+
+    history = pd.DataFrame(rows, columns=["date", "nav", "net_flow"])
+    history["date"] = pd.to_datetime(history["date"])
+    return history.set_index("date").astype(float)
+
+
+def _compute_twr(trans_df: pd.DataFrame, total_value: float) -> float:
+    """
+    TWR real: snapshots de portfolio_history (un range scan); si todavía no hay
+    historial guardado se reconstruye el NAV con cierres históricos.
+    """
+    nav_history = _read_nav_history()
+    prices = None
+    if nav_history.empty and not trans_df.empty:
+        prices = dm.get_price_history(trans_df["ticker"].unique().tolist(), start=trans_df["date"].min())
+    return calculate_twr(trans_df, total_value, prices=prices, nav_history=nav_history)
+
+
+def _range_start(chart_range: str) -> Optional[pd.Timestamp]:
+    """Primer día del rango del gráfico (None = toda la historia)."""
+    today = pd.Timestamp.now().normalize()
+    return {
+        "1M": today - pd.DateOffset(months=1),
+        "YTD": today.replace(month=1, day=1),
+        "1Y": today - pd.DateOffset(years=1),
+    }.get(chart_range)
+
+
+def _performance_points(chart_range: str, trans_df: Optional[pd.DataFrame] = None) -> List[dict]:
+    """
+    Portfolio (índice TWR) vs benchmark, ambos base 100 al inicio del rango.
+    Lee portfolio_history (un range scan) y cierres del PriceStore local; cada serie
+    se reduce con LTTB a CHART_MAX_POINTS. Filas: {"date", "portfolio"?, "benchmark"?}.
+    `trans_df`: transacciones ya leídas por el llamador (si no, se leen solo si hacen falta).
+    """
+    start = _range_start(chart_range)
+    nav_history = _read_nav_history(start.strftime("%Y-%m-%d") if start is not None else None)
+    if nav_history.empty:
+        # Sin snapshots todavía: NAV reconstruido desde las transacciones
+        if trans_df is None:
+            trans_df, _ = _read_portfolio()
+        if trans_df.empty:
+            return []
+        prices = dm.get_price_history(trans_df["ticker"].unique().tolist(), start=trans_df["date"].min())
+        nav_history = build_nav_history(trans_df, prices)
+        if start is not None:
+            nav_history = nav_history.loc[nav_history.index >= start]
+    if nav_history.empty:
+        return []
+
+    portfolio = performance_index(nav_history)
+    dates = portfolio.index
+    closes = dm.get_price_history([BENCHMARK_TICKER], start=dates[0])
+    benchmark = pd.Series(np.nan, index=dates)
+    if not closes.empty:
+        bench = closes.iloc[:, 0].dropna()
+        bench = bench.reindex(bench.index.union(dates)).ffill().reindex(dates)
+        if bench.notna().any():
+            benchmark = 100.0 * bench / bench.dropna().iloc[0]
+
+    x = dates.values.astype("datetime64[D]").astype(float)
+    labels = dates.strftime("%Y-%m-%d")
+    rows = {}
+    for name, series in (("portfolio", portfolio), ("benchmark", benchmark)):
+        values = series.to_numpy(dtype=float)
+        valid = np.flatnonzero(~np.isnan(values))
+        for i in valid[lttb(x[valid], values[valid], CHART_MAX_POINTS)]:
+            rows.setdefault(i, {"date": labels[i]})[name] = round(float(values[i]), 2)
+    return [rows[i] for i in sorted(rows)]
+
+
+def _stored_quotes(stored: pd.DataFrame) -> pd.DataFrame:
+    """Frame con la forma de get_quotes armado con assets.last_price (sin prev_close ni cambio)."""
+    quotes = pd.DataFrame(index=stored.index, columns=QUOTE_COLUMNS, dtype=float)
+    quotes["price"] = stored["last_price"]
+    return quotes
+
+
+async def _stream_chunks(
+    fn: Callable[[List[str]], Awaitable[pd.DataFrame]], tickers: List[str], size: int = LOAD_CHUNK_SIZE
+):
+    """Lanza fn por tandas de tickers y entrega cada resultado apenas termina."""
+    tasks = [asyncio.ensure_future(fn(tickers[i:i + size])) for i in range(0, len(tickers), size)]
+    for next_done in asyncio.as_completed(tasks):
+        try:
+            yield await next_done
+        except Exception as e:
+            print(f"Error loading live data: {e}")
+
+
+def _time_ago(timestamp: str) -> str:
+    """'5m ago' / '3h ago' / '2d ago' para un timestamp ISO (o el texto tal cual si no se entiende)."""
+    moment = pd.to_datetime(timestamp, utc=True, errors="coerce")
+    if pd.isna(moment):
+        return timestamp or ""
+    minutes = max(int((pd.Timestamp.now(tz="UTC") - moment).total_seconds() // 60), 0)
+    if minutes < 60:
+        return f"{minutes}m ago"
+    if minutes < 24 * 60:
+        return f"{minutes // 60}h ago"
+    return f"{minutes // (24 * 60)}d ago"
+
+
+def _research_item(row: dict) -> ResearchItem:
+    sentiment = float(row.get("sentiment") or 0)
+    return ResearchItem(
+        ticker=row["ticker"],
+        name=row.get("name") or row["ticker"],
+        sector=row.get("sector") or "",
+        summary=row.get("summary") or "",
+        sentiment=round(sentiment, 2),
+        sentiment_label="Bullish" if sentiment > 0.2 else "Bearish" if sentiment < -0.2 else "Neutral",
+        impact_level=row.get("impact_level") or "low",
+        updated=_time_ago(row.get("published_at") or ""),
+        headlines=[
+            NewsHeadline(
+                title=h.get("title", ""),
+                site=h.get("site", ""),
+                url=h.get("url", ""),
+                excerpt=h.get("excerpt", ""),
+                published=_time_ago(h.get("published_at", "")),
+            )
+            for h in row.get("headlines") or []
+        ],
+    )
+
+
+def _format_market_cap(mcap: float) -> str:
+    if not mcap:
+        return "-"
+    return f"${mcap/1e9:.1f}B" if mcap > 1e9 else f"${mcap/1e6:.1f}M"
+
+
+def _watchlist_items(tickers: List[str], quotes: pd.DataFrame, fundamentals: pd.DataFrame) -> List[WatchlistItem]:
+    return [
+        WatchlistItem(
+            ticker=ticker,
+            price=_quote(quotes, ticker, "price"),
+            change_pct=_quote(quotes, ticker, "change_pct"),
+            market_cap=_format_market_cap(_quote(quotes, ticker, "market_cap")),
+            pe_ntm=_quote(fundamentals, ticker, "pe_ntm"),
+        )
+        for ticker in tickers
+    ]
+
+
 
 class State(rx.State):
     """Estado global de la aplicación SmartFolio."""
@@ -58,7 +355,9 @@ class State(rx.State):
     total_value: float = 0.0
     total_pnl: float = 0.0
     twr_metric: float = 0.0
+    # Puntos del gráfico: {"date", "portfolio", "benchmark"} (base 100, ya reducidos con LTTB)
     benchmark_data: list[dict] = []
+    chart_range: str = "1M"
     
     # ── Search & Filters ─────────────────────────────────────────────
     search_ticker: str = ""
@@ -71,6 +370,34 @@ class State(rx.State):
             return self.holdings
         return [h for h in self.holdings if search in h.ticker.upper()]
 
+    @rx.var
+    def performance_chart(self) -> go.Figure:
+        """Portfolio vs benchmark (base 100) a partir de benchmark_data."""
+        fig = go.Figure()
+        fig.update_layout(
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            font={"color": "#94a3b8", "family": "Inter, sans-serif"},
+            margin={"l": 10, "r": 10, "t": 10, "b": 10},
+            legend={"orientation": "h", "y": 1.1},
+            xaxis={"gridcolor": "rgba(255,255,255,0.05)", "showgrid": True, "zeroline": False},
+            yaxis={"gridcolor": "rgba(255,255,255,0.05)", "showgrid": True, "zeroline": False},
+        )
+        traces = [
+            ("portfolio", "My Portfolio", {"line": {"color": "#2b8cee", "width": 3}, "fill": "tozeroy",
+                                           "fillcolor": "rgba(43,140,238,0.07)"}),
+            ("benchmark", f"{BENCHMARK_TICKER} Benchmark", {"line": {"color": "#475569", "width": 2, "dash": "dot"}}),
+        ]
+        for key, name, style in traces:
+            points = [p for p in self.benchmark_data if p.get(key) is not None]
+            fig.add_trace(go.Scatter(
+                x=[p["date"] for p in points],
+                y=[p[key] for p in points],
+                name=name,
+                **style,
+            ))
+        return fig
+
     # ── Dashboard Data ────────────────────────────────────────────────
     total_portfolio_value: float = 0.0
     daily_pnl: float = 0.0
@@ -80,6 +407,28 @@ class State(rx.State):
     # ── Watchlist Data ────────────────────────────────────────────────
     watchlist: list[WatchlistItem] = []
 
+    # ── Research Data (market_news, escrito por daily_sync) ───────────
+    research_items: list[ResearchItem] = []
+    research_ticker: str = ""
+    research_loading: bool = False
+
+    @rx.var
+    def research(self) -> ResearchItem:
+        """Análisis del ticker seleccionado (el más reciente si no hay selección)."""
+        for item in self.research_items:
+            if item.ticker == self.research_ticker:
+                return item
+        return self.research_items[0] if self.research_items else ResearchItem()
+
+    @rx.var
+    def research_needle(self) -> str:
+        """Rotación de la aguja del gauge: -90° (sentiment -1) a 90° (sentiment 1)."""
+        return f"translateX(-50%) rotate({self.research.sentiment * 90:.0f}deg)"
+
+    # ── Live Quotes (solo backend) ────────────────────────────────────
+    _quote_stream_id: str = ""
+    _prev_closes: dict[str, float] = {}
+
     # ── Transaction Form ──────────────────────────────────────────────
     show_modal: bool = False
     form_ticker: str = ""
@@ -111,7 +460,7 @@ class State(rx.State):
 
     # ── Core: Agregar Transacción ─────────────────────────────────────
 
-    def add_transaction(self):
+    async def add_transaction(self):
         """
         1. Valida campos del formulario
         2. Verifica ticker con FMP
@@ -144,102 +493,156 @@ class State(rx.State):
 
         self.form_loading = True
         self.form_error = ""
+        yield
 
-        # ── Verificar Ticker con FMP ──
-        profile = dm.validate_ticker(ticker)
+        # ── Verificar Ticker con FMP (fuera del event loop) ──
+        profile = await market.run(dm.validate_ticker, ticker)
         if not profile:
             self.form_error = f"Ticker '{ticker}' not found in FMP."
             self.form_loading = False
             return
 
         # ── Auto-registrar Asset si es nuevo ──
-        existing = supabase.table("assets").select("ticker").eq("ticker", ticker).execute()
+        existing = await asyncio.to_thread(
+            execute, supabase.table("assets").select("ticker").eq("ticker", ticker), "assets.select"
+        )
         if not existing.data:
-            supabase.table("assets").insert({
+            await asyncio.to_thread(execute, supabase.table("assets").insert({
                 "ticker": ticker,
                 "name": profile["name"],
                 "sector": profile["sector"],
                 "description": profile.get("description", ""),
-            }).execute()
+            }), "assets.insert")
 
         # ── Insertar Transacción ──
-        supabase.table("transactions").insert({
+        transaction = {
             "ticker": ticker,
             "date": self.form_date,
             "type": "BUY",
             "shares": shares,
             "price": price,
-        }).execute()
+        }
+        await asyncio.to_thread(execute, supabase.table("transactions").insert(transaction), "transactions.insert")
 
         # ── Limpiar y recargar ──
         self.form_loading = False
         self.show_modal = False
-        self.fetch_portfolio()
-        self.fetch_dashboard_data()
+        yield State.load_data
 
     # ── Core: Cargar Portfolio ────────────────────────────────────────
 
-    def load_data(self):
-        """Carga inicial de datos."""
-        self.fetch_portfolio()
-        self.fetch_dashboard_data()
-        self.fetch_watchlist()
+    @rx.event(background=True)
+    async def load_data(self):
+        """
+        Carga progresiva en background (lee transactions una sola vez):
+        1. Publica de inmediato los valores guardados en assets (last_price, pe_ntm, fcf_share)
+        2. Actualiza holdings por tandas a medida que llegan las cotizaciones en vivo
+        3. Completa KPIs del dashboard, TWR, gráfico de performance y fundamentales en vivo
+        """
+        if not supabase:
+            return
 
-    def fetch_dashboard_data(self):
-        """Calcula KPIs del Dashboard y obtiene actividad reciente."""
+        # La watchlist carga en paralelo como tarea propia
+        yield State.fetch_watchlist
+
+        trans_df, stored = await asyncio.to_thread(_read_portfolio)
+        async with self:
+            chart_range = self.chart_range
+        # El gráfico reusa las transacciones ya leídas y se calcula mientras llegan las cotizaciones
+        chart = asyncio.ensure_future(market.run(_performance_points, chart_range, trans_df))
+        tickers = trans_df["ticker"].unique().tolist()
+        quotes = _stored_quotes(stored)
+        fundamentals = stored[FUNDAMENTAL_FIELDS]
+
+        async with self:
+            self._apply_recent_activity(trans_df)
+            self._apply_holdings(trans_df, quotes, fundamentals)
+
+        # ── Cotizaciones en vivo, publicadas por tanda ──
+        async for live in _stream_chunks(market.get_quotes, tickers):
+            quotes = live.combine_first(quotes)
+            async with self:
+                self._apply_holdings(trans_df, quotes, fundamentals)
+
+        stale = set(_stale_fundamentals(stored))
+        async with self:
+            self._apply_dashboard(trans_df, quotes)
+            total_value = self.total_value
+            stale_tickers = [h.ticker for h in self.holdings if h.ticker in stale]
+
+        twr = await market.run(_compute_twr, trans_df, total_value)
+        points = await chart
+        async with self:
+            self.twr_metric = twr
+            # Si el usuario cambió de rango mientras tanto, gana la carga más nueva
+            if self.chart_range == chart_range:
+                self.benchmark_data = points
+
+        # ── Fundamentales en vivo, solo donde assets no está al día ──
+        async for live in _stream_chunks(lambda chunk: market.get_fundamentals(chunk, quotes["price"]), stale_tickers):
+            fundamentals = live.combine_first(fundamentals)
+            async with self:
+                self._apply_holdings(trans_df, quotes, fundamentals)
+
+    def set_chart_range(self, chart_range: str):
+        """Cambia el rango del gráfico de performance y lo recalcula."""
+        self.chart_range = chart_range
+        return State.load_performance_chart
+
+    @rx.event(background=True)
+    async def load_performance_chart(self):
+        """Serie portfolio vs benchmark del rango elegido, calculada fuera del event loop."""
         if not supabase:
             return
 
-        # ── Obtener últimas 5 transacciones ──
-        response = supabase.table("transactions").select("*").order("date", desc=True).limit(5).execute()
-        
-        self.recent_activity = []
-        for tx in response.data:
-            self.recent_activity.append(RecentActivity(
-                ticker=tx["ticker"],
-                action=tx["type"],
-                qty=f"{tx['shares']} Shares",
-                price=f"${tx['price']:.2f}",
-                date=self._format_date(tx["date"]),
-            ))
+        async with self:
+            chart_range = self.chart_range
+        points = await market.run(_performance_points, chart_range)
+        async with self:
+            # Si el usuario cambió de rango mientras tanto, gana la carga más nueva
+            if self.chart_range == chart_range:
+                self.benchmark_data = points
 
-        # ── Calcular Portfolio Value y Daily P&L ──
-        response = supabase.table("transactions").select("*").execute()
-        trans_df = pd.DataFrame(response.data)
+    def fetch_dashboard_data(self):
+        """Calcula KPIs del Dashboard y obtiene actividad reciente."""
+        return State.load_data
 
+    def fetch_portfolio(self):
+        """Obtiene transacciones y calcula holdings con PnL."""
+        return State.load_data
+
+    def _apply_recent_activity(self, trans_df: pd.DataFrame):
+        """Últimas 5 transacciones, derivadas del frame ya leído."""
+        recent = trans_df.sort_values(["date", "created_at"], ascending=False).head(5)
+        self.recent_activity = [
+            RecentActivity(
+                ticker=tx.ticker,
+                action=tx.type,
+                qty=f"{tx.shares} Shares",
+                price=f"${float(tx.price):.2f}",
+                date=self._format_date(tx.date),
+            )
+            for tx in recent.itertuples()
+        ]
+
+    def _apply_dashboard(self, trans_df: pd.DataFrame, quotes: pd.DataFrame):
+        """Portfolio Value y Daily P&L."""
         if trans_df.empty:
             self.total_portfolio_value = 0.0
             self.daily_pnl = 0.0
             self.daily_pnl_percent = 0.0
             return
 
-        # Agrupar por Ticker para obtener posiciones actuales
-        grouped = trans_df.groupby("ticker").agg(
-            total_shares=("shares", "sum"),
-        ).reset_index()
-
-        current_total = 0.0
-        yesterday_total = 0.0
-
-        for _, row in grouped.iterrows():
-            ticker = row["ticker"]
-            shares = float(row["total_shares"])
-
-            if shares <= 0:
-                continue
-
-            # Obtener precio actual y anterior usando yfinance
-            try:
-                t = yf.Ticker(ticker)
-                current_price = t.fast_info.get("last_price", 0)
-                previous_close = t.fast_info.get("previous_close", 0)
-                
-                current_total += shares * current_price
-                yesterday_total += shares * previous_close
-            except Exception as e:
-                print(f"Error fetching prices for {ticker}: {e}")
-                continue
+        positions = compute_positions(trans_df, quotes["price"])
+        self._prev_closes = quotes["prev_close"].dropna().astype(float).to_dict()
+
+        current_total = float(positions["market_value"].sum())
+        yesterday_total = float(
+            (positions["shares"] * quotes["prev_close"].reindex(positions.index)).fillna(0.0).sum()
+        )
+        self._set_daily_pnl(current_total, yesterday_total)
 
+    def _set_daily_pnl(self, current_total: float, yesterday_total: float):
         self.total_portfolio_value = round(current_total, 2)
         self.daily_pnl = round(current_total - yesterday_total, 2)
         self.daily_pnl_percent = (
@@ -264,95 +667,153 @@ class State(rx.State):
         except:
             return date_str
 
-    def fetch_portfolio(self):
-        """Obtiene transacciones y calcula holdings con PnL."""
-        if not supabase:
-            return
-
-        response = supabase.table("transactions").select("*").execute()
-        trans_df = pd.DataFrame(response.data)
-
+    def _apply_holdings(self, trans_df: pd.DataFrame, quotes: pd.DataFrame, fundamentals: pd.DataFrame):
+        """Holdings con PnL y totales, con los precios y fundamentales disponibles hasta ahora."""
         if trans_df.empty:
             self.holdings = []
             self.total_value = 0.0
             self.total_pnl = 0.0
             return
 
-        # Agrupar por Ticker
-        grouped = trans_df.groupby("ticker").agg(
-            total_shares=("shares", "sum"),
-            total_cost=("amount", "sum"),
-        ).reset_index()
-
-        current_holdings = []
-        current_total = 0.0
-        total_cost_all = 0.0
-
-        for _, row in grouped.iterrows():
-            ticker = row["ticker"]
-            shares = float(row["total_shares"])
-            total_cost = float(row["total_cost"])
-
-            if shares <= 0:
-                continue
-
-            avg_buy = round(total_cost / shares, 2)
-            price = dm.get_current_price(ticker)
-            value = round(shares * price, 2)
-            pnl_pct = round(((price - avg_buy) / avg_buy) * 100, 2) if avg_buy > 0 else 0.0
-
-            current_total += value
-            total_cost_all += total_cost
-
-            current_holdings.append(Holding(
-                ticker=ticker,
-                shares=round(shares, 4),
-                avg_buy=avg_buy,
-                price=price,
-                value=value,
-                pnl_pct=pnl_pct,
-                pe_ntm=dm.get_pe_ntm(ticker) or 0,
-                fcf_share=dm.get_fcf_per_share(ticker) or 0,
-            ))
-
-        self.holdings = current_holdings
+        positions = compute_positions(trans_df, quotes["price"])
+        open_positions = positions[positions["shares"] > 0]
+
+        self.holdings = [
+            Holding(
+                ticker=row.Index,
+                shares=round(row.shares, 4),
+                avg_buy=round(row.avg_cost, 2),
+                price=round(row.price, 2) if pd.notna(row.price) else 0.0,
+                value=round(row.market_value, 2),
+                pnl_pct=round(row.unrealized_pct, 2),
+                realized_pnl=round(row.realized_pnl, 2),
+                weight=round(row.weight * 100, 2),
+                pe_ntm=_quote(fundamentals, row.Index, "pe_ntm"),
+                fcf_share=_quote(fundamentals, row.Index, "fcf_share"),
+            )
+            for row in open_positions.itertuples()
+        ]
+
+        current_total = float(open_positions["market_value"].sum())
+        cost_basis = float(open_positions["cost_basis"].sum())
         self.total_value = round(current_total, 2)
         self.total_pnl = (
-            round(((current_total - total_cost_all) / total_cost_all) * 100, 2)
-            if total_cost_all > 0
+            round(((current_total - cost_basis) / cost_basis) * 100, 2)
+            if cost_basis > 0
             else 0.0
         )
-        self.twr_metric = calculate_twr(trans_df, self.total_value)
 
-    def fetch_watchlist(self):
-        """Obtiene la lista de seguimiento y sus precios actuales."""
+    # ── Live Quotes ───────────────────────────────────────────────────
+
+    @rx.event(background=True)
+    async def start_quote_stream(self):
+        """
+        Suscribe la sesión al poller compartido (holdings + watchlist) y aplica los
+        cambios a medida que llegan. Termina con stop_quote_stream (on_unmount), al
+        iniciarse otro stream en la misma sesión o tras QUOTE_STREAM_MAX_SECONDS.
+        """
+        stream_id = uuid.uuid4().hex
+        async with self:
+            self._quote_stream_id = stream_id
+
+        deadline = time.monotonic() + QUOTE_STREAM_MAX_SECONDS
+        try:
+            while time.monotonic() < deadline:
+                async with self:
+                    if self._quote_stream_id != stream_id:
+                        break
+                    tickers = [h.ticker for h in self.holdings] + [w.ticker for w in self.watchlist]
+
+                # Re-suscribir con los tickers actuales (cambian al cargar o editar la página)
+                queue = quote_poller.subscribe(stream_id, tickers)
+                try:
+                    changes = await asyncio.wait_for(queue.get(), timeout=QUOTE_STREAM_RESYNC)
+                except asyncio.TimeoutError:
+                    continue
+
+                async with self:
+                    if self._quote_stream_id != stream_id:
+                        break
+                    self._apply_quote_changes(changes)
+        finally:
+            quote_poller.unsubscribe(stream_id)
+
+    def stop_quote_stream(self):
+        """Corta el stream de cotizaciones de la sesión (on_unmount)."""
+        self._quote_stream_id = ""
+
+    def _apply_quote_changes(self, changes: QuoteChanges):
+        """Actualiza solo las filas y campos que cambiaron, más los totales derivados."""
+        prev_closes = dict(self._prev_closes)
+        for ticker, fields in changes.items():
+            if "prev_close" in fields:
+                prev_closes[ticker] = fields["prev_close"]
+        self._prev_closes = prev_closes
+
+        prices = {t: f["price"] for t, f in changes.items() if "price" in f}
+        if any(h.ticker in prices for h in self.holdings):
+            holdings = [
+                h.model_copy(update={
+                    "price": round(prices[h.ticker], 2),
+                    "value": round(h.shares * prices[h.ticker], 2),
+                    "pnl_pct": round((prices[h.ticker] / h.avg_buy - 1) * 100, 2) if h.avg_buy > 0 else 0.0,
+                })
+                if h.ticker in prices else h
+                for h in self.holdings
+            ]
+            current_total = sum(h.value for h in holdings)
+            cost_basis = sum(h.shares * h.avg_buy for h in holdings)
+            self.holdings = [
+                h.model_copy(update={"weight": round(h.value / current_total * 100, 2) if current_total > 0 else 0.0})
+                for h in holdings
+            ]
+            self.total_value = round(current_total, 2)
+            self.total_pnl = (
+                round(((current_total - cost_basis) / cost_basis) * 100, 2)
+                if cost_basis > 0
+                else 0.0
+            )
+            yesterday_total = sum(h.shares * prev_closes.get(h.ticker, 0.0) for h in holdings)
+            self._set_daily_pnl(current_total, yesterday_total)
+
+        if any(w.ticker in changes for w in self.watchlist):
+            self.watchlist = [
+                w.model_copy(update={
+                    field: round(changes[w.ticker][field], 2)
+                    for field in ("price", "change_pct")
+                    if field in changes[w.ticker]
+                })
+                if w.ticker in changes else w
+                for w in self.watchlist
+            ]
+
+    @rx.event(background=True)
+    async def fetch_watchlist(self):
+        """Watchlist en background: primero valores guardados en assets, luego cotizaciones en vivo."""
         if not supabase:
             return
 
-        response = supabase.table("watchlist").select("ticker").execute()
-        tickers = [item["ticker"] for item in response.data]
-
-        self.watchlist = []
-        for ticker in tickers:
-            try:
-                price = dm.get_current_price(ticker)
-                # Estimamos cambio diario y market cap (mock o simple info)
-                t = yf.Ticker(ticker)
-                change_pct = round(t.fast_info.get("day_change_percent", 0) * 100, 2)
-                mcap = t.fast_info.get("market_cap", 0)
-                mcap_str = f"${mcap/1e9:.1f}B" if mcap > 1e9 else f"${mcap/1e6:.1f}M"
-                
-                self.watchlist.append(WatchlistItem(
-                    ticker=ticker,
-                    price=price,
-                    change_pct=change_pct,
-                    market_cap=mcap_str,
-                    pe_ntm=dm.get_pe_ntm(ticker) or 0
-                ))
-            except Exception as e:
-                print(f"Error fetching watchlist for {ticker}: {e}")
-
-    def toggle_watchlist(self, ticker: str):
+        tickers, stored = await asyncio.to_thread(_read_watchlist)
+        quotes = _stored_quotes(stored)
+        fundamentals = stored[["pe_ntm"]]
+
+        async with self:
+            self.watchlist = _watchlist_items(tickers, quotes, fundamentals)
+
+        async for live in _stream_chunks(lambda chunk: market.get_quotes(chunk, include_market_cap=True), tickers):
+            quotes = live.combine_first(quotes)
+            async with self:
+                self.watchlist = _watchlist_items(tickers, quotes, fundamentals)
+
+        async for live in _stream_chunks(
+            lambda chunk: market.get_fundamentals(chunk, quotes["price"], fields=("pe_ntm",)),
+            _stale_fundamentals(stored, fields=("pe_ntm",)),
+        ):
+            fundamentals = live.combine_first(fundamentals)
+            async with self:
+                self.watchlist = _watchlist_items(tickers, quotes, fundamentals)
+
+    async def toggle_watchlist(self, ticker: str):
         """Agrega o quita un ticker de la watchlist."""
         if not supabase:
             return
@@ -361,17 +822,44 @@ class State(rx.State):
         existing = [w.ticker for w in self.watchlist]
         
         if ticker in existing:
-            supabase.table("watchlist").delete().eq("ticker", ticker).execute()
+            await asyncio.to_thread(
+                execute, supabase.table("watchlist").delete().eq("ticker", ticker), "watchlist.delete"
+            )
         else:
             # Primero asegurar que existe en assets
-            profile = dm.validate_ticker(ticker)
+            profile = await market.run(dm.validate_ticker, ticker)
             if profile:
-                supabase.table("assets").insert({
-                    "ticker": ticker,
-                    "name": profile["name"],
-                    "sector": profile["sector"],
-                }).upsert().execute()
-                
-                supabase.table("watchlist").insert({"ticker": ticker}).execute()
-
-        self.fetch_watchlist()
+                def register():
+                    execute(supabase.table("assets").insert({
+                        "ticker": ticker,
+                        "name": profile["name"],
+                        "sector": profile["sector"],
+                    }).upsert(), "assets.upsert")
+
+                    execute(supabase.table("watchlist").insert({"ticker": ticker}), "watchlist.insert")
+
+                await asyncio.to_thread(register)
+
+        return State.fetch_watchlist
+
+    # ── Research ──────────────────────────────────────────────────────
+
+    @rx.event(background=True)
+    async def load_research(self):
+        """Último análisis de IA por ticker desde market_news (sin llamar al modelo)."""
+        if not supabase:
+            return
+
+        async with self:
+            self.research_loading = True
+        try:
+            rows = await asyncio.to_thread(_read_latest_news)
+        except Exception as e:
+            print(f"Error reading market_news: {e}")
+            rows = []
+        async with self:
+            self.research_items = [_research_item(row) for row in rows]
+            self.research_loading = False
+
+    def select_research(self, ticker: str):
+        self.research_ticker = ticker
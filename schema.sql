@@ -26,15 +26,27 @@ CREATE TABLE IF NOT EXISTS transactions (
 );
 
 -- 3. Tabla de Noticias / Sentimiento
+-- Una fila por análisis de IA (daily_sync). article_hash identifica el set de noticias
+-- analizado: si las noticias no cambian no se vuelve a llamar al modelo ni se duplica la fila.
 CREATE TABLE IF NOT EXISTS market_news (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
     ticker TEXT REFERENCES assets(ticker),
+    article_hash TEXT UNIQUE,
     summary TEXT,
     sentiment DECIMAL(4, 3),
     impact_level TEXT CHECK (impact_level IN ('high', 'med', 'low')),
+    headlines JSONB,
     published_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- La página de research lee el último análisis por ticker
+CREATE INDEX IF NOT EXISTS market_news_ticker_published_idx ON market_news (ticker, published_at DESC);
+
+CREATE OR REPLACE VIEW latest_market_news WITH (security_invoker = true) AS
+SELECT DISTINCT ON (ticker) ticker, summary, sentiment, impact_level, headlines, published_at
+FROM market_news
+ORDER BY ticker, published_at DESC;
+
 -- 4. Row Level Security (RLS)
 ALTER TABLE assets ENABLE ROW LEVEL SECURITY;
 
@@ -57,6 +69,9 @@ ALTER TABLE market_news ENABLE ROW LEVEL SECURITY;
 DROP POLICY IF EXISTS "Enable read access for all users" ON market_news;
 CREATE POLICY "Enable read access for all users" ON market_news FOR SELECT USING (true);
 
+DROP POLICY IF EXISTS "Enable write for service role" ON market_news;
+CREATE POLICY "Enable write for service role" ON market_news FOR ALL USING (auth.role() = 'service_role');
+
 -- 6. Tabla de Watchlist
 CREATE TABLE IF NOT EXISTS watchlist (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
@@ -76,6 +91,28 @@ CREATE POLICY "Enable insert for all users" ON watchlist FOR INSERT WITH CHECK (
 DROP POLICY IF EXISTS "Enable delete for all users" ON watchlist;
 CREATE POLICY "Enable delete for all users" ON watchlist FOR DELETE USING (true);
 
+-- 7. Historial diario del portafolio (snapshots de NAV)
+-- Una fila por día: NAV al cierre, flujo externo neto del día y valor por ticker.
+-- La PK sobre date deja las lecturas de rango (dashboard/TWR) en un único index scan.
+CREATE TABLE IF NOT EXISTS portfolio_history (
+    date DATE PRIMARY KEY,
+    nav DECIMAL(14, 2) NOT NULL,
+    net_flow DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    breakdown JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE portfolio_history ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Enable read access for all users" ON portfolio_history;
+CREATE POLICY "Enable read access for all users" ON portfolio_history FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Enable write for service role" ON portfolio_history;
+CREATE POLICY "Enable write for service role" ON portfolio_history FOR ALL USING (auth.role() = 'service_role');
+
 -- Migration SQL (ejecutar manualmente si las tablas ya existen)
 -- ALTER TABLE assets ADD COLUMN IF NOT EXISTS description TEXT;
 -- ALTER TABLE assets ADD COLUMN IF NOT EXISTS avg_buy_price DECIMAL(10, 2);
+-- ALTER TABLE market_news ADD COLUMN IF NOT EXISTS article_hash TEXT UNIQUE;
+-- ALTER TABLE market_news ADD COLUMN IF NOT EXISTS headlines JSONB;
+-- (luego crear market_news_ticker_published_idx y la vista latest_market_news de arriba)
@@ -6,7 +6,15 @@ Scanners:
 1. Earnings Calendar (próximos 7 días)
 2. Price Drop Monitor (≥5% caída diaria)
 3. PE Undervaluation (PE actual < 90% del guardado en DB)
-4. AI News Analysis (filtrado por portfolio)
+4. AI News Analysis (filtrado por portfolio, solo noticias nuevas y sin duplicados;
+   guardado en market_news para la página de research)
+
+Además agrega a `portfolio_history` los días de NAV que falten.
+`--backfill-history` recalcula todo el historial desde la primera transacción y sale.
+
+Modo de ejecución: SYNC_MODE=parallel (default) corre los scanners en paralelo
+con concurrencia acotada por upstream (ver utils/concurrency.py); SYNC_MODE=serial
+o `--serial` los corre en secuencia. El reporte de Telegram es el mismo en ambos.
 """
 
 import sys
@@ -14,20 +22,32 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.data_engine import DataManager
-from utils.ai_engine import analyze_news_impact
+from utils.data_engine import DataManager, MarketSnapshot
+from utils.ai_engine import analyze_news_batch, news_hash
+from utils.concurrency import parallel_map
+from utils.finance_core import first_backdated_date, history_rows
+from utils.metrics import metrics, span
+from utils.news_engine import ingest_news
+from utils.rate_limit import BATCH, fmp_limiter
+from utils.transport import transport
+from utils.supabase_utils import execute, fetch_all
 from supabase import create_client
-import requests
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+import pandas as pd
 
 # ── Config ────────────────────────────────────────────────────────────
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# "parallel" (default) o "serial"; también se puede forzar con --serial
+SYNC_MODE = os.getenv("SYNC_MODE", "parallel")
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-dm = DataManager()
+# El sync es batch: si comparte proceso con la UI, cede la cuota de FMP a los requests interactivos
+dm = DataManager(fmp_priority=BATCH)
 
 
 def send_telegram(message: str) -> None:
@@ -38,24 +58,41 @@ def send_telegram(message: str) -> None:
 
     url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
     try:
-        resp = requests.post(
-            url,
-            json={
-                "chat_id": TELEGRAM_CHAT_ID,
-                "text": message,
-                "parse_mode": "Markdown",
-            },
-            timeout=10,
-        )
+        with span("telegram", "sendMessage") as call:
+            resp = transport.post(
+                url,
+                json={
+                    "chat_id": TELEGRAM_CHAT_ID,
+                    "text": message,
+                    "parse_mode": "Markdown",
+                },
+            )
+            call.bytes = len(resp.content)
+            if not resp.ok:
+                call.status = "error"
         print(f"Telegram Response ({resp.status_code}): {resp.text[:200]}")
     except Exception as e:
         print(f"Telegram Error: {e}")
 
 
 def get_portfolio_tickers() -> List[str]:
-    """Obtiene tickers únicos del portfolio (transacciones)."""
-    data = supabase.table("transactions").select("ticker").execute().data
-    return list({item["ticker"] for item in data}) if data else []
+    """Obtiene tickers únicos del portfolio (transacciones), en orden estable."""
+    data = execute(supabase.table("transactions").select("ticker"), "transactions.select").data
+    return sorted({item["ticker"] for item in data}) if data else []
+
+
+def get_stored_pe(tickers: List[str]) -> Dict[str, float]:
+    """
+    PE NTM guardado en DB (referencia histórica) para todos los tickers en una sola query.
+    Se lee antes de actualizar precios para que el scanner compare contra el valor previo.
+    """
+    data = execute(supabase.table("assets").select("ticker,pe_ntm").in_("ticker", tickers), "assets.select").data
+    return {row["ticker"]: float(row["pe_ntm"]) for row in data or [] if row.get("pe_ntm")}
+
+
+def _map(fn: Callable, items: List, parallel: bool) -> List:
+    """Itera tickers en serie o sobre el thread pool según el modo del sync."""
+    return parallel_map(fn, items) if parallel else [fn(item) for item in items]
 
 
 def scan_earnings(tickers: List[str]) -> List[str]:
@@ -68,11 +105,11 @@ def scan_earnings(tickers: List[str]) -> List[str]:
     return lines
 
 
-def scan_price_drops(tickers: List[str]) -> List[str]:
+def scan_price_drops(tickers: List[str], snapshot: MarketSnapshot) -> List[str]:
     """Scanner 2: Caídas de precio ≥5% en el día."""
     lines = []
     for ticker in tickers:
-        change = dm.get_daily_price_change(ticker)
+        change = snapshot.change_pct.get(ticker.upper())
         if change is not None and change <= -5.0:
             lines.append(f"• {ticker} cayó *{change}%* hoy")
         elif change is not None and change >= 5.0:
@@ -80,17 +117,13 @@ def scan_price_drops(tickers: List[str]) -> List[str]:
     return lines
 
 
-def scan_pe_undervaluation(tickers: List[str]) -> List[str]:
+def scan_pe_undervaluation(tickers: List[str], stored_pe: Dict[str, float], snapshot: MarketSnapshot) -> List[str]:
     """Scanner 3: PE actual < 90% del PE guardado en DB (subvaluación)."""
     lines = []
     for ticker in tickers:
-        # Obtener PE guardado en DB como referencia histórica
-        asset = supabase.table("assets").select("pe_ntm").eq("ticker", ticker).execute()
-        if not asset.data or not asset.data[0].get("pe_ntm"):
-            continue
-        historical_pe = float(asset.data[0]["pe_ntm"])
-
-        current_pe = dm.get_pe_ntm(ticker)
+        # PE guardado en DB como referencia histórica
+        historical_pe = stored_pe.get(ticker, 0)
+        current_pe = snapshot.pe_ntm.get(ticker.upper())
         if current_pe is None or historical_pe <= 0:
             continue
 
@@ -103,30 +136,179 @@ def scan_pe_undervaluation(tickers: List[str]) -> List[str]:
     return lines
 
 
-def update_prices_and_fundamentals(tickers: List[str]) -> int:
-    """Actualiza precios y fundamentales en la DB."""
-    updated = 0
-    for ticker in tickers:
+def store_analyses(analyses: Dict[str, Dict], hashes: Dict[str, str], news: Dict[str, List[Dict]]) -> int:
+    """Guarda en market_news un análisis por ticker con sus titulares (upsert por article_hash)."""
+    now = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for ticker, analysis in analyses.items():
+        items = news.get(ticker.upper()) or []
+        published = [n["publishedDate"] for n in items if n.get("publishedDate")]
+        rows.append({
+            "ticker": ticker,
+            "article_hash": hashes[ticker],
+            "summary": analysis.get("summary"),
+            "sentiment": analysis.get("sentiment", 0),
+            "impact_level": analysis.get("impact_level", "low"),
+            "headlines": [
+                {
+                    "title": n.get("title", ""),
+                    "site": n.get("site", ""),
+                    "url": n.get("url", ""),
+                    "published_at": n.get("publishedDate", ""),
+                    "excerpt": (n.get("text") or "")[:280],
+                }
+                for n in items
+            ],
+            "published_at": max(published) if published else now,
+        })
+    if not rows:
+        return 0
+    try:
+        execute(supabase.table("market_news").upsert(rows, on_conflict="article_hash"), "market_news.upsert")
+    except Exception as e:
+        # Sin la migración de schema.sql el scanner sigue funcionando, solo no persiste
+        print(f"  market_news write error: {e}")
+        return 0
+    return len(rows)
+
+
+def scan_ai_news(tickers: List[str], parallel: bool = False) -> List[str]:
+    """Scanner 4: Análisis IA de noticias (filtrado por portfolio)."""
+
+    # Solo noticias posteriores a lo ya guardado en market_news y sin duplicados
+    news = ingest_news(dm, supabase, tickers)
+    if not news:
+        return []
+    news_by_ticker = {
+        ticker: [n.get("text") or n.get("title", "") for n in articles]
+        for ticker, articles in news.items()
+    }
+
+    # Triage local; solo lo ambiguo o de alto impacto va a Gemini (por tandas, con cache)
+    analyses = analyze_news_batch(news_by_ticker, parallel=parallel)
+    hashes = {ticker: news_hash(ticker, texts) for ticker, texts in news_by_ticker.items()}
+    # Si Gemini falló para un escalado no se guarda: la próxima corrida lo reintenta
+    store_analyses(
+        {t: a for t, a in analyses.items() if not a.get("escalated_failed")},
+        hashes,
+        {t.upper(): articles for t, articles in news.items()},
+    )
+
+    lines = []
+    for ticker, analysis in analyses.items():
+        if analysis.get("impact_level") in ("high", "med"):
+            sentiment_emoji = "🟢" if analysis.get("sentiment", 0) > 0 else "🔴"
+            lines.append(
+                f"• {sentiment_emoji} {ticker}: {analysis.get('summary', 'N/A')}"
+            )
+    return lines
+
+
+def update_prices_and_fundamentals(tickers: List[str], snapshot: MarketSnapshot, parallel: bool = False) -> int:
+    """Actualiza precios y fundamentales en la DB a partir del snapshot."""
+    # Timestamp real (la UI lo usa para decidir si los fundamentales siguen frescos)
+    updated_at = datetime.now(timezone.utc).isoformat()
+
+    def update(ticker: str) -> None:
         print(f"  Updating {ticker}...")
-        price = dm.get_current_price(ticker)
-        pe = dm.get_pe_ntm(ticker)
-        fcf = dm.get_fcf_per_share(ticker)
+        symbol = ticker.upper()
+        pe = snapshot.pe_ntm.get(symbol)
+        fcf = snapshot.fcf_share.get(symbol)
 
-        update_data = {"last_price": price, "last_updated": "now()"}
+        update_data = {"last_price": snapshot.prices.get(symbol, 0.0), "last_updated": updated_at}
         if pe is not None:
             update_data["pe_ntm"] = pe
         if fcf is not None:
             update_data["fcf_share"] = fcf
 
-        supabase.table("assets").update(update_data).eq("ticker", ticker).execute()
-        updated += 1
-    return updated
+        execute(supabase.table("assets").update(update_data).eq("ticker", ticker), "assets.update")
+
+    _map(update, tickers, parallel)
+    return len(tickers)
 
 
-def run_sync():
-    """Ejecuta el sync diario completo."""
+def sync_portfolio_history(backfill: bool = False) -> Optional[int]:
+    """
+    Escribe snapshots diarios de NAV en portfolio_history.
+    Por defecto agrega los días posteriores al último guardado y, si se cargaron
+    transacciones con fecha de días ya guardados, recalcula desde la más vieja.
+    Con backfill=True recalcula y pisa todo desde la primera transacción.
+    Retorna la cantidad de filas escritas, o None si falló (el reporte lo indica).
+    """
+    try:
+        return _write_portfolio_history(backfill)
+    except Exception as e:
+        # Un error de Supabase o de precios no debe tirar el sync ni el reporte de Telegram
+        print(f"  portfolio_history error: {e}")
+        return None
+
+
+def _write_portfolio_history(backfill: bool) -> int:
+    # Marca de la corrida, tomada antes de leer: una transacción cargada durante el sync se ve en la próxima
+    written_at = datetime.now(timezone.utc).isoformat()
+    tx_data = fetch_all(
+        lambda: supabase.table("transactions").select("ticker,date,type,shares,price,amount,created_at"),
+        operation="transactions.select",
+    )
+    if not tx_data:
+        return 0
+    tx = pd.DataFrame(tx_data)
+
+    last = None
+    if not backfill:
+        latest = execute(
+            supabase.table("portfolio_history").select("date,created_at").order("date", desc=True).limit(1),
+            "portfolio_history.select",
+        ).data
+        last = latest[0] if latest else None
+
+    if last is None:
+        # Backfill o primera corrida: todo desde la primera transacción, pisando lo guardado
+        since = pd.Timestamp(tx["date"].min())
+    else:
+        since = pd.Timestamp(last["date"]) + pd.Timedelta(days=1)
+        # Transacciones cargadas con fecha de un día ya guardado: recalcular desde ahí
+        backdated = first_backdated_date(tx, last["date"], last.get("created_at"))
+        if backdated is not None:
+            print(f"  Backdated transactions: recomputing from {backdated:%Y-%m-%d}.")
+            since = backdated
+
+    # Precios desde una semana antes: las transacciones previas se acumulan en ese primer día
+    start = (since - pd.Timedelta(days=7)).strftime("%Y-%m-%d")
+    prices = dm.get_price_history(tx["ticker"].unique().tolist(), start=start)
+    if prices.empty:
+        print("  No price history available. Skipping portfolio_history.")
+        return 0
+
+    rows = [{**row, "created_at": written_at} for row in history_rows(tx, prices, since=since)]
+    for i in range(0, len(rows), 500):
+        execute(supabase.table("portfolio_history").upsert(rows[i:i + 500], on_conflict="date"), "portfolio_history.upsert")
+
+    print(f"  portfolio_history: {len(rows)} day(s) written.")
+    return len(rows)
+
+
+def _run_stage(name: str, fn: Callable, args: tuple):
+    """
+    Corre una etapa del sync; si falla lo loguea y retorna None para que
+    el resto de las etapas y el reporte de Telegram salgan igual.
+    """
+    try:
+        return fn(*args)
+    except Exception as e:
+        print(f"  {name} stage error: {e}")
+        return None
+
+
+def run_sync(mode: str = SYNC_MODE):
+    """
+    Ejecuta el sync diario completo.
+    mode="parallel" corre los scanners en simultáneo (cada uno con fan-out por ticker,
+    acotado por upstream); mode="serial" los corre uno tras otro. El reporte es idéntico.
+    """
+    parallel = mode == "parallel"
     print("=" * 50)
-    print("SmartFolio Daily Sync — Starting...")
+    print(f"SmartFolio Daily Sync — Starting ({mode})...")
     print("=" * 50)
 
     # ── Obtener Tickers del Portfolio ──
@@ -138,39 +320,47 @@ def run_sync():
 
     print(f"Portfolio tickers: {tickers}")
 
-    # ── Actualizar Precios ──
-    print("\n📊 Updating prices & fundamentals...")
-    updated_count = update_prices_and_fundamentals(tickers)
-
-    # ── Scanner 1: Earnings ──
-    print("\n📅 Scanning earnings calendar...")
-    earnings_lines = scan_earnings(tickers)
-
-    # ── Scanner 2: Price Drops ──
-    print("\n📉 Scanning price movements...")
-    price_lines = scan_price_drops(tickers)
-
-    # ── Scanner 3: PE Undervaluation ──
-    print("\n💎 Scanning PE undervaluation...")
-    pe_lines = scan_pe_undervaluation(tickers)
-
-    # ── Scanner 4: AI News (filtrado por portfolio) ──
-    print("\n🤖 Running AI news analysis...")
-    ai_lines = []
-    for ticker in tickers:
-        # Usar noticias reales de FMP si disponible, sino mock
-        news_data = dm._get_fmp(f"stock_news", {"tickers": ticker, "limit": 3})
-        if news_data:
-            news_texts = [n.get("text", n.get("title", "")) for n in news_data[:3]]
-        else:
-            news_texts = [f"{ticker} market update."]
-
-        analysis = analyze_news_impact(news_texts)
-        if analysis.get("impact_level") in ("high", "med"):
-            sentiment_emoji = "🟢" if analysis.get("sentiment", 0) > 0 else "🔴"
-            ai_lines.append(
-                f"• {sentiment_emoji} {ticker}: {analysis.get('summary', 'N/A')}"
-            )
+    # PE de referencia leído antes de que update_prices_and_fundamentals lo sobrescriba
+    stored_pe = get_stored_pe(tickers)
+
+    # ── Snapshot de Mercado (un fetch por ticker y tipo de dato) ──
+    print("\n📸 Building market snapshot...")
+    snapshot = dm.build_snapshot(tickers, parallel=parallel)
+
+    stages = {
+        # ── Actualizar Precios ──
+        "update": ("📊 Updating prices & fundamentals...", update_prices_and_fundamentals, (tickers, snapshot, parallel)),
+        # ── Scanner 1: Earnings ──
+        "earnings": ("📅 Scanning earnings calendar...", scan_earnings, (tickers,)),
+        # ── Scanner 2: Price Drops ──
+        "price": ("📉 Scanning price movements...", scan_price_drops, (tickers, snapshot)),
+        # ── Scanner 3: PE Undervaluation ──
+        "pe": ("💎 Scanning PE undervaluation...", scan_pe_undervaluation, (tickers, stored_pe, snapshot)),
+        # ── Scanner 4: AI News (filtrado por portfolio) ──
+        "ai": ("🤖 Running AI news analysis...", scan_ai_news, (tickers, parallel)),
+        # ── Snapshots de NAV ──
+        "history": ("🗓️ Appending portfolio history...", sync_portfolio_history, ()),
+    }
+
+    results = {}
+    if parallel:
+        with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+            futures = {}
+            for name, (label, fn, args) in stages.items():
+                print(f"\n{label}")
+                futures[name] = pool.submit(_run_stage, name, fn, args)
+            results = {name: future.result() for name, future in futures.items()}
+    else:
+        for name, (label, fn, args) in stages.items():
+            print(f"\n{label}")
+            results[name] = _run_stage(name, fn, args)
+
+    failed = [name for name, result in results.items() if result is None]
+    updated_count = results["update"]
+    earnings_lines = results["earnings"] or []
+    price_lines = results["price"] or []
+    pe_lines = results["pe"] or []
+    ai_lines = results["ai"] or []
 
     # ── Construir Reporte ──
     report_sections = ["🚀 *SmartFolio Daily Report*", ""]
@@ -196,7 +386,13 @@ def run_sync():
         report_sections.append("")
 
     if not (earnings_lines or price_lines or pe_lines or ai_lines):
-        report_sections.append(f"✅ Updated {updated_count} assets. No alerts today.")
+        if updated_count is None:
+            report_sections.append("✅ No alerts today.")
+        else:
+            report_sections.append(f"✅ Updated {updated_count} assets. No alerts today.")
+
+    if failed:
+        report_sections.append(f"⚠️ Fallaron: {', '.join(failed)} (ver logs).")
 
     report = "\n".join(report_sections)
     print(f"\n{'=' * 50}")
@@ -204,8 +400,16 @@ def run_sync():
     print(f"{'=' * 50}")
 
     send_telegram(report)
+
+    # ── Tiempos por upstream ──
+    print(f"\n⏱️ Upstream timings:\n{metrics.summary()}")
+    print(f"Quote cache: {dm.quote_cache_stats()}")
+    print(f"FMP quota: {fmp_limiter.stats()}")
     print("\nSync Complete. ✅")
 
 
 if __name__ == "__main__":
-    run_sync()
+    if "--backfill-history" in sys.argv:
+        sync_portfolio_history(backfill=True)
+    else:
+        run_sync("serial" if "--serial" in sys.argv else SYNC_MODE)
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Antes de importar utils: cache propio por corrida y sin cuota de FMP (los tests no pegan a la red)
+os.environ.setdefault("SMARTFOLIO_CACHE_DIR", tempfile.mkdtemp(prefix="smartfolio-tests-"))
+os.environ.setdefault("FMP_RATE_PER_MINUTE", "0")
+os.environ.setdefault("FMP_RATE_PER_DAY", "0")
+
+import utils.ai_engine as ai_engine
+from utils.concurrency import CircuitBreaker
+from utils.fundamentals_store import FundamentalsStore
+
+
+class EchoModel:
+    """Responde un item por cada ticker del prompt; guarda los prompts recibidos."""
+
+    def __init__(self, sentiment: float = -0.7):
+        self.sentiment = sentiment
+        self.prompts = []
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        items = [
+            {"ticker": t, "summary": f"{t}: análisis del modelo", "sentiment": self.sentiment, "impact_level": "high"}
+            for t in re.findall(r"### (\S+)", prompt)
+        ]
+        return SimpleNamespace(text=json.dumps(items))
+
+    @property
+    def calls(self) -> int:
+        return len(self.prompts)
+
+
+class FlakyModel(EchoModel):
+    """Falla la primera llamada y después responde como EchoModel."""
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        if not self.prompts:
+            self.prompts.append(prompt)
+            raise RuntimeError("503 Service Unavailable")
+        return await super().generate_content_async(prompt, generation_config)
+
+
+class LoopRecordingModel(EchoModel):
+    """Como EchoModel, pero guarda en qué event loop corrió cada llamada."""
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.loops = []
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.loops.append(asyncio.get_running_loop())
+        await asyncio.sleep(self.delay)
+        return await super().generate_content_async(prompt, generation_config)
+
+
+@pytest.fixture
+def gemini(monkeypatch, tmp_path):
+    """Gemini con key de prueba, cache y breaker propios; `gemini.model` se puede reemplazar."""
+    holder = SimpleNamespace(model=FlakyModel())
+    monkeypatch.setattr(ai_engine, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(ai_engine, "_get_model", lambda: holder.model)
+    monkeypatch.setattr(ai_engine, "_cache", FundamentalsStore(os.path.join(tmp_path, "fundamentals.sqlite")))
+    monkeypatch.setattr(ai_engine, "_breaker", CircuitBreaker(3, 300))
+    return holder
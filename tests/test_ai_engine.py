@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+import utils.ai_engine as ai_engine
+from conftest import EchoModel, LoopRecordingModel
+from utils.concurrency import CircuitBreaker
+
+# Noticias que el léxico escala (evento de alto impacto) y una que resuelve solo
+ESCALATED = {
+    "TSLA": ["Tesla faces an SEC investigation over fraud claims."],
+    "NVDA": ["Nvidia announces an acquisition of a networking startup."],
+    "AAPL": ["Apple hit with antitrust lawsuit in Europe."],
+}
+QUIET = {"KO": ["Coca-Cola opens a new bottling plant in Atlanta."]}
+
+
+def test_escalated_tickers_share_one_request(gemini):
+    gemini.model = EchoModel()
+    results = ai_engine.analyze_news_batch({**ESCALATED, **QUIET})
+
+    assert gemini.model.calls == 1
+    assert {t: results[t]["source"] for t in results} == {"TSLA": "gemini", "NVDA": "gemini", "AAPL": "gemini", "KO": "lexicon"}
+    assert "### KO" not in gemini.model.prompts[0]
+
+
+def test_batch_size_splits_requests(gemini, monkeypatch):
+    monkeypatch.setattr(ai_engine, "GEMINI_BATCH_SIZE", 2)
+    gemini.model = EchoModel()
+    ai_engine.analyze_news_batch(ESCALATED, parallel=True)
+
+    assert gemini.model.calls == 2
+
+
+def test_unchanged_news_is_served_from_cache(gemini):
+    gemini.model = EchoModel()
+    first = ai_engine.analyze_news_batch(ESCALATED)
+    second = ai_engine.analyze_news_batch(ESCALATED)
+
+    assert gemini.model.calls == 1
+    assert first == second
+
+    ai_engine.analyze_news_batch({**ESCALATED, "TSLA": ["Tesla recall probe widens, says SEC."]})
+    assert gemini.model.calls == 2
+    assert "### TSLA" in gemini.model.prompts[1]
+    assert "### NVDA" not in gemini.model.prompts[1]
+
+
+def test_model_failure_falls_back_to_lexicon(gemini):
+    results = ai_engine.analyze_news_batch({"TSLA": ESCALATED["TSLA"]})
+
+    assert results["TSLA"]["source"] == "lexicon"
+    assert results["TSLA"]["escalated_failed"] is True
+
+
+def test_without_key_everything_stays_local(gemini, monkeypatch):
+    monkeypatch.setattr(ai_engine, "GEMINI_API_KEY", None)
+    results = ai_engine.analyze_news_batch(ESCALATED)
+
+    assert gemini.model.calls == 0
+    assert {r["source"] for r in results.values()} == {"lexicon"}
+
+
+def test_consecutive_calls_share_a_live_event_loop(gemini):
+    gemini.model = LoopRecordingModel()
+    news = {"TSLA": ["Tesla faces an SEC investigation over fraud claims."]}
+
+    first = ai_engine.analyze_news_batch(news)
+    # Otro contenido para no salir del cache
+    second = ai_engine.analyze_news_batch({"TSLA": ["Tesla recall probe widens, says SEC."]})
+
+    assert first["TSLA"]["source"] == second["TSLA"]["source"] == "gemini"
+    assert len(gemini.model.loops) == 2
+    assert gemini.model.loops[0] is gemini.model.loops[1]
+    assert not gemini.model.loops[0].is_closed()
+
+
+def test_cancelled_probe_does_not_leave_breaker_stuck(gemini, monkeypatch):
+    breaker = CircuitBreaker(1, 0)
+    monkeypatch.setattr(ai_engine, "_breaker", breaker)
+    breaker.record_failure()  # abierto; con cooldown 0 la próxima llamada es la prueba half-open
+    gemini.model = LoopRecordingModel(delay=5)
+
+    async def cancelled_call():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                ai_engine.analyze_news_batch_async({"TSLA": ["Tesla SEC probe over fraud claims."]}), 0.2
+            )
+
+    asyncio.run(cancelled_call())
+    # La cancelación llega al loop de Gemini en su propio thread
+    deadline = time.monotonic() + 2
+    while breaker.stats()["consecutive_failures"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert breaker.stats()["consecutive_failures"] == 2
+    assert breaker.allow()
@@ -0,0 +1,58 @@
+import pytest
+
+supabase_pkg = pytest.importorskip("supabase")
+pytest.importorskip("yfinance")
+
+from benchmarks.fixtures import FakeSupabase
+
+# daily_sync crea el cliente de Supabase al importarse
+supabase_pkg.create_client = lambda *a, **k: FakeSupabase({})
+
+import scripts.daily_sync as daily_sync
+
+ARTICLES = {
+    "TSLA": [{
+        "symbol": "TSLA", "title": "Tesla faces SEC probe",
+        "text": "Tesla faces an SEC investigation over fraud claims; shares plunge.",
+        "url": "https://news.example/tsla", "publishedDate": "2024-05-02 10:00:00", "site": "example",
+    }],
+    "AAPL": [{
+        "symbol": "AAPL", "title": "Apple opens a new store",
+        "text": "Apple opens a new retail store in Madrid.",
+        "url": "https://news.example/aapl", "publishedDate": "2024-05-02 10:00:00", "site": "example",
+    }],
+}
+
+
+class FakeNewsDM:
+    def get_stock_news(self, tickers, limit=3, since=None):
+        return {t.upper(): ARTICLES.get(t.upper(), []) for t in tickers}
+
+
+@pytest.fixture
+def db(monkeypatch, gemini):
+    tables = {"market_news": []}
+    # La vista latest_market_news con un análisis por ticker equivale a la tabla
+    tables["latest_market_news"] = tables["market_news"]
+    fake = FakeSupabase(tables)
+    monkeypatch.setattr(daily_sync, "supabase", fake)
+    monkeypatch.setattr(daily_sync, "dm", FakeNewsDM())
+    fake.model = gemini.model
+    return fake
+
+
+def test_failed_escalation_is_retried_on_next_run(db):
+    daily_sync.scan_ai_news(["AAPL", "TSLA"])
+
+    # AAPL nunca se escaló: su análisis local se guarda. TSLA falló en Gemini: no se guarda.
+    stored = {row["ticker"]: row for row in db.tables["market_news"]}
+    assert set(stored) == {"AAPL"}
+    assert db.model.calls == 1
+
+    daily_sync.scan_ai_news(["AAPL", "TSLA"])
+
+    # La noticia de TSLA se vuelve a ingerir y esta vez la analiza Gemini
+    stored = {row["ticker"]: row for row in db.tables["market_news"]}
+    assert db.model.calls == 2
+    assert stored["TSLA"]["summary"] == "TSLA: análisis del modelo"
+    assert len(db.tables["market_news"]) == 2
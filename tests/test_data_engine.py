@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+pytest.importorskip("yfinance")
+
+from benchmarks.fixtures import FakeFMPSession, SyntheticMarket
+from utils import data_engine
+from utils.data_engine import DataManager
+from utils.fundamentals_store import FundamentalsStore
+
+
+@pytest.fixture
+def dm(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_engine, "FMP_API_KEY", "test")
+    manager = DataManager(fundamentals_store=FundamentalsStore(os.path.join(tmp_path, "fundamentals.sqlite")))
+    manager.session = FakeFMPSession(SyntheticMarket(20))
+    return manager
+
+
+def test_bulk_cash_flows_get_shares_from_quote_batch(dm):
+    tickers = dm.session.market.tickers
+
+    assert dm.prefetch_cash_flows(tickers) == len(tickers)
+    requests = dm.session.requests
+    # (5e9 - 1.5e9) / 1e9 acciones del quote, sin volver a pedir el cash-flow por símbolo
+    assert dm.get_fcf_per_share(tickers[0]) == 3.5
+    assert dm.session.requests == requests
+
+
+def test_bulk_rows_without_shares_are_not_cached(dm, monkeypatch):
+    monkeypatch.setattr(dm, "_get_fmp_batch", lambda endpoint, symbols, *args, **kwargs: {})
+
+    assert dm.prefetch_cash_flows(dm.session.market.tickers) == 0
@@ -0,0 +1,224 @@
+import pandas as pd
+import pytest
+
+from utils.finance_core import (
+    build_nav_history,
+    calculate_twr,
+    compute_positions,
+    daily_returns,
+    first_backdated_date,
+    history_rows,
+    modified_dietz,
+    transaction_cash_flows,
+    twr_from_nav,
+    xirr,
+)
+
+
+def tx_frame(rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["ticker", "date", "type", "shares", "price"])
+
+
+def closes(ticker: str, values, start: str = "2024-01-02") -> pd.DataFrame:
+    return pd.DataFrame({ticker: values}, index=pd.bdate_range(start, periods=len(values)))
+
+
+# ── TWR ───────────────────────────────────────────────────────────────
+
+def test_twr_neutralizes_contributions():
+    # +10% cada día; el aporte del día 2 no debe contar como rendimiento
+    tx = tx_frame([
+        ("AAPL", "2024-01-02", "BUY", 10, 100.0),
+        ("AAPL", "2024-01-03", "BUY", 10, 110.0),
+    ])
+    nav = build_nav_history(tx, closes("AAPL", [100.0, 110.0, 121.0]))
+
+    assert nav["nav"].tolist() == [1000.0, 2200.0, 2420.0]
+    assert nav["net_flow"].tolist() == [1000.0, 1100.0, 0.0]
+    assert daily_returns(nav).tolist() == pytest.approx([0.0, 0.1, 0.1])
+    assert twr_from_nav(nav) == pytest.approx(0.21)
+
+
+def test_twr_ignores_withdrawals():
+    tx = tx_frame([
+        ("AAPL", "2024-01-02", "BUY", 10, 100.0),
+        ("AAPL", "2024-01-03", "SELL", 5, 90.0),
+    ])
+    nav = build_nav_history(tx, closes("AAPL", [100.0, 90.0, 99.0]))
+
+    assert twr_from_nav(nav) == pytest.approx(0.9 * 1.1 - 1)
+
+
+def test_calculate_twr_prefers_stored_history():
+    history = pd.DataFrame(
+        {"nav": [1000.0, 1100.0], "net_flow": [1000.0, 0.0]},
+        index=pd.to_datetime(["2024-01-02", "2024-01-03"]),
+    )
+    tx = tx_frame([("AAPL", "2024-01-02", "BUY", 10, 100.0)])
+
+    assert calculate_twr(tx, 0.0, nav_history=history) == 10.0
+
+
+def test_calculate_twr_without_prices_falls_back_to_simple_return():
+    tx = tx_frame([("AAPL", "2024-01-02", "BUY", 10, 100.0)])
+    tx["amount"] = 1000.0
+
+    assert calculate_twr(tx, 1250.0) == 25.0
+
+
+def test_modified_dietz_without_flows_is_simple_return():
+    nav = pd.DataFrame(
+        {"nav": [1000.0, 1050.0, 1200.0], "net_flow": [1000.0, 0.0, 0.0]},
+        index=pd.to_datetime(["2024-01-02", "2024-01-03", "2024-01-04"]),
+    )
+
+    assert modified_dietz(nav) == pytest.approx(0.2)
+
+
+# ── XIRR ──────────────────────────────────────────────────────────────
+
+def test_xirr_one_year():
+    rate = xirr(pd.Series(["2023-01-01", "2024-01-01"]), [-1000.0, 1100.0])
+
+    assert rate == pytest.approx(0.1, abs=1e-6)
+
+
+def test_xirr_needs_flows_of_both_signs():
+    assert xirr(pd.Series(["2023-01-01", "2024-01-01"]), [-1000.0, -100.0]) is None
+    assert xirr(pd.Series(["2023-01-01"]), [-1000.0]) is None
+
+
+def test_cash_flows_from_investor_perspective():
+    tx = tx_frame([
+        ("AAPL", "2023-01-01", "BUY", 10, 100.0),
+        ("AAPL", "2023-07-01", "DIVIDEND", 0, 0.0),
+    ])
+    tx["amount"] = [1000.0, 20.0]
+    flows = transaction_cash_flows(tx, 1100.0, as_of=pd.Timestamp("2024-01-01"))
+
+    assert flows["amount"].tolist() == [-1000.0, 20.0, 1100.0]
+    assert xirr(flows["date"], flows["amount"]) > 0.1
+
+
+# ── Historial incremental ─────────────────────────────────────────────
+
+def test_history_window_matches_full_recompute():
+    tx = tx_frame([
+        ("AAPL", "2024-01-02", "BUY", 10, 100.0),
+        ("AAPL", "2024-01-09", "BUY", 5, 104.0),
+    ])
+    prices = closes("AAPL", [100.0 + i for i in range(10)])
+    full = {row["date"]: row for row in history_rows(tx, prices)}
+
+    # El writer pide precios desde una semana antes de `since`
+    since = pd.Timestamp("2024-01-10")
+    rows = history_rows(tx, prices.loc[since - pd.Timedelta(days=7):], since=since)
+
+    assert [row["date"] for row in rows] == ["2024-01-10", "2024-01-11", "2024-01-12", "2024-01-15"]
+    assert rows == [full[row["date"]] for row in rows]
+    assert rows[0]["breakdown"] == {"AAPL": 15 * 106.0}
+
+
+def test_backdated_transaction_triggers_recompute():
+    tx = tx_frame([
+        ("AAPL", "2024-01-02", "BUY", 10, 100.0),
+        ("MSFT", "2024-01-04", "BUY", 2, 50.0),
+        ("AAPL", "2024-01-12", "BUY", 1, 110.0),
+    ])
+    tx["created_at"] = [
+        "2024-01-02T15:00:00+00:00",
+        "2024-01-10T15:00:00.123456+00:00",  # cargada después del snapshot, con fecha vieja
+        "2024-01-12T15:00:00+00:00",  # posterior al último día guardado: no es backdated
+    ]
+    since = first_backdated_date(tx, "2024-01-08", "2024-01-08T22:00:00+00:00")
+
+    assert since == pd.Timestamp("2024-01-04")
+    prices = pd.concat([closes("AAPL", [100.0] * 10), closes("MSFT", [50.0] * 10)], axis=1)
+    rows = history_rows(tx, prices.loc[since - pd.Timedelta(days=7):], since=since)
+    assert rows[0] == {"date": "2024-01-04", "nav": 1100.0, "net_flow": 100.0,
+                       "breakdown": {"AAPL": 1000.0, "MSFT": 100.0}}
+
+
+def test_no_backdated_transactions():
+    tx = tx_frame([("AAPL", "2024-01-02", "BUY", 10, 100.0)])
+    tx["created_at"] = ["2024-01-02T15:00:00+00:00"]
+
+    assert first_backdated_date(tx, "2024-01-08", "2024-01-08T22:00:00+00:00") is None
+    assert first_backdated_date(tx, "2024-01-08", None) is None
+
+
+# ── Motor de posiciones ───────────────────────────────────────────────
+
+def partial_sale() -> pd.DataFrame:
+    return tx_frame([
+        ("AAPL", "2024-01-02", "BUY", 10, 100.0),
+        ("AAPL", "2024-01-03", "BUY", 10, 120.0),
+        ("AAPL", "2024-01-04", "SELL", 5, 130.0),
+    ])
+
+
+def test_average_cost_partial_sale():
+    pos = compute_positions(partial_sale(), method="average").loc["AAPL"]
+
+    assert pos["shares"] == 15
+    assert pos["avg_cost"] == pytest.approx(110.0)
+    assert pos["cost_basis"] == pytest.approx(1650.0)
+    assert pos["realized_pnl"] == pytest.approx(5 * (130.0 - 110.0))
+
+
+def test_fifo_sells_oldest_lot_first():
+    pos = compute_positions(partial_sale(), method="fifo").loc["AAPL"]
+
+    assert pos["shares"] == 15
+    assert pos["cost_basis"] == pytest.approx(5 * 100.0 + 10 * 120.0)
+    assert pos["realized_pnl"] == pytest.approx(5 * (130.0 - 100.0))
+
+
+def test_fifo_sale_across_lots():
+    tx = tx_frame([
+        ("AAPL", "2024-01-02", "BUY", 10, 100.0),
+        ("AAPL", "2024-01-03", "BUY", 10, 120.0),
+        ("AAPL", "2024-01-04", "SELL", 15, 130.0),
+    ])
+    pos = compute_positions(tx, method="fifo").loc["AAPL"]
+
+    assert pos["cost_basis"] == pytest.approx(5 * 120.0)
+    assert pos["realized_pnl"] == pytest.approx(15 * 130.0 - (1000.0 + 5 * 120.0))
+
+
+@pytest.mark.parametrize("method", ["average", "fifo"])
+def test_closed_position_keeps_realized_pnl_and_reopens_clean(method):
+    tx = tx_frame([
+        ("AAPL", "2024-01-02", "BUY", 10, 100.0),
+        ("AAPL", "2024-01-03", "SELL", 10, 110.0),
+        ("AAPL", "2024-01-04", "BUY", 5, 200.0),
+        ("MSFT", "2024-01-02", "BUY", 4, 50.0),
+        ("MSFT", "2024-01-05", "SELL", 4, 40.0),
+    ])
+    positions = compute_positions(tx, method=method)
+
+    assert positions.loc["AAPL", "avg_cost"] == pytest.approx(200.0)
+    assert positions.loc["AAPL", "realized_pnl"] == pytest.approx(100.0)
+    assert positions.loc["MSFT", "shares"] == 0
+    assert positions.loc["MSFT", "cost_basis"] == 0
+    assert positions.loc["MSFT", "realized_pnl"] == pytest.approx(-40.0)
+
+
+def test_dividends_and_market_values():
+    tx = tx_frame([
+        ("AAPL", "2024-01-02", "BUY", 10, 100.0),
+        ("AAPL", "2024-02-01", "DIVIDEND", 1, 5.0),
+        ("MSFT", "2024-01-02", "BUY", 5, 200.0),
+    ])
+    positions = compute_positions(tx, prices=pd.Series({"AAPL": 150.0, "MSFT": 100.0}))
+
+    assert positions.loc["AAPL", "shares"] == 10
+    assert positions.loc["AAPL", "dividends"] == pytest.approx(5.0)
+    assert positions.loc["AAPL", "unrealized_pnl"] == pytest.approx(500.0)
+    assert positions.loc["AAPL", "unrealized_pct"] == pytest.approx(50.0)
+    assert positions.loc["MSFT", "unrealized_pnl"] == pytest.approx(-500.0)
+    assert positions["weight"].tolist() == pytest.approx([0.75, 0.25])
+
+
+def test_no_transactions():
+    assert compute_positions(tx_frame([])).empty
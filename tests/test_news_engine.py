@@ -0,0 +1,70 @@
+import os
+from typing import List
+
+import pytest
+
+pytest.importorskip("yfinance")
+
+from benchmarks.fixtures import FakeResponse, FakeSupabase
+from utils.data_engine import DataManager
+from utils.fundamentals_store import FundamentalsStore
+from utils.news_engine import ingest_news
+
+
+class CountingFMPSession:
+    """
+    FMP sin noticias: registra cada request para contar el tráfico.
+    Con `busy`, ese ticker llena solo el límite de cualquier request que lo incluya.
+    """
+
+    def __init__(self, busy: str = None):
+        self.requests: List[dict] = []
+        self.busy = busy
+
+    def get(self, url: str, params: dict = None, timeout=None, **kwargs) -> FakeResponse:
+        params = params or {}
+        self.requests.append({"url": url, **params})
+        if self.busy and self.busy in str(params.get("tickers", "")).split(","):
+            return FakeResponse([
+                {"symbol": self.busy, "title": f"{self.busy} headline {i}", "url": f"https://news.example/{i}"}
+                for i in range(int(params["limit"]))
+            ])
+        return FakeResponse([])
+
+
+@pytest.fixture
+def dm(tmp_path):
+    manager = DataManager(fundamentals_store=FundamentalsStore(os.path.join(tmp_path, "fundamentals.sqlite")))
+    manager.session = CountingFMPSession()
+    return manager
+
+
+def test_quiet_incremental_run_costs_one_fmp_request(dm):
+    tickers = ["AAPL", "MSFT", "NVDA"]
+    db = FakeSupabase({
+        "latest_market_news": [
+            {"ticker": t, "published_at": "2024-05-01T12:00:00+00:00", "headlines": []} for t in tickers
+        ],
+    })
+
+    assert ingest_news(dm, db, tickers) == {}
+    assert len(dm.session.requests) == 1
+    assert dm.session.requests[0]["tickers"] == "AAPL,MSFT,NVDA"
+    assert "from" in dm.session.requests[0]
+
+
+def test_untruncated_batch_skips_per_symbol_fallback(dm):
+    assert dm.get_stock_news(["AAPL", "MSFT"], limit=3) == {"AAPL": [], "MSFT": []}
+    assert len(dm.session.requests) == 1
+
+
+def test_truncated_batch_falls_back_with_same_window(dm):
+    dm.session.busy = "AAPL"
+    news = dm.get_stock_news(["AAPL", "MSFT", "NVDA"], limit=2, since="2024-05-01")
+
+    assert len(news["AAPL"]) == 2
+    assert news["MSFT"] == news["NVDA"] == []
+    # Batch truncado por AAPL: MSFT y NVDA se piden por separado, sin salirse de la ventana
+    fallback = dm.session.requests[1:]
+    assert [r["tickers"] for r in fallback] == ["MSFT", "NVDA"]
+    assert all(r["from"] == "2024-05-01" for r in fallback)
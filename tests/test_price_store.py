@@ -0,0 +1,88 @@
+import threading
+from typing import List
+
+import pandas as pd
+
+from utils.price_store import PriceStore
+
+
+class FakeDownloader:
+    """Cierres sintéticos por ticker; registra cada descarga (símbolos y kwargs)."""
+
+    def __init__(self, closes: pd.DataFrame):
+        self.closes = closes
+        self.calls: List[dict] = []
+
+    def __call__(self, symbols, period=None, start=None, **kwargs) -> pd.DataFrame:
+        self.calls.append({"symbols": list(symbols), "period": period, "start": start})
+        frame = self.closes.reindex(columns=list(symbols))
+        return frame.loc[pd.Timestamp(start):] if start else frame
+
+
+def daily(values, start: str = "2024-01-02") -> pd.Series:
+    return pd.Series(values, index=pd.bdate_range(start, periods=len(values)), dtype=float)
+
+
+def test_full_download_then_served_from_disk(tmp_path):
+    download = FakeDownloader(pd.DataFrame({"AAPL": daily([100.0, 101.0, 102.0])}))
+    store = PriceStore(download, path=str(tmp_path))
+
+    closes = store.get_closes(["aapl"])
+    assert closes["AAPL"].tolist() == [100.0, 101.0, 102.0]
+    assert download.calls == [{"symbols": ["AAPL"], "period": "max", "start": None}]
+
+    # Otro proceso con el mismo directorio no vuelve a bajar nada
+    reopened = PriceStore(download, path=str(tmp_path))
+    assert reopened.get_closes(["AAPL"], start="2024-01-03")["AAPL"].tolist() == [101.0, 102.0]
+    assert len(download.calls) == 1
+
+
+def test_append_overwrites_partial_last_bar(tmp_path):
+    download = FakeDownloader(pd.DataFrame({"AAPL": daily([100.0, 101.0, 95.0])}))
+    store = PriceStore(download, path=str(tmp_path), max_age=0)
+    store.get_closes(["AAPL"])
+
+    # Cierre definitivo del 04/01 muy distinto del intradía guardado, más una barra nueva
+    download.closes = pd.DataFrame({"AAPL": daily([100.0, 101.0, 103.0, 104.0])})
+    closes = store.get_closes(["AAPL"])
+
+    assert download.calls[-1] == {"symbols": ["AAPL"], "period": None, "start": "2024-01-03"}
+    assert closes["AAPL"].tolist() == [100.0, 101.0, 103.0, 104.0]
+
+
+def test_split_on_completed_bar_rewrites_history(tmp_path):
+    download = FakeDownloader(pd.DataFrame({"AAPL": daily([100.0, 102.0, 104.0])}))
+    store = PriceStore(download, path=str(tmp_path), max_age=0)
+    store.get_closes(["AAPL"])
+
+    # Split 2:1: yfinance ajusta hacia atrás toda la historia
+    download.closes = pd.DataFrame({"AAPL": daily([50.0, 51.0, 52.0, 53.0])})
+    closes = store.get_closes(["AAPL"])
+
+    assert [call["period"] for call in download.calls] == ["max", None, "max"]
+    assert closes["AAPL"].tolist() == [50.0, 51.0, 52.0, 53.0]
+
+
+def test_download_does_not_block_readers(tmp_path):
+    download = FakeDownloader(pd.DataFrame({"AAPL": daily([100.0]), "MSFT": daily([200.0])}))
+    store = PriceStore(download, path=str(tmp_path))
+    store.get_closes(["AAPL"])
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow(symbols, **kwargs):
+        started.set()
+        release.wait(5)
+        return download(symbols, **kwargs)
+
+    store.download = slow
+    worker = threading.Thread(target=store.get_closes, args=(["MSFT"],))
+    worker.start()
+    try:
+        assert started.wait(5)
+        # AAPL está al día: se lee mientras la descarga de MSFT sigue en curso
+        assert store.get_closes(["AAPL"])["AAPL"].tolist() == [100.0]
+    finally:
+        release.set()
+        worker.join(5)
+    assert store.get_closes(["MSFT"])["MSFT"].tolist() == [200.0]
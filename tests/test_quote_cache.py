@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import quote_cache
+from utils.quote_cache import QUOTE_COLUMNS, QuoteCache
+
+
+class FakeClock:
+    """Reloj manual para mover el tiempo sin dormir."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(quote_cache, "time", fake)
+    return fake
+
+
+def quotes(**prices) -> pd.DataFrame:
+    return pd.DataFrame({"price": prices}, dtype=float)
+
+
+def test_fresh_then_stale_then_missing(clock):
+    cache = QuoteCache(ttls={"price": 60}, stale_grace=300)
+    cache.store(quotes(AAPL=190.0))
+
+    assert cache.lookup(["AAPL", "MSFT"], ["price"]) == (["AAPL"], [], ["MSFT"])
+
+    clock.now += 61
+    assert cache.lookup(["AAPL"], ["price"]) == ([], ["AAPL"], [])
+
+    clock.now += 300
+    assert cache.lookup(["AAPL"], ["price"]) == ([], [], ["AAPL"])
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["stale_hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_stale_value_is_still_served_by_frame(clock):
+    cache = QuoteCache(ttls={"price": 60}, stale_grace=300)
+    cache.store(quotes(AAPL=190.0))
+    clock.now += 120
+
+    frame = cache.frame(["AAPL"])
+    assert list(frame.columns) == QUOTE_COLUMNS
+    assert frame.loc["AAPL", "price"] == 190.0
+
+
+def test_nan_is_not_cached_and_counts_as_miss(clock):
+    cache = QuoteCache(ttls={"price": 60}, stale_grace=300)
+    cache.store(quotes(AAPL=190.0, MSFT=np.nan))
+
+    assert cache.lookup(["AAPL", "MSFT"], ["price"]) == (["AAPL"], [], ["MSFT"])
+
+
+def test_nan_refresh_keeps_previous_value(clock):
+    cache = QuoteCache(ttls={"price": 60}, stale_grace=300)
+    cache.store(quotes(AAPL=190.0))
+    clock.now += 120
+    cache.store(quotes(AAPL=np.nan))
+
+    assert cache.lookup(["AAPL"], ["price"]) == ([], ["AAPL"], [])
+    assert cache.frame(["AAPL"]).loc["AAPL", "price"] == 190.0
+
+
+def test_every_requested_field_must_be_cached(clock):
+    cache = QuoteCache(ttls={"price": 60, "market_cap": 3600}, stale_grace=0)
+    cache.store(quotes(AAPL=190.0))
+
+    assert cache.lookup(["AAPL"], ["price", "market_cap"]) == ([], [], ["AAPL"])
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = QuoteCache(ttls={"price": 60}, stale_grace=0, max_size=2)
+    cache.store(quotes(AAPL=1.0, MSFT=2.0))
+    cache.lookup(["AAPL"], ["price"])
+    cache.store(quotes(NVDA=3.0))
+
+    assert cache.lookup(["AAPL", "MSFT", "NVDA"], ["price"]) == (["AAPL", "NVDA"], [], ["MSFT"])
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,37 @@
+import os
+import threading
+import time
+
+from utils.fundamentals_store import FundamentalsStore
+from utils.rate_limit import BATCH, INTERACTIVE, RateLimiter
+
+
+def test_daily_quota_is_shared_through_the_store(tmp_path):
+    store = FundamentalsStore(os.path.join(tmp_path, "fundamentals.sqlite"))
+    backend, sync = RateLimiter(0, 3, store=store), RateLimiter(0, 3, store=store)
+
+    assert [backend.acquire(BATCH), sync.acquire(BATCH), backend.acquire(BATCH)] == [True, True, True]
+    assert sync.acquire(BATCH) is False
+    assert backend.stats()["remaining_today"] == 0
+
+
+def test_concurrent_grants_never_exceed_the_quota(tmp_path):
+    limiter = RateLimiter(0, 20, store=FundamentalsStore(os.path.join(tmp_path, "fundamentals.sqlite")))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(limiter.acquire(BATCH))) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(results) == 20
+    assert limiter.stats()["used_today"] == 20
+
+
+def test_interactive_requests_give_up_quickly():
+    limiter = RateLimiter(1, 0, timeout=30, interactive_timeout=0.2)
+    assert limiter.acquire(BATCH)
+
+    start = time.monotonic()
+    assert limiter.acquire(INTERACTIVE) is False
+    assert time.monotonic() - start < 1
@@ -1,43 +1,320 @@
 import os
+import re
 import json
-import google.generativeai as genai
-from typing import List, Dict
+import time
+import asyncio
+import hashlib
+import threading
+import typing
+from typing import List, Dict, Tuple
+from utils.concurrency import UPSTREAM_LIMITS, CircuitBreaker
+from utils.fundamentals_store import FundamentalsStore
+from utils.metrics import metrics, span
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    # Sin el SDK se trabaja como sin GEMINI_API_KEY: solo el análisis local
+    genai = None
 
 # Configurar Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") if genai is not None else None
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
-def analyze_news_impact(news_texts: List[str]) -> Dict:
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+# Tickers por request: un prompt con las noticias de todos, una respuesta JSON con un item por ticker
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "20"))
+NEWS_PER_TICKER = 5
+NEWS_MAX_CHARS = 1000
+# Cambiarlo invalida el cache de análisis (ej. si cambia el prompt)
+PROMPT_VERSION = "1"
+# Deadline por request y circuit breaker: tras N fallas seguidas no se llama al modelo por un rato
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+GEMINI_CIRCUIT_FAILURES = int(os.getenv("GEMINI_CIRCUIT_FAILURES", "3"))
+GEMINI_CIRCUIT_COOLDOWN = float(os.getenv("GEMINI_CIRCUIT_COOLDOWN", "300"))
+
+IMPACT_LEVELS = ("high", "med", "low")
+
+# ── Triage local ──────────────────────────────────────────────────────
+# Léxico financiero chico (estilo Loughran-McDonald): peso por término.
+FINANCE_LEXICON = {
+    # positivos
+    "beat": 1.0, "beats": 1.0, "surge": 1.0, "surges": 1.0, "soar": 1.0, "soars": 1.0,
+    "jump": 0.7, "jumps": 0.7, "rally": 0.7, "rallies": 0.7, "gain": 0.5, "gains": 0.5,
+    "rise": 0.5, "rises": 0.5, "record": 0.7, "growth": 0.5, "strong": 0.6, "profit": 0.4,
+    "upgrade": 1.0, "upgraded": 1.0, "outperform": 0.8, "bullish": 0.8, "raises": 0.6,
+    "raised": 0.6, "expands": 0.4, "approval": 0.8, "approved": 0.8, "buyback": 0.6,
+    "exceeds": 0.8, "exceeded": 0.8, "tops": 0.7, "boost": 0.6, "boosts": 0.6,
+    # negativos
+    "miss": -1.0, "misses": -1.0, "missed": -1.0, "plunge": -1.0, "plunges": -1.0,
+    "slump": -1.0, "slumps": -1.0, "drop": -0.6, "drops": -0.6, "fall": -0.5, "falls": -0.5,
+    "decline": -0.5, "declines": -0.5, "weak": -0.6, "loss": -0.6, "losses": -0.6,
+    "downgrade": -1.0, "downgraded": -1.0, "underperform": -0.8, "bearish": -0.8,
+    "cuts": -0.6, "cut": -0.6, "lawsuit": -0.8, "probe": -0.8, "investigation": -0.8,
+    "recall": -0.8, "fraud": -1.0, "bankruptcy": -1.0, "layoffs": -0.6, "warning": -0.7,
+    "warns": -0.7, "delay": -0.5, "delays": -0.5, "fined": -0.7,
+}
+# Eventos que mueven el precio: con alguno de estos siempre decide el modelo.
+HIGH_IMPACT_TERMS = {
+    "earnings", "quarterly", "guidance", "outlook", "merger", "acquisition", "acquire", "acquires", "takeover",
+    "bankruptcy", "fraud", "sec", "investigation", "probe", "recall", "lawsuit", "fda",
+    "downgrade", "downgraded", "upgrade", "upgraded", "layoffs", "split", "delisting",
+    "buyback", "antitrust", "default",
+}
+NEGATIONS = {"not", "no", "never", "without", "fails", "failed"}
+# Por debajo de este |sentiment| un texto con señales mixtas se considera ambiguo.
+LEXICON_AMBIGUOUS_BELOW = float(os.getenv("LEXICON_AMBIGUOUS_BELOW", "0.3"))
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+class NewsAnalysis(typing.TypedDict):
+    ticker: str
+    summary: str
+    sentiment: float
+    impact_level: str
+
+
+_model = None
+_model_lock = threading.Lock()
+_loop = None
+_loop_lock = threading.Lock()
+_cache = FundamentalsStore()
+_breaker = CircuitBreaker(GEMINI_CIRCUIT_FAILURES, GEMINI_CIRCUIT_COOLDOWN)
+metrics.register_collector("gemini_circuit", _breaker.stats)
+
+
+def _get_model():
+    """El GenerativeModel se arma una sola vez por proceso (siempre se usa desde _gemini_loop)."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = genai.GenerativeModel(GEMINI_MODEL)
+        return _model
+
+
+def news_hash(ticker: str, news_texts: List[str]) -> str:
+    """Hash del contenido analizado: mismas noticias para el mismo ticker = mismo análisis."""
+    payload = "\n".join([PROMPT_VERSION, ticker.upper()] + [t[:NEWS_MAX_CHARS] for t in news_texts[:NEWS_PER_TICKER]])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def analyze_news_impact(news_texts: List[str], ticker: str = "") -> Dict:
     """
     Analiza una lista de textos de noticias y devuelve JSON estructurado usando Google Gemini.
     """
+    return analyze_news_batch({ticker or "N/A": news_texts})[ticker or "N/A"]
+
+
+def lexicon_analysis(news_texts: List[str]) -> Tuple[Dict, bool]:
+    """
+    Análisis local con FINANCE_LEXICON (sin red): sentiment en [-1, 1] e impacto
+    según los eventos de HIGH_IMPACT_TERMS. Retorna (análisis, escalar), donde
+    escalar indica que hay un evento de alto impacto o señales mixtas y conviene el modelo.
+    """
+    texts = [t[:NEWS_MAX_CHARS] for t in news_texts[:NEWS_PER_TICKER] if t]
+    score = 0.0
+    positive = negative = 0
+    events = set()
+    for text in texts:
+        words = _WORD_RE.findall(text.lower())
+        for i, word in enumerate(words):
+            if word in HIGH_IMPACT_TERMS:
+                events.add(word)
+            weight = FINANCE_LEXICON.get(word)
+            if weight is None:
+                continue
+            # "did not beat", "no growth": la negación cercana invierte el término
+            if NEGATIONS.intersection(words[max(0, i - 3):i]):
+                weight = -weight
+            score += weight
+            if weight > 0:
+                positive += 1
+            else:
+                negative += 1
+
+    # El +2 amortigua: una sola palabra no alcanza para un sentiment extremo
+    sentiment = round(max(-1.0, min(1.0, score / (positive + negative + 2))), 3)
+    mixed = bool(positive and negative) and abs(sentiment) < LEXICON_AMBIGUOUS_BELOW
+    if events:
+        impact = "high" if abs(sentiment) >= LEXICON_AMBIGUOUS_BELOW else "med"
+    else:
+        impact = "low"
+
+    tone = "positivo" if sentiment > 0.1 else "negativo" if sentiment < -0.1 else "neutral"
+    lead = texts[0].split(". ")[0][:160] if texts else ""
+    summary = f"Análisis local: tono {tone} en {len(texts)} noticia{'' if len(texts) == 1 else 's'}"
+    if events:
+        summary += f" ({', '.join(sorted(events))})"
+    if lead:
+        summary += f". {lead}"
+    analysis = {"summary": summary, "sentiment": sentiment, "impact_level": impact, "source": "lexicon"}
+    return analysis, bool(events) or mixed
+
+
+def _gemini_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop propio para las llamadas a Gemini, en un thread daemon. El cliente async
+    del SDK (y el modelo cacheado) quedan atados al loop donde se usaron por primera vez:
+    un asyncio.run por llamada los dejaría apuntando a un loop cerrado.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="gemini-loop", daemon=True).start()
+        return _loop
+
+
+def analyze_news_batch(news_by_ticker: Dict[str, List[str]], parallel: bool = False) -> Dict[str, Dict]:
+    """Variante bloqueante de analyze_news_batch_async (daily_sync); `parallel` habilita requests simultáneos."""
+    concurrency = UPSTREAM_LIMITS["gemini"] if parallel else 1
+    return asyncio.run_coroutine_threadsafe(_analyze_news(news_by_ticker, concurrency), _gemini_loop()).result()
+
+
+async def analyze_news_batch_async(news_by_ticker: Dict[str, List[str]],
+                                   concurrency: int = UPSTREAM_LIMITS["gemini"]) -> Dict[str, Dict]:
+    """Análisis de noticias desde código async; corre en el loop de Gemini (ver _gemini_loop)."""
+    future = asyncio.run_coroutine_threadsafe(_analyze_news(news_by_ticker, concurrency), _gemini_loop())
+    return await asyncio.wrap_future(future)
+
+
+async def _analyze_news(news_by_ticker: Dict[str, List[str]], concurrency: int) -> Dict[str, Dict]:
+    """
+    Triage: cada ticker se analiza primero con el léxico local y solo los ambiguos
+    o de alto impacto van a Gemini, con un request por cada GEMINI_BATCH_SIZE
+    tickers (salida estructurada: un item por ticker). Sin GEMINI_API_KEY queda el
+    análisis local; si el modelo falla para un ticker escalado también, pero con
+    `escalated_failed=True` (no debe guardarse como analizado).
+    Los resultados de Gemini se cachean por hash del contenido, así que si las
+    noticias de un ticker no cambiaron no se vuelve a llamar al modelo.
+    Como mucho `concurrency` requests a la vez, cada uno con deadline GEMINI_TIMEOUT:
+    el peor caso es ceil(tandas / concurrency) * GEMINI_TIMEOUT, y casi nada con el
+    circuit breaker abierto.
+    """
+    local = {ticker: lexicon_analysis(texts) for ticker, texts in news_by_ticker.items()}
+    results = {ticker: analysis for ticker, (analysis, _) in local.items()}
     if not GEMINI_API_KEY:
-         return {"summary": "No Gemini API Key found", "sentiment": 0, "impact_level": "low"}
+        return results
+
+    escalated = [ticker for ticker, (_, escalate) in local.items() if escalate]
+    print(f"  AI triage: {len(results) - len(escalated)} local, {len(escalated)} escalated to Gemini")
+
+    pending: Dict[str, List[str]] = {}
+    hashes = {ticker: news_hash(ticker, news_by_ticker[ticker]) for ticker in escalated}
+    for ticker in escalated:
+        hit, cached = _cache.get("gemini-news", ticker, {"hash": hashes[ticker]})
+        if hit:
+            results[ticker] = cached
+        else:
+            pending[ticker] = news_by_ticker[ticker]
+
+    tickers = list(pending)
+    batches = [{t: pending[t] for t in tickers[i:i + GEMINI_BATCH_SIZE]} for i in range(0, len(tickers), GEMINI_BATCH_SIZE)]
+    # El semáforo es del event loop actual: se crea por llamada
+    semaphore = asyncio.BoundedSemaphore(max(1, concurrency))
+    for analyses in await asyncio.gather(*(_analyze_batch(batch, semaphore) for batch in batches)):
+        for ticker, analysis in analyses.items():
+            _cache.put("gemini-news", ticker, {"hash": hashes[ticker]}, analysis)
+            results[ticker] = analysis
+
+    # Escalados que Gemini no resolvió: queda el léxico, marcado para que no se persista
+    # y la próxima corrida los vuelva a mandar al modelo
+    for ticker in pending:
+        if results[ticker].get("source") == "lexicon":
+            results[ticker] = {**results[ticker], "escalated_failed": True}
+    return results
+
+
+async def _analyze_batch(news_by_ticker: Dict[str, List[str]], semaphore: asyncio.Semaphore) -> Dict[str, Dict]:
+    """
+    Un request async a Gemini para todos los tickers de `news_by_ticker`. Vacío si
+    falla, vence el deadline o el circuit breaker está abierto (queda el análisis local).
+    """
+    prompt = _build_prompt(news_by_ticker)
+
+    start = time.perf_counter()
+    async with semaphore:
+        metrics.record_wait("gemini", time.perf_counter() - start)
+        if not _breaker.allow():
+            print(f"Gemini AI: circuit open, skipping {list(news_by_ticker)}")
+            return {}
+        try:
+            model = _get_model()
+            # Salida estructurada: lista JSON validada contra el schema
+            with span("gemini", "generate_content") as call:
+                try:
+                    response = await asyncio.wait_for(
+                        model.generate_content_async(
+                            prompt,
+                            generation_config={
+                                "response_mime_type": "application/json",
+                                "response_schema": list[NewsAnalysis],
+                            },
+                        ),
+                        timeout=GEMINI_TIMEOUT,
+                    )
+                except asyncio.TimeoutError:
+                    call.status = "timeout"
+                    raise
+                call.bytes = len(response.text.encode())
+
+            items = json.loads(response.text)
+        except asyncio.CancelledError:
+            # Cancelado desde afuera: cuenta como falla para que una prueba half-open no quede colgada
+            _breaker.record_failure()
+            raise
+        except Exception as e:
+            _breaker.record_failure()
+            print(f"Gemini AI Error: {type(e).__name__}: {e}")
+            return {}
+    _breaker.record_success()
+    return _parse_items(items, news_by_ticker)
+
+
+def _build_prompt(news_by_ticker: Dict[str, List[str]]) -> str:
+    sections = []
+    for ticker, texts in news_by_ticker.items():
+        body = "\n".join(f"- {t[:NEWS_MAX_CHARS]}" for t in texts[:NEWS_PER_TICKER])
+        sections.append(f"### {ticker}\n{body}")
+    combined_text = "\n\n".join(sections)
 
-    combined_text = "\n".join(news_texts[:5]) 
-    
-    prompt = f"""
-    Eres un analista financiero experto. Analiza las siguientes noticias:
+    return f"""
+    Eres un analista financiero experto. Analiza las noticias de cada ticker:
     {combined_text}
-    
-    Responde ÚNICAMENTE con un JSON válido siguiendo estrictamente este esquema:
-    {{
-        "summary": "Resumen ejecutivo de 1 frase en español",
-        "sentiment": float (entre -1.0 muy negativo y 1.0 muy positivo),
-        "impact_level": "high" | "med" | "low"
-    }}
-    """
-    
+
+    Responde con un item por ticker ({", ".join(news_by_ticker)}), con:
+    - "ticker": el ticker tal cual aparece arriba
+    - "summary": resumen ejecutivo de 1 frase en español
+    - "sentiment": float entre -1.0 (muy negativo) y 1.0 (muy positivo)
+    - "impact_level": "high" | "med" | "low"
+    """
+
+
+def _parse_items(items, news_by_ticker: Dict[str, List[str]]) -> Dict[str, Dict]:
+    """Items de la respuesta del modelo indexados por los tickers pedidos."""
+    analyses = {}
+    for item in items if isinstance(items, list) else []:
+        ticker = str(item.get("ticker", "")).strip()
+        match = next((t for t in news_by_ticker if t.upper() == ticker.upper()), None)
+        if match is not None:
+            analyses[match] = _normalize(item)
+    missing = [t for t in news_by_ticker if t not in analyses]
+    if missing:
+        print(f"Gemini AI: no analysis returned for {missing}")
+    return analyses
+
+
+def _normalize(item: Dict) -> Dict:
+    """Acota los campos del modelo al esquema que consume el sync."""
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        # Forzar respuesta JSON
-        response = model.generate_content(
-            prompt,
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
-        return json.loads(response.text)
-    except Exception as e:
-        print(f"Gemini AI Error: {e}")
-        return {"summary": "Error analyzing", "sentiment": 0, "impact_level": "low"}
+        sentiment = max(-1.0, min(1.0, float(item.get("sentiment", 0))))
+    except (TypeError, ValueError):
+        sentiment = 0.0
+    impact = str(item.get("impact_level", "low")).lower()
+    return {
+        "summary": str(item.get("summary", "")).strip() or "N/A",
+        "sentiment": sentiment,
+        "impact_level": impact if impact in IMPACT_LEVELS else "low",
+        "source": "gemini",
+    }
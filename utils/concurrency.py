@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, TypeVar
+
+from utils.metrics import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Máximo de requests simultáneos por upstream (configurable por env).
+UPSTREAM_LIMITS: Dict[str, int] = {
+    "yfinance": int(os.getenv("YFINANCE_MAX_CONCURRENCY", "4")),
+    "fmp": int(os.getenv("FMP_MAX_CONCURRENCY", "4")),
+    "gemini": int(os.getenv("GEMINI_MAX_CONCURRENCY", "2")),
+    "supabase": int(os.getenv("SUPABASE_MAX_CONCURRENCY", "8")),
+}
+SYNC_MAX_WORKERS = int(os.getenv("SYNC_MAX_WORKERS", "16"))
+
+_semaphores: Dict[str, threading.BoundedSemaphore] = {
+    name: threading.BoundedSemaphore(max(1, limit)) for name, limit in UPSTREAM_LIMITS.items()
+}
+
+
+@contextmanager
+def upstream_slot(upstream: str) -> Iterator[None]:
+    """
+    Reserva un slot del upstream dado mientras dura el bloque.
+    En ejecución serial nunca bloquea; en paralelo acota la concurrencia por proveedor.
+    El tiempo de espera por el slot se registra en las métricas del upstream.
+    """
+    semaphore = _semaphores.get(upstream)
+    if semaphore is None:
+        yield
+        return
+    start = time.perf_counter()
+    with semaphore:
+        metrics.record_wait(upstream, time.perf_counter() - start)
+        yield
+
+
+def parallel_map(fn: Callable[[T], R], items: Iterable[T], max_workers: int = SYNC_MAX_WORKERS) -> List[R]:
+    """map() sobre un thread pool, preservando el orden de `items`."""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a un upstream que viene fallando (thread-safe).
+    Tras `failures` errores seguidos se abre por `cooldown` segundos y `allow()`
+    retorna False sin tocar la red; pasado ese tiempo deja pasar una prueba
+    (half-open): si sale bien se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._probing = False
+        self.opened = 0
+        self.short_circuited = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.cooldown:
+                self._probing = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._probing or (self._opened_at is None and self._consecutive >= self.failures):
+                self.opened += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "open": int(self._opened_at is not None),
+                "consecutive_failures": self._consecutive,
+                "opened": self.opened,
+                "short_circuited": self.short_circuited,
+            }
@@ -1,40 +1,163 @@
+import io
 import os
+import random
 import requests
+import threading
 import time
+import pandas as pd
 import yfinance as yf
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from types import MappingProxyType
+from typing import Optional, Dict, List, Mapping, Tuple
+from utils.concurrency import parallel_map, upstream_slot
+from utils.fundamentals_store import FundamentalsStore
+from utils.metrics import metrics, span
+from utils.price_store import PriceStore
+from utils.quote_cache import QUOTE_COLUMNS, QuoteCache
+from utils.rate_limit import INTERACTIVE, fmp_limiter, retry_after
+from utils.transport import transport
 
 FMP_API_KEY = os.getenv("FMP_API_KEY")
 
+FMP_MAX_ATTEMPTS = 3
+# Símbolos por request en los endpoints de FMP que aceptan una lista separada por comas
+FMP_BATCH_SIZE = int(os.getenv("FMP_BATCH_SIZE", "100"))
+# Con menos tickers faltantes que esto, bajar el archivo bulk (todo el mercado) no conviene
+FMP_BULK_MIN_SYMBOLS = int(os.getenv("FMP_BULK_MIN_SYMBOLS", "10"))
+
+# yf.download guarda resultados en estado global del módulo: dos descargas
+# simultáneas desde distintos threads se pisan, así que se serializan.
+_YF_DOWNLOAD_LOCK = threading.Lock()
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """
+    Foto inmutable del mercado para una corrida de daily_sync.
+    Se construye una vez (un dato por ticker y tipo) y se comparte entre todos los scanners.
+    """
+    taken_at: datetime
+    prices: Mapping[str, float] = field(default_factory=dict)
+    prev_closes: Mapping[str, float] = field(default_factory=dict)
+    change_pct: Mapping[str, float] = field(default_factory=dict)
+    pe_ntm: Mapping[str, Optional[float]] = field(default_factory=dict)
+    fcf_share: Mapping[str, Optional[float]] = field(default_factory=dict)
+
 
 class DataManager:
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(
+        self,
+        fundamentals_store: Optional[FundamentalsStore] = None,
+        price_store: Optional[PriceStore] = None,
+        fmp_priority: int = INTERACTIVE,
+    ):
+        # Transporte compartido del proceso (pool keep-alive, gzip, revalidación ETag)
+        self.session = transport
+        # Clase de prioridad de este proceso frente a la cuota de FMP (ver utils/rate_limit.py)
+        self.fmp_priority = fmp_priority
+        self.fundamentals = fundamentals_store or FundamentalsStore()
+        self.prices = price_store or PriceStore(download=self._download_closes)
+        self.quote_cache = QuoteCache()
+        self._refreshing: set = set()
+        self._refresh_lock = threading.Lock()
+        # Endpoints bulk que el plan de FMP rechazó: no se reintentan en este proceso
+        self._bulk_unavailable: set = set()
 
     def _get_fmp(self, endpoint: str, params: dict = None) -> Optional[list | dict]:
         """Realiza requests a FMP con retry logic."""
+        _, data = self._fetch_fmp(endpoint, params)
+        return data or None
+
+    def _fetch_fmp(
+        self, endpoint: str, params: dict = None, version: str = "v3", csv: bool = False
+    ) -> Tuple[bool, Optional[list | dict]]:
+        """
+        Request a FMP con retry logic, pasando por el rate limiter de la cuota.
+        Retorna (ok, data): ok=True si FMP respondió (aunque sea vacío),
+        para distinguir "sin datos" de un error y poder cachear lo primero.
+        `csv=True` para los endpoints bulk, que responden CSV en vez de JSON.
+        """
         if params is None:
             params = {}
-        url = f"https://financialmodelingprep.com/api/v3/{endpoint}"
+        url = f"https://financialmodelingprep.com/api/{version}/{endpoint}"
         params["apikey"] = FMP_API_KEY
 
-        response = None
-        for attempt in range(3):
+        # Sin el ticker: una serie de métricas por endpoint, no por símbolo
+        operation = endpoint.split("/", 1)[0]
+        for attempt in range(FMP_MAX_ATTEMPTS):
+            if attempt:
+                metrics.record_retry("fmp", operation)
+            if not fmp_limiter.acquire(self.fmp_priority):
+                print(f"FMP budget exhausted (or queue timeout): {endpoint}. Skipping.")
+                return False, None
+
+            response = None
             try:
-                response = self.session.get(url, params=params, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                if not data:
-                    return None
-                return data
+                with upstream_slot("fmp"), span("fmp", operation) as call:
+                    response = self.session.get(url, params=params)
+                    call.bytes = len(response.content)
+                    if response.status_code == 429:
+                        call.status = "throttled"
+                    response.raise_for_status()
+                if csv:
+                    return True, _csv_records(response.text)
+                return True, response.json()
             except requests.RequestException as e:
-                if response is not None and response.status_code == 403:
+                status = response.status_code if response is not None else None
+                if status in (403, 429) and "limit reach" in response.text.lower():
+                    # Cuota diaria agotada del lado de FMP: reintentar solo gasta tiempo
+                    fmp_limiter.exhaust()
+                    print(f"FMP daily limit reached: {endpoint}. Skipping FMP until tomorrow.")
+                    return False, None
+                if status == 403:
                     print(f"FMP Permission Error (Free Tier?): {endpoint}. Skipping.")
-                    return None
-                print(f"Error fetching {endpoint}: {e}. Retrying ({attempt + 1}/3)...")
-                time.sleep(2 ** attempt)
-        return None
+                    return False, None
+                if status == 429:
+                    # El limiter frena a todos los requests, no solo a este
+                    delay = retry_after(response.headers) or _backoff(attempt)
+                    fmp_limiter.pause(delay)
+                    print(f"FMP rate limited on {endpoint}. Waiting {delay:.1f}s ({attempt + 1}/{FMP_MAX_ATTEMPTS})...")
+                    continue
+                print(f"Error fetching {endpoint}: {e}. Retrying ({attempt + 1}/{FMP_MAX_ATTEMPTS})...")
+                time.sleep(_backoff(attempt))
+        return False, None
+
+    def _get_fmp_cached(self, endpoint: str, ticker: str, params: dict = None) -> Optional[list | dict]:
+        """
+        Como _get_fmp para `{endpoint}/{ticker}`, pero pasando por FundamentalsStore.
+        Las respuestas vacías también se cachean (ej. ETFs sin estimaciones).
+        Si FMP no responde (sin cuota, o la UI se cansó de esperar turno) se sirve
+        la última respuesta guardada aunque esté vencida.
+        """
+        params = dict(params or {})
+        hit, data = self.fundamentals.get(endpoint, ticker, params)
+        if not hit:
+            ok, data = self._fetch_fmp(f"{endpoint}/{ticker}", dict(params))
+            if ok:
+                self.fundamentals.put(endpoint, ticker, params, data)
+            else:
+                _, data = self.fundamentals.get(endpoint, ticker, params, stale=True)
+        return data or None
+
+    def _get_fmp_batch(
+        self, endpoint: str, symbols: List[str], params: dict = None, symbols_param: Optional[str] = None
+    ) -> Dict[str, List[dict]]:
+        """
+        Endpoint de FMP que acepta varios símbolos separados por coma, en tandas de
+        FMP_BATCH_SIZE: en el path (`quote/AAPL,MSFT`) o en `symbols_param` (`stock_news?tickers=`).
+        Retorna las filas agrupadas por symbol; los símbolos sin datos no aparecen.
+        """
+        grouped: Dict[str, List[dict]] = {}
+        for i in range(0, len(symbols), FMP_BATCH_SIZE):
+            chunk = ",".join(symbols[i:i + FMP_BATCH_SIZE])
+            if symbols_param:
+                data = self._get_fmp(endpoint, {**(params or {}), symbols_param: chunk})
+            else:
+                data = self._get_fmp(f"{endpoint}/{chunk}", dict(params or {}))
+            for row in data or []:
+                grouped.setdefault(str(row.get("symbol", "")).upper(), []).append(row)
+        return grouped
 
     # ── Validación de Ticker ──────────────────────────────────────────
 
@@ -44,8 +167,8 @@ class DataManager:
         Retorna dict con name, sector, description si existe; None si no.
         """
         try:
-            t = yf.Ticker(ticker)
-            info = t.info
+            with upstream_slot("yfinance"), span("yfinance", "info"):
+                info = yf.Ticker(ticker).info
             
             # yf.Ticker siempre retorna un objeto, verificamos si tiene nombre
             if "longName" not in info and "shortName" not in info:
@@ -89,54 +212,324 @@ class DataManager:
     # ── Cambio de Precio Diario ───────────────────────────────────────
 
     def get_daily_price_change(self, ticker: str) -> Optional[float]:
-        """Retorna el % de cambio del día usando yfinance."""
+        """Retorna el % de cambio del día (último cierre vs anterior) vía get_quotes."""
         try:
-            t = yf.Ticker(ticker)
-            hist = t.history(period="2d")
-            if len(hist) < 2:
-                return None
-            prev_close = hist["Close"].iloc[-2]
-            current = hist["Close"].iloc[-1]
-            if prev_close == 0:
-                return None
-            return round(((current - prev_close) / prev_close) * 100, 2)
+            change = self.get_quotes([ticker])["change_pct"].iloc[0]
+            return float(change) if pd.notna(change) else None
         except Exception:
             return None
 
     # ── Fundamentales ─────────────────────────────────────────────────
 
-    def get_pe_ntm(self, ticker: str) -> Optional[float]:
-        """Calcula PE NTM sumando EPS estimados de los próximos 4 trimestres."""
-        data = self._get_fmp(f"analyst-estimates/{ticker}", {"period": "quarter", "limit": 6})
+    def get_pe_ntm(self, ticker: str, price: Optional[float] = None) -> Optional[float]:
+        """
+        Calcula PE NTM sumando EPS estimados de los próximos 4 trimestres.
+        Si se pasa `price` (ej. de get_quotes) se evita otra consulta a yfinance.
+        """
+        data = self._get_fmp_cached("analyst-estimates", ticker, {"period": "quarter", "limit": 6})
         if not data:
             return None
 
         future_eps = [x.get("estimatedEpsAvg", 0) for x in data[:4]]
         total_eps_ntm = sum(future_eps)
 
-        price = self.get_current_price(ticker)
+        if price is None:
+            price = self.get_current_price(ticker)
         if total_eps_ntm > 0 and price:
             return round(price / total_eps_ntm, 2)
         return None
 
+    def prefetch_cash_flows(self, tickers: List[str]) -> int:
+        """
+        Llena FundamentalsStore con el último cash-flow anual de `tickers` usando el
+        endpoint bulk de FMP (todo el mercado, un request por año fiscal), así
+        get_fcf_per_share no hace un request por ticker. El CSV bulk no trae la cantidad
+        de acciones: se completa con sharesOutstanding del `quote` batch, y los que no
+        la tengan no se cachean. Esos, los que no aparezcan en el bulk (o si el plan
+        no lo incluye) siguen por el camino por símbolo.
+        Retorna cuántos tickers quedaron cacheados.
+        """
+        endpoint, params = "cash-flow-statement", {"period": "annual", "limit": 1}
+        symbols = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+        missing = {t for t in symbols if not self.fundamentals.get(endpoint, t, params)[0]}
+        if len(missing) < FMP_BULK_MIN_SYMBOLS or "cash-flow-statement-bulk" in self._bulk_unavailable:
+            return 0
+
+        latest: Dict[str, dict] = {}
+        # El año fiscal en curso solo trae a los que ya presentaron; el anterior cubre al resto
+        for year in (datetime.now().year, datetime.now().year - 1):
+            ok, rows = self._fetch_fmp(
+                "cash-flow-statement-bulk", {"year": year, "period": "annual"}, version="v4", csv=True
+            )
+            if not ok:
+                self._bulk_unavailable.add("cash-flow-statement-bulk")
+                break
+            for row in rows or []:
+                symbol = str(row.get("symbol", "")).upper()
+                if symbol in missing and str(row.get("date", "")) > str(latest.get(symbol, {}).get("date", "")):
+                    latest[symbol] = row
+
+        need_shares = [s for s, row in latest.items() if not row.get("weightedAverageShsOutDil")]
+        shares = {
+            symbol: rows[0]["sharesOutstanding"]
+            for symbol, rows in (self._get_fmp_batch("quote", need_shares) if need_shares else {}).items()
+            if rows[0].get("sharesOutstanding")
+        }
+
+        cached = 0
+        for symbol, row in latest.items():
+            if not row.get("weightedAverageShsOutDil"):
+                if symbol not in shares:
+                    continue
+                row = {**row, "weightedAverageShsOutDil": shares[symbol]}
+            self.fundamentals.put(endpoint, symbol, params, [row])
+            cached += 1
+        return cached
+
     def get_fcf_per_share(self, ticker: str) -> Optional[float]:
         """Calcula FCF/Share = (OCF - Capex) / SharesOutstanding."""
-        cf_data = self._get_fmp(f"cash-flow-statement/{ticker}", {"period": "annual", "limit": 1})
+        cf_data = self._get_fmp_cached("cash-flow-statement", ticker, {"period": "annual", "limit": 1})
         if not cf_data:
             return None
 
         latest = cf_data[0]
         ocf = latest.get("netCashProvidedByOperatingActivities", 0)
         capex = latest.get("capitalExpenditure", 0)
-        shares = latest.get("weightedAverageShsOutDil", 1)
+        shares = latest.get("weightedAverageShsOutDil")
+        if not shares:
+            return None
 
         fcf = ocf - abs(capex)
         return round(fcf / shares, 2)
 
     def get_current_price(self, ticker: str) -> float:
-        """Obtiene precio actual via yfinance."""
+        """Obtiene precio actual via yfinance (pasa por el cache de cotizaciones)."""
         try:
-            ticker_obj = yf.Ticker(ticker)
-            return round(ticker_obj.fast_info["last_price"], 2)
+            price = self.get_quotes([ticker])["price"].iloc[0]
+            return round(float(price), 2) if pd.notna(price) else 0.0
         except Exception:
             return 0.0
+
+    # ── Cotizaciones en Lote ──────────────────────────────────────────
+
+    def get_quotes(self, tickers: List[str], include_market_cap: bool = False) -> pd.DataFrame:
+        """
+        Cotiza varios tickers con una sola descarga batch de yfinance.
+        Retorna un DataFrame columnar indexado por ticker con
+        price, prev_close, change_pct (%) y market_cap (NaN si no se pidió).
+        Los tickers sin datos quedan con NaN.
+
+        Pasa por QuoteCache: los frescos no tocan la red, los vencidos se sirven
+        y se refrescan en background, y solo los faltantes se descargan en línea.
+        """
+        symbols = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+        quotes = pd.DataFrame(index=pd.Index(symbols, name="ticker"), columns=QUOTE_COLUMNS, dtype=float)
+        if not symbols:
+            return quotes
+
+        fields = QUOTE_COLUMNS if include_market_cap else QUOTE_COLUMNS[:3]
+        _, stale, missing = self.quote_cache.lookup(symbols, fields)
+
+        fetched = pd.DataFrame(columns=QUOTE_COLUMNS, dtype=float)
+        if missing:
+            fetched = self._fetch_quotes(missing, include_market_cap)
+            self.quote_cache.store(fetched)
+        if stale:
+            self._refresh_in_background(stale, include_market_cap)
+
+        cached = self.quote_cache.frame(symbols)
+        quotes.update(cached)
+        quotes.update(fetched)
+        if not include_market_cap:
+            quotes["market_cap"] = float("nan")
+        return quotes
+
+    def refresh_quotes(self, tickers: List[str]) -> pd.DataFrame:
+        """
+        Descarga price / prev_close / change_pct sin mirar el cache y lo actualiza.
+        Lo usa el poller compartido: cada ciclo deja el cache fresco para todas las sesiones.
+        """
+        symbols = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+        if not symbols:
+            return pd.DataFrame(columns=QUOTE_COLUMNS[:3], dtype=float)
+        fetched = self._fetch_quotes(symbols, include_market_cap=False)
+        self.quote_cache.store(fetched)
+        return fetched
+
+    def quote_cache_stats(self) -> Dict[str, float]:
+        """Contadores del cache de cotizaciones (hits, misses, size...)."""
+        return self.quote_cache.stats()
+
+    def _fetch_quotes(self, symbols: List[str], include_market_cap: bool) -> pd.DataFrame:
+        """Descarga las cotizaciones de `symbols` en un solo batch (sin cache)."""
+        quotes = pd.DataFrame(index=pd.Index(symbols, name="ticker"), columns=QUOTE_COLUMNS, dtype=float)
+        closes = self._download_closes(symbols, period="5d")
+        if not closes.empty:
+            last = closes.apply(lambda col: col.dropna().iloc[-1] if col.count() >= 1 else float("nan"))
+            prev = closes.apply(lambda col: col.dropna().iloc[-2] if col.count() >= 2 else float("nan"))
+            quotes["price"] = last.reindex(symbols).round(2)
+            quotes["prev_close"] = prev.reindex(symbols).round(2)
+            quotes["change_pct"] = ((last - prev) / prev.where(prev != 0) * 100).reindex(symbols).round(2)
+
+        if include_market_cap:
+            quotes["market_cap"] = self._get_market_caps(symbols, quotes["price"])
+        else:
+            quotes = quotes.drop(columns=["market_cap"])
+        return quotes
+
+    def _refresh_in_background(self, symbols: List[str], include_market_cap: bool) -> None:
+        """Revalida cotizaciones vencidas en un thread, sin duplicar refrescos en curso."""
+        with self._refresh_lock:
+            pending = [t for t in symbols if t not in self._refreshing]
+            self._refreshing.update(pending)
+        if not pending:
+            return
+
+        def refresh():
+            try:
+                self.quote_cache.store(self._fetch_quotes(pending, include_market_cap))
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.difference_update(pending)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    # ── Historial de Precios ──────────────────────────────────────────
+
+    def get_price_history(self, tickers: List[str], start: str, end: Optional[str] = None) -> pd.DataFrame:
+        """
+        Cierres diarios desde `start` para todos los tickers (fechas x tickers), leídos
+        del PriceStore local. Solo va a yfinance por historia nueva o barras faltantes.
+        """
+        return self.prices.get_closes(tickers, start=start, end=end)
+
+    def _download_closes(self, symbols: List[str], **kwargs) -> pd.DataFrame:
+        """Descarga cierres diarios de todos los símbolos en un único request (fechas x tickers)."""
+        try:
+            with upstream_slot("yfinance"), _YF_DOWNLOAD_LOCK, span("yfinance", "download") as call:
+                data = yf.download(
+                    symbols,
+                    interval="1d",
+                    auto_adjust=False,
+                    group_by="column",
+                    progress=False,
+                    threads=True,
+                    **kwargs,
+                )
+                if data is None or data.empty:
+                    call.status = "empty"
+        except Exception as e:
+            print(f"yfinance batch download error: {e}")
+            return pd.DataFrame()
+
+        if data is None or data.empty or "Close" not in data:
+            return pd.DataFrame()
+
+        closes = data["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(symbols[0])
+        closes.columns = [str(c).upper() for c in closes.columns]
+        return closes
+
+    def _get_market_caps(self, symbols: List[str], prices: pd.Series) -> pd.Series:
+        """
+        Market cap = acciones en circulación x precio del batch.
+        Las acciones salen de `quote` de FMP (cien símbolos por request); solo los
+        que FMP no cubre van a yfinance (fast_info), de a un ticker.
+        """
+        shares: Dict[str, float] = {}
+        if FMP_API_KEY:
+            for symbol, rows in self._get_fmp_batch("quote", symbols).items():
+                if rows[0].get("sharesOutstanding"):
+                    shares[symbol] = float(rows[0]["sharesOutstanding"])
+
+        caps = {}
+        for ticker in symbols:
+            try:
+                if ticker not in shares:
+                    with upstream_slot("yfinance"), span("yfinance", "fast_info"):
+                        shares[ticker] = yf.Ticker(ticker).fast_info["shares"]
+                price = prices.get(ticker)
+                caps[ticker] = (
+                    float(shares[ticker]) * float(price) if shares[ticker] and pd.notna(price) else float("nan")
+                )
+            except Exception:
+                caps[ticker] = float("nan")
+        return pd.Series(caps, dtype=float)
+
+    # ── Noticias ──────────────────────────────────────────────────────
+
+    def get_stock_news(self, tickers: List[str], limit: int = 3, since: Optional[str] = None) -> Dict[str, List[dict]]:
+        """
+        Últimas `limit` noticias de FMP por ticker. Pide todos los tickers juntos
+        (stock_news acepta una lista) y solo consulta por separado a los que el
+        batch dejó sin noticias cuando vino truncado (los más cubiertos acaparan el
+        límite). `since` (YYYY-MM-DD) limita a las publicadas desde esa fecha.
+        """
+        symbols = list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
+        if not symbols:
+            return {}
+        window = {"from": since} if since else {}
+        batch_limit = min(1000, limit * 2 * min(len(symbols), FMP_BATCH_SIZE))
+        news = self._get_fmp_batch(
+            "stock_news", symbols, {"limit": batch_limit, **window}, symbols_param="tickers",
+        )
+        # Una tanda que no llenó el límite está completa: los que no tienen noticias no las
+        # tuvieron (en la ventana, si hay `since`). Solo si vino truncada se consulta por
+        # separado a los que quedaron vacíos, con la misma ventana.
+        for i in range(0, len(symbols), FMP_BATCH_SIZE):
+            chunk = symbols[i:i + FMP_BATCH_SIZE]
+            if sum(len(news.get(symbol) or []) for symbol in chunk) < batch_limit:
+                continue
+            for symbol in chunk:
+                if not news.get(symbol):
+                    news[symbol] = self._get_fmp("stock_news", {"tickers": symbol, "limit": limit, **window}) or []
+        return {symbol: (news.get(symbol) or [])[:limit] for symbol in symbols}
+
+    # ── Snapshot de Mercado ───────────────────────────────────────────
+
+    def build_snapshot(self, tickers: List[str], parallel: bool = False) -> MarketSnapshot:
+        """
+        Arma un MarketSnapshot: cotizaciones en un solo batch y luego PE NTM / FCF
+        por ticker reutilizando ese precio (sin volver a consultar yfinance).
+        Los cash-flows se precargan con el endpoint bulk; las estimaciones no
+        tienen variante multi-símbolo en FMP y van por ticker (cacheadas).
+        """
+        quotes = self.get_quotes(tickers)
+        self.prefetch_cash_flows(list(quotes.index))
+
+        def column(name: str) -> Dict[str, float]:
+            return {t: round(float(v), 2) for t, v in quotes[name].items() if pd.notna(v)}
+
+        prices = column("price")
+
+        def fundamentals(ticker: str) -> Tuple[Optional[float], Optional[float]]:
+            return (
+                self.get_pe_ntm(ticker, price=prices.get(ticker) or None),
+                self.get_fcf_per_share(ticker),
+            )
+
+        symbols = list(quotes.index)
+        results = parallel_map(fundamentals, symbols) if parallel else [fundamentals(t) for t in symbols]
+
+        return MarketSnapshot(
+            taken_at=datetime.now(),
+            prices=MappingProxyType(prices),
+            prev_closes=MappingProxyType(column("prev_close")),
+            change_pct=MappingProxyType(column("change_pct")),
+            pe_ntm=MappingProxyType({t: pe for t, (pe, _) in zip(symbols, results)}),
+            fcf_share=MappingProxyType({t: fcf for t, (_, fcf) in zip(symbols, results)}),
+        )
+
+
+def _csv_records(text: str) -> List[dict]:
+    """Filas de un CSV bulk de FMP como dicts (sin las celdas vacías)."""
+    if not text.strip():
+        return []
+    frame = pd.read_csv(io.StringIO(text))
+    return [{k: v for k, v in row.items() if pd.notna(v)} for row in frame.to_dict("records")]
+
+
+def _backoff(attempt: int) -> float:
+    """Backoff exponencial con jitter (evita que los threads reintenten todos juntos)."""
+    return (2 ** attempt) * random.uniform(0.5, 1.0)
@@ -1,39 +1,424 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from typing import Dict, List, Optional
 
-def calculate_twr(transactions_df: pd.DataFrame, current_portfolio_value: float) -> float:
+# Signo de cada tipo de transacción sobre (acciones, flujo externo hacia el portafolio).
+# Un DIVIDEND no mueve acciones: es efectivo que sale del portafolio hacia el inversor.
+SHARE_SIGN = {"BUY": 1.0, "SELL": -1.0, "DIVIDEND": 0.0}
+FLOW_SIGN = {"BUY": 1.0, "SELL": -1.0, "DIVIDEND": -1.0}
+
+
+def _normalize_transactions(transactions_df: pd.DataFrame) -> pd.DataFrame:
+    """Fechas como Timestamp, tipos en mayúscula y amount calculado si falta."""
+    df = transactions_df.copy()
+    df["date"] = pd.to_datetime(df["date"]).dt.normalize()
+    df["type"] = df["type"].fillna("BUY").str.upper()
+    df["shares"] = df["shares"].astype(float)
+    if "amount" not in df or df["amount"].isna().any():
+        df["amount"] = df["shares"] * df["price"].astype(float)
+    df["amount"] = df["amount"].astype(float)
+    return df
+
+
+def position_values(transactions_df: pd.DataFrame, prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Valor de mercado diario de cada posición (índice fecha x columnas ticker).
+
+    transactions_df: columnas ticker, date, type, shares, price (y opcionalmente amount).
+    prices: cierres diarios (índice fecha x columnas ticker).
+
+    Las posiciones son la suma acumulada de acciones firmadas (BUY +, SELL -).
+    Transacciones en días sin cotización se asignan al siguiente día hábil del índice.
+    La columna especial "__flow__" trae el flujo externo del día (BUY +, SELL/DIVIDEND -).
+    """
+    tx = _normalize_transactions(transactions_df)
+    dates = pd.DatetimeIndex(prices.index).normalize()
+    closes = prices.set_axis(dates).sort_index()
+    closes = closes[~closes.index.duplicated(keep="last")]
+    dates = closes.index
+
+    # Alinear cada transacción al primer día de cotización >= su fecha
+    pos = np.searchsorted(dates.values, tx["date"].values, side="left")
+    tx["trade_day"] = dates[np.clip(pos, 0, len(dates) - 1)]
+    tx["qty"] = tx["shares"] * tx["type"].map(SHARE_SIGN).fillna(0.0)
+    tx["flow"] = tx["amount"] * tx["type"].map(FLOW_SIGN).fillna(0.0)
+
+    tickers = sorted(tx["ticker"].unique())
+    changes = tx.pivot_table(index="trade_day", columns="ticker", values="qty", aggfunc="sum")
+    positions = changes.reindex(index=dates, columns=tickers).fillna(0.0).cumsum()
+
+    # Sin cierre todavía (ej. ticker recién listado): usar el siguiente cierre conocido
+    px = closes.reindex(columns=tickers).ffill().bfill().fillna(0.0)
+    values = pd.DataFrame(positions.to_numpy() * px.to_numpy(), index=dates, columns=tickers)
+    values["__flow__"] = tx.groupby("trade_day")["flow"].sum().reindex(dates).fillna(0.0)
+    values.index.name = "date"
+    return values.loc[values.index >= tx["trade_day"].min()]
+
+
+
+def history_rows(transactions_df: pd.DataFrame, prices: pd.DataFrame,
+                 since: Optional[str] = None) -> List[Dict]:
+    """
+    Filas de portfolio_history (date, nav, net_flow, breakdown) para los días >= since.
+    `prices` debe empezar al menos un día hábil antes de `since`: las transacciones
+    previas se acumulan en ese primer día, que no se devuelve.
+    """
+    values = position_values(transactions_df, prices)
+    flows = values.pop("__flow__")
+    nav = values.sum(axis=1)
+    if since is not None:
+        values = values.loc[values.index >= pd.Timestamp(since).normalize()]
+
+    rows = []
+    for day in values.index:
+        breakdown = values.loc[day]
+        rows.append({
+            "date": day.strftime("%Y-%m-%d"),
+            "nav": round(float(nav.loc[day]), 2),
+            "net_flow": round(float(flows.loc[day]), 2),
+            "breakdown": {t: round(float(v), 2) for t, v in breakdown[breakdown != 0].items()},
+        })
+    return rows
+
+
+def first_backdated_date(transactions_df: pd.DataFrame, last_date: str,
+                         written_at: Optional[str]) -> Optional[pd.Timestamp]:
+    """
+    Fecha más vieja entre las transacciones cargadas después del último snapshot
+    (created_at > written_at) pero fechadas en un día ya guardado (date <= last_date).
+    Desde ahí hay que recalcular el historial. None si no hay ninguna.
+    """
+    if written_at is None or "created_at" not in transactions_df:
+        return None
+    created = pd.to_datetime(transactions_df["created_at"], utc=True, format="ISO8601")
+    dates = pd.to_datetime(transactions_df["date"]).dt.normalize()
+    late = (created > pd.to_datetime(written_at, utc=True)) & (dates <= pd.Timestamp(last_date))
+    return dates[late].min() if late.any() else None
+
+POSITION_COLUMNS = [
+    "shares", "cost_basis", "avg_cost", "realized_pnl", "dividends",
+    "price", "market_value", "unrealized_pnl", "unrealized_pct", "weight",
+]
+_EPS = 1e-9
+
+
+def _average_cost(tx: pd.DataFrame) -> pd.DataFrame:
+    """
+    Costo promedio vectorizado. El costo sigue la recurrencia lineal
+    cost_t = m_t * cost_{t-1} + a_t (a_t = monto comprado, m_t = fracción que queda tras
+    una venta), que se resuelve con cumprod/cumsum por tramo: cost_t = R_t * Σ a_k / R_k.
+    Un tramo empieza cada vez que la posición estaba en cero.
+    """
+    keys = tx["ticker"]
+    is_buy = tx["type"] == "BUY"
+    is_sell = tx["type"] == "SELL"
+    shares_after = tx["qty"].groupby(keys).cumsum()
+    shares_before = shares_after - tx["qty"]
+
+    flat_before = shares_before.abs() <= _EPS
+    segment = flat_before.astype(int).groupby(keys).cumsum()
+    group = [keys, segment]
+
+    closes = is_sell & (shares_after <= _EPS)
+    ratio = np.where(is_sell & ~closes & (shares_before > _EPS), shares_after / shares_before.where(shares_before > _EPS, 1.0), 1.0)
+    ratio = pd.Series(ratio, index=tx.index)
+    bought = tx["amount"].where(is_buy, 0.0)
+
+    growth = ratio.groupby(group).cumprod()
+    cost = growth * (bought / growth).groupby(group).cumsum()
+    cost = cost.mask(shares_after <= _EPS, 0.0)
+
+    cost_before = cost.groupby(keys).shift(1).fillna(0.0)
+    avg_before = cost_before / shares_before.where(shares_before > _EPS)
+    realized = (tx["amount"] - tx["shares"] * avg_before).where(is_sell, 0.0).fillna(0.0)
+
+    return pd.DataFrame({
+        "cost_basis": cost.groupby(keys).last(),
+        "realized_pnl": realized.groupby(keys).sum(),
+    })
+
+
+def _fifo_cost(tx: pd.DataFrame) -> pd.DataFrame:
+    """
+    FIFO vectorizado. El costo de las primeras x acciones compradas de un ticker es una
+    función lineal por tramos F(x) (np.interp sobre compras acumuladas). Como FIFO consume
+    siempre los lotes más antiguos, una venta que lleva el vendido acumulado de S-q a S
+    cuesta F(S) - F(S-q). Los tickers se concatenan en un eje global con offsets.
+    """
+    keys = tx["ticker"]
+    is_buy = tx["type"] == "BUY"
+    is_sell = tx["type"] == "SELL"
+
+    buy_shares = tx["shares"].where(is_buy, 0.0)
+    buy_cost = tx["amount"].where(is_buy, 0.0)
+    xp = np.concatenate(([0.0], buy_shares.cumsum().to_numpy()))
+    fp = np.concatenate(([0.0], buy_cost.cumsum().to_numpy()))
+
+    total_bought = buy_shares.groupby(keys).sum()
+    base = total_bought.cumsum() - total_bought          # offset global de cada ticker
+    ticker_base = keys.map(base).to_numpy()
+    ticker_cap = keys.map(total_bought).to_numpy()
+
+    sold = tx["shares"].where(is_sell, 0.0)
+    sold_after = np.minimum(sold.groupby(keys).cumsum().to_numpy(), ticker_cap)
+    sold_before = np.minimum(sold_after, np.maximum(sold_after - sold.to_numpy(), 0.0))
+    cost_of_sold = np.interp(ticker_base + sold_after, xp, fp) - np.interp(ticker_base + sold_before, xp, fp)
+    realized = pd.Series(np.where(is_sell, tx["amount"].to_numpy() - cost_of_sold, 0.0), index=tx.index)
+
+    total_sold = np.minimum(sold.groupby(keys).sum(), total_bought)
+    remaining = (np.interp(base + total_bought, xp, fp) - np.interp(base + total_sold, xp, fp))
+    return pd.DataFrame({
+        "cost_basis": pd.Series(remaining, index=total_bought.index),
+        "realized_pnl": realized.groupby(keys).sum(),
+    })
+
+
+def compute_positions(transactions_df: pd.DataFrame, prices: Optional[pd.Series] = None,
+                      method: str = "average") -> pd.DataFrame:
+    """
+    Motor de posiciones: a partir de las transacciones y un vector de precios (ticker -> precio)
+    calcula, por ticker y sin loops de Python:
+    shares, cost_basis, avg_cost, realized_pnl, dividends, price, market_value,
+    unrealized_pnl, unrealized_pct (%) y weight (fracción del valor total).
+
+    method: "average" (costo promedio) o "fifo".
+    Incluye posiciones cerradas (shares = 0) para conservar su P&L realizado.
+    """
+    if transactions_df.empty:
+        return pd.DataFrame(columns=POSITION_COLUMNS, dtype=float)
+
+    tx = _normalize_transactions(transactions_df)
+    order = ["ticker", "date"] + (["created_at"] if "created_at" in tx else [])
+    tx = tx.sort_values(order, kind="mergesort").reset_index(drop=True)
+    tx["qty"] = tx["shares"] * tx["type"].map(SHARE_SIGN).fillna(0.0)
+
+    cost = _fifo_cost(tx) if method == "fifo" else _average_cost(tx)
+
+    positions = pd.DataFrame(index=pd.Index(sorted(tx["ticker"].unique()), name="ticker"))
+    positions["shares"] = tx.groupby("ticker")["qty"].sum().clip(lower=0.0)
+    positions["shares"] = positions["shares"].where(positions["shares"] > _EPS, 0.0)
+    positions["cost_basis"] = cost["cost_basis"].where(positions["shares"] > 0, 0.0)
+    positions["avg_cost"] = (positions["cost_basis"] / positions["shares"].where(positions["shares"] > 0)).fillna(0.0)
+    positions["realized_pnl"] = cost["realized_pnl"]
+    positions["dividends"] = tx["amount"].where(tx["type"] == "DIVIDEND", 0.0).groupby(tx["ticker"]).sum()
+
+    price = prices.reindex(positions.index) if prices is not None else pd.Series(np.nan, index=positions.index)
+    positions["price"] = price.astype(float)
+    positions["market_value"] = (positions["shares"] * positions["price"]).fillna(0.0)
+    positions["unrealized_pnl"] = (positions["market_value"] - positions["cost_basis"]).where(positions["price"].notna(), 0.0)
+    positions["unrealized_pct"] = (
+        positions["unrealized_pnl"] / positions["cost_basis"].where(positions["cost_basis"] > 0) * 100
+    ).fillna(0.0)
+    total_value = positions["market_value"].sum()
+    positions["weight"] = positions["market_value"] / total_value if total_value > 0 else 0.0
+    return positions[POSITION_COLUMNS]
+
+
+def build_nav_history(transactions_df: pd.DataFrame, prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reconstruye el NAV diario del portafolio a partir de position_values.
+    Retorna DataFrame indexado por fecha con columnas nav y net_flow.
+    """
+    if transactions_df.empty or prices.empty:
+        return pd.DataFrame(columns=["nav", "net_flow"], dtype=float)
+
+    values = position_values(transactions_df, prices)
+    flows = values.pop("__flow__")
+    return pd.DataFrame({"nav": values.sum(axis=1), "net_flow": flows})
+
+
+def append_live_value(nav_history: pd.DataFrame, transactions_df: pd.DataFrame,
+                      current_portfolio_value: float) -> pd.DataFrame:
+    """
+    Agrega (o reemplaza) el punto de hoy con el valor actual del portafolio.
+    Las transacciones posteriores al último día del historial cuentan como flujo de hoy.
+    """
+    history = nav_history.copy()
+    history.index = pd.DatetimeIndex(history.index).normalize()
+    today = pd.Timestamp(datetime.now()).normalize()
+
+    if history.empty or history.index[-1] < today:
+        flow = 0.0
+        if not transactions_df.empty:
+            tx = _normalize_transactions(transactions_df)
+            after = tx["date"] > (history.index[-1] if not history.empty else pd.Timestamp.min)
+            flow = float((tx.loc[after, "amount"] * tx.loc[after, "type"].map(FLOW_SIGN).fillna(0.0)).sum())
+        history.loc[today] = [current_portfolio_value, flow]
+    else:
+        history.iloc[-1, history.columns.get_loc("nav")] = current_portfolio_value
+    return history
+
+
+def daily_returns(nav_history: pd.DataFrame) -> pd.Series:
+    """
+    Retornos diarios de sub-período, neutralizando flujos de caja.
+
+    Con NAV previo > 0 se asume el flujo al cierre: r = (NAV_t - F_t) / NAV_{t-1} - 1.
+    Si el portafolio venía vacío, el retorno es del precio de compra al cierre: r = NAV_t / F_t - 1.
+    """
+    nav = nav_history["nav"].to_numpy(dtype=float)
+    flow = nav_history["net_flow"].to_numpy(dtype=float)
+    prev = np.concatenate(([0.0], nav[:-1]))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.where(
+            prev > 0,
+            (nav - flow) / prev - 1,
+            np.where(flow > 0, nav / flow - 1, 0.0),
+        )
+    return pd.Series(np.nan_to_num(r, nan=0.0, posinf=0.0, neginf=0.0), index=nav_history.index)
+
+
+def twr_from_nav(nav_history: pd.DataFrame) -> float:
+    """TWR encadenado: (1 + r1) * (1 + r2) * ... * (1 + rn) - 1 (como fracción)."""
+    if nav_history.empty:
+        return 0.0
+    return float(np.prod(1.0 + daily_returns(nav_history).to_numpy()) - 1.0)
+
+
+def performance_index(nav_history: pd.DataFrame, base: float = 100.0) -> pd.Series:
+    """
+    Crecimiento acumulado por TWR (sin el efecto de aportes y retiros), normalizado
+    a `base` en el primer día. Comparable directamente con un benchmark base 100.
+    """
+    if nav_history.empty:
+        return pd.Series(dtype=float)
+    growth = (1.0 + daily_returns(nav_history)).cumprod()
+    first = growth.iloc[0]
+    return base * growth / (first if first > 0 else 1.0)
+
+
+def modified_dietz(nav_history: pd.DataFrame) -> float:
+    """
+    Retorno Dietz Modificado del período cubierto por nav_history (como fracción).
+
+    MD = (V_final - V_inicial - ΣF) / (V_inicial + Σ w_i * F_i), con w_i = (T - t_i) / T,
+    donde V_inicial es el NAV antes del primer flujo del período.
+    """
+    if nav_history.empty:
+        return 0.0
+    flows = nav_history["net_flow"].to_numpy(dtype=float)
+    v_start = float(nav_history["nav"].iloc[0] - flows[0])
+    v_end = float(nav_history["nav"].iloc[-1])
+
+    days = (nav_history.index - nav_history.index[0]).days.to_numpy(dtype=float)
+    total_days = days[-1] if days[-1] > 0 else 1.0
+    weights = (total_days - days) / total_days
+
+    denominator = v_start + float(np.dot(weights, flows))
+    if denominator <= 0:
+        return 0.0
+    return (v_end - v_start - flows.sum()) / denominator
+
+
+def xirr(dates: pd.Series, amounts: pd.Series, guess: float = 0.1) -> Optional[float]:
+    """
+    Tasa interna de retorno anualizada para flujos irregulares (perspectiva del inversor:
+    aportes negativos, retiros y valor final positivos). Newton con fallback a bisección.
+    Retorna None si no hay solución (ej. todos los flujos con el mismo signo).
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    if len(amounts) < 2 or (amounts >= 0).all() or (amounts <= 0).all():
+        return None
+
+    dates = pd.to_datetime(pd.Series(dates))
+    years = ((dates - dates.min()).dt.days.to_numpy(dtype=float)) / 365.0
+
+    def npv(rate: float) -> float:
+        return float(np.sum(amounts / (1.0 + rate) ** years))
+
+    def d_npv(rate: float) -> float:
+        return float(np.sum(-years * amounts / (1.0 + rate) ** (years + 1.0)))
+
+    rate = guess
+    for _ in range(50):
+        value, slope = npv(rate), d_npv(rate)
+        if slope == 0:
+            break
+        step = value / slope
+        rate -= step
+        if rate <= -0.9999:
+            break
+        if abs(step) < 1e-10:
+            return rate
+
+    # Bisección sobre un rango amplio si Newton no convergió
+    low, high = -0.9999, 100.0
+    f_low, f_high = npv(low), npv(high)
+    if np.sign(f_low) == np.sign(f_high):
+        return None
+    for _ in range(200):
+        mid = (low + high) / 2
+        f_mid = npv(mid)
+        if abs(f_mid) < 1e-9:
+            break
+        if np.sign(f_mid) == np.sign(f_low):
+            low, f_low = mid, f_mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def transaction_cash_flows(transactions_df: pd.DataFrame, current_portfolio_value: float,
+                           as_of: Optional[datetime] = None) -> pd.DataFrame:
+    """Flujos desde la perspectiva del inversor (para XIRR), más el valor actual como flujo final."""
+    tx = _normalize_transactions(transactions_df)
+    amounts = -tx["amount"] * tx["type"].map(FLOW_SIGN).fillna(0.0)
+    final = pd.DataFrame({"date": [pd.Timestamp(as_of or datetime.now()).normalize()],
+                          "amount": [float(current_portfolio_value)]})
+    return pd.concat([pd.DataFrame({"date": tx["date"], "amount": amounts}), final], ignore_index=True)
+
+
+def calculate_xirr(transactions_df: pd.DataFrame, current_portfolio_value: float) -> float:
+    """Retorno ponderado por dinero (MWR/XIRR) anualizado, en %."""
+    if transactions_df.empty:
+        return 0.0
+    flows = transaction_cash_flows(transactions_df, current_portfolio_value)
+    rate = xirr(flows["date"], flows["amount"])
+    return round(rate * 100, 2) if rate is not None else 0.0
+
+
+def calculate_twr(transactions_df: pd.DataFrame, current_portfolio_value: float,
+                  prices: Optional[pd.DataFrame] = None,
+                  nav_history: Optional[pd.DataFrame] = None) -> float:
     """
     Calcula el Retorno Ponderado por Tiempo (TWR).
-    
+
     Lógica:
     El TWR elimina el efecto de los flujos de caja (depósitos/retiros).
     Se calculan retornos de sub-periodos entre flujos de caja y se encadenan.
-    
+
     Formula: TWR = (1 + r1) * (1 + r2) * ... * (1 + rn) - 1
     Donde r_n = (Valor_final_periodo - Flujo_caja) / Valor_inicial_periodo - 1
+
+    Fuentes del NAV diario, en orden de preferencia:
+    - nav_history: snapshots guardados (tabla portfolio_history, columnas nav y net_flow).
+    - prices: cierres diarios (fechas x tickers) para reconstruir el NAV desde las transacciones.
+    En ambos casos el valor actual se usa como punto de hoy.
+    Sin ninguna de las dos se cae al retorno simple sobre lo invertido.
     """
     if transactions_df.empty:
         return 0.0
 
+    history = None
+    if nav_history is not None and not nav_history.empty:
+        history = nav_history[["nav", "net_flow"]].astype(float)
+    elif prices is not None and not prices.empty:
+        history = build_nav_history(transactions_df, prices)
+
+    if history is not None and not history.empty:
+        if current_portfolio_value > 0:
+            history = append_live_value(history, transactions_df, current_portfolio_value)
+        return round(twr_from_nav(history) * 100, 2)
+
     # Ordenar por fecha
     df = transactions_df.sort_values('date').copy()
-    
-    # Simulación simple de valoración diaria (en prod requeriría historial de precios diarios)
-    # Aquí asumimos que tenemos el valor del portafolio JUSTO ANTES de cada transacción nueva.
-    # Dado que no tenemos historial de precios en DB en este MVP, usaremos el método simplificado de Dietz Modificado
-    # o si se requiere TWR estricto, necesitamos NAV histórico.
-    
-    # Para cumplir el requerimiento con los datos disponibles (solo transacciones y valor actual):
-    # Usaremos una aproximación: Cash Flows ponderados.
-    
+
+    # Sin historial de precios diarios no se puede reconstruir el NAV:
+    # se usa el retorno simple sobre el capital invertido.
     total_invested = df[df['type'] == 'BUY']['amount'].sum()
     if total_invested == 0: return 0.0
-    
-    # Cálculo simple de retorno absoluto para MVP si falta historial diario
+
     absolute_return = (current_portfolio_value - total_invested) / total_invested
     return round(absolute_return * 100, 2)
-
-    # NOTA PARA EL ARQUITECTO: Para TWR real necesitamos una tabla `portfolio_history` 
-    # con snapshots diarios del NAV. Sin eso, TWR matemático exacto es imposible.
-    # Se implementa retorno simple arriba por restricciones de datos del esquema actual.
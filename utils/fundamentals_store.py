@@ -0,0 +1,206 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Directorio de cache local compartido por el backend de Reflex y scripts/daily_sync.py
+CACHE_DIR = os.getenv(
+    "SMARTFOLIO_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"),
+)
+FUNDAMENTALS_DB_PATH = os.getenv("FUNDAMENTALS_DB_PATH", os.path.join(CACHE_DIR, "fundamentals.sqlite"))
+
+# Expiración por endpoint FMP (segundos). Estimaciones y estados contables
+# cambian a lo sumo trimestralmente; un sync diario alcanza para mantenerlos.
+# 23h (no 24h) para que el cron diario siempre encuentre vencidas las estimaciones
+# y las refresque, aunque GitHub Actions lo dispare unos minutos antes.
+ENDPOINT_TTLS = {
+    "analyst-estimates": 23 * 3600,
+    "cash-flow-statement": 7 * 24 * 3600,
+    # Análisis de Gemini: la clave incluye el hash de las noticias, así que solo vence por limpieza
+    "gemini-news": 7 * 24 * 3600,
+}
+DEFAULT_TTL = 24 * 3600
+
+
+class FundamentalsStore:
+    """
+    Cache persistente (SQLite) de respuestas de FMP, clave (endpoint, ticker, params).
+    Cada operación abre su propia conexión, así que es seguro entre threads y procesos.
+    """
+
+    def __init__(self, path: str = FUNDAMENTALS_DB_PATH, ttls: Dict[str, int] = None):
+        self.path = path
+        self.ttls = ttls or ENDPOINT_TTLS
+        self.enabled = True
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        except OSError as e:
+            self._disable(e)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            self._ensure_schema(conn)
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> None:
+        if not self._initialized:
+            with self._init_lock:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS fmp_cache (
+                        endpoint TEXT NOT NULL,
+                        ticker TEXT NOT NULL,
+                        params TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        PRIMARY KEY (endpoint, ticker, params)
+                    )
+                    """
+                )
+                # Contadores de cuota diaria por upstream (ver utils/rate_limit.py)
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS quota_usage (
+                        name TEXT NOT NULL,
+                        day TEXT NOT NULL,
+                        used INTEGER NOT NULL DEFAULT 0,
+                        exhausted INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (name, day)
+                    )
+                    """
+                )
+                conn.commit()
+                self._initialized = True
+
+    @staticmethod
+    def _params_key(params: Optional[dict]) -> str:
+        """Normaliza params (sin apikey) para usarlos como parte de la clave."""
+        clean = {k: v for k, v in (params or {}).items() if k != "apikey"}
+        return json.dumps(clean, sort_keys=True, default=str)
+
+    def ttl_for(self, endpoint: str) -> int:
+        return self.ttls.get(endpoint, DEFAULT_TTL)
+
+    def get(self, endpoint: str, ticker: str, params: dict = None, stale: bool = False) -> Tuple[bool, Any]:
+        """Retorna (hit, payload). hit=False si no existe o expiró (con stale=True, solo si no existe)."""
+        if not self.enabled:
+            return False, None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT payload, fetched_at FROM fmp_cache WHERE endpoint = ? AND ticker = ? AND params = ?",
+                    (endpoint, ticker.upper(), self._params_key(params)),
+                ).fetchone()
+        except sqlite3.Error as e:
+            self._disable(e)
+            return False, None
+
+        if not row or (not stale and time.time() - row[1] > self.ttl_for(endpoint)):
+            return False, None
+        return True, json.loads(row[0])
+
+    def put(self, endpoint: str, ticker: str, params: dict, payload: Any) -> None:
+        """Guarda (o reemplaza) una respuesta con el timestamp actual."""
+        if not self.enabled:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO fmp_cache (endpoint, ticker, params, payload, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                    (endpoint, ticker.upper(), self._params_key(params), json.dumps(payload), time.time()),
+                )
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def purge_expired(self) -> int:
+        """Borra entradas vencidas. Retorna cuántas filas eliminó."""
+        if not self.enabled:
+            return 0
+        removed = 0
+        try:
+            with self._connect() as conn:
+                for (endpoint,) in conn.execute("SELECT DISTINCT endpoint FROM fmp_cache").fetchall():
+                    cur = conn.execute(
+                        "DELETE FROM fmp_cache WHERE endpoint = ? AND fetched_at < ?",
+                        (endpoint, time.time() - self.ttl_for(endpoint)),
+                    )
+                    removed += cur.rowcount
+        except sqlite3.Error as e:
+            self._disable(e)
+        return removed
+
+    # ── Cuotas diarias ────────────────────────────────────────────────
+
+    def consume_quota(self, name: str, day: str, limit: int) -> Optional[int]:
+        """
+        Suma un request al contador `name` del día `day`, compartido por todos los procesos
+        que usan este archivo. Retorna el uso resultante, -1 si la cuota ya estaba
+        agotada (`limit` alcanzado o exhaust_quota) y None si el store no está disponible.
+        """
+        if not self.enabled:
+            return None
+        try:
+            with self._connect() as conn:
+                # Lock de escritura desde la lectura: dos procesos no pueden tomar el último request
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT used, exhausted FROM quota_usage WHERE name = ? AND day = ?", (name, day)
+                ).fetchone()
+                used, exhausted = row or (0, 0)
+                if exhausted or (limit and used >= limit):
+                    return -1
+                conn.execute(
+                    "INSERT INTO quota_usage (name, day, used) VALUES (?, ?, 1) "
+                    "ON CONFLICT (name, day) DO UPDATE SET used = used + 1",
+                    (name, day),
+                )
+                return used + 1
+        except sqlite3.Error as e:
+            self._disable(e)
+            return None
+
+    def exhaust_quota(self, name: str, day: str) -> None:
+        """Marca la cuota del día como agotada (el upstream lo avisó) para todos los procesos."""
+        if not self.enabled:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO quota_usage (name, day, exhausted) VALUES (?, ?, 1) "
+                    "ON CONFLICT (name, day) DO UPDATE SET exhausted = 1",
+                    (name, day),
+                )
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def quota_usage(self, name: str, day: str) -> Optional[Tuple[int, bool]]:
+        """(usados, agotada) del día; None si el store no está disponible."""
+        if not self.enabled:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT used, exhausted FROM quota_usage WHERE name = ? AND day = ?", (name, day)
+                ).fetchone()
+        except sqlite3.Error as e:
+            self._disable(e)
+            return None
+        return (row[0], bool(row[1])) if row else (0, False)
+
+    def _disable(self, error: Exception) -> None:
+        """Si el disco no es usable (read-only, corrupto) se sigue sin cache."""
+        print(f"Fundamentals cache disabled ({self.path}): {error}")
+        self.enabled = False
+
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from utils.data_engine import DataManager
+
+MARKET_DATA_WORKERS = int(os.getenv("MARKET_DATA_WORKERS", "8"))
+FUNDAMENTAL_FIELDS = ["pe_ntm", "fcf_share"]
+
+
+class MarketDataService:
+    """
+    Acceso async a DataManager compartido por todas las sesiones del proceso.
+    - Single-flight: pedidos concurrentes del mismo (campo, ticker) comparten un único fetch.
+    - Pool acotado de workers: lo bloqueante (yfinance, FMP, disco) nunca corre en el event loop.
+    """
+
+    def __init__(self, dm: DataManager, max_workers: int = MARKET_DATA_WORKERS):
+        self.dm = dm
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="market-data")
+        # RLock: add_done_callback ejecuta el callback en el acto si el future ya terminó
+        self._lock = threading.RLock()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self.coalesced = 0
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Corre una llamada bloqueante en el pool del servicio."""
+        return await asyncio.wrap_future(self._pool.submit(fn, *args, **kwargs))
+
+    # ── Cotizaciones ──────────────────────────────────────────────────
+
+    async def get_quotes(self, tickers: Sequence[str], include_market_cap: bool = False) -> pd.DataFrame:
+        """Como DataManager.get_quotes, coalesciendo tickers que ya están en vuelo."""
+        field = "quote+market_cap" if include_market_cap else "quote"
+        return await self._gather(
+            field, tickers, lambda batch: self.dm.get_quotes(batch, include_market_cap=include_market_cap)
+        )
+
+    async def refresh_quotes(self, tickers: Sequence[str]) -> pd.DataFrame:
+        """Como DataManager.refresh_quotes (sin cache), coalesciendo con otros refrescos en vuelo."""
+        return await self._gather("refresh", tickers, self.dm.refresh_quotes)
+
+    # ── Fundamentales ─────────────────────────────────────────────────
+
+    async def get_fundamentals(
+        self, tickers: Sequence[str], prices: Optional[pd.Series] = None, fields: Sequence[str] = FUNDAMENTAL_FIELDS
+    ) -> pd.DataFrame:
+        """
+        P/E NTM y/o FCF por acción (ticker x campo). Cada (campo, ticker) es un fetch
+        independiente; los cash-flows se precargan antes en bloque si faltan muchos.
+        """
+        prices = prices if prices is not None else pd.Series(dtype=float)
+
+        def pe_ntm(batch: List[str]) -> pd.DataFrame:
+            ticker = batch[0]
+            price = prices.get(ticker)
+            value = self.dm.get_pe_ntm(ticker, price=price if pd.notna(price) and price else None)
+            return pd.DataFrame({"pe_ntm": [value]}, index=batch, dtype=float)
+
+        def fcf_share(batch: List[str]) -> pd.DataFrame:
+            return pd.DataFrame({"fcf_share": [self.dm.get_fcf_per_share(batch[0])]}, index=batch, dtype=float)
+
+        fetchers = {"pe_ntm": pe_ntm, "fcf_share": fcf_share}
+        if "fcf_share" in fields:
+            # Muchos tickers sin cache: un request bulk en vez de uno por ticker
+            await self.run(self.dm.prefetch_cash_flows, list(tickers))
+        frames = await asyncio.gather(
+            *(self._gather(field, tickers, fetchers[field], batch=False) for field in fields)
+        )
+        symbols = _symbols(tickers)
+        columns = [frame.reindex(columns=[field]) for frame, field in zip(frames, fields)]
+        return pd.concat(columns, axis=1).reindex(symbols).astype(float)
+
+    # ── Single-flight ─────────────────────────────────────────────────
+
+    async def _gather(
+        self, field: str, tickers: Sequence[str], fetch: Callable[[List[str]], pd.DataFrame], batch: bool = True
+    ) -> pd.DataFrame:
+        """Resultado de `fetch` para `tickers` (filas por ticker), reusando los fetches en vuelo."""
+        symbols = _symbols(tickers)
+        if not symbols:
+            return pd.DataFrame()
+
+        futures = self._submit(field, symbols, fetch, batch)
+        unique = list({id(f): f for f in futures.values()}.values())
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in unique), return_exceptions=True)
+
+        frames = []
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Market data error ({field}): {result}")
+            elif result is not None and not result.empty:
+                frames.append(result)
+        if not frames:
+            return pd.DataFrame(index=pd.Index(symbols, name="ticker"))
+        combined = pd.concat(frames)
+        return combined[~combined.index.duplicated(keep="last")].reindex(symbols)
+
+    def _submit(
+        self, field: str, symbols: List[str], fetch: Callable[[List[str]], pd.DataFrame], batch: bool
+    ) -> Dict[str, Future]:
+        with self._lock:
+            futures: Dict[str, Future] = {}
+            pending = []
+            for symbol in symbols:
+                future = self._inflight.get((field, symbol))
+                if future is not None:
+                    futures[symbol] = future
+                    self.coalesced += 1
+                else:
+                    pending.append(symbol)
+
+            groups = [pending] if batch and pending else [[s] for s in pending]
+            for group in groups:
+                future = self._pool.submit(fetch, group)
+                keys = [(field, s) for s in group]
+                for key, symbol in zip(keys, group):
+                    self._inflight[key] = future
+                    futures[symbol] = future
+                future.add_done_callback(lambda done, keys=keys: self._release(keys, done))
+        return futures
+
+    def _release(self, keys: List[Tuple[str, str]], future: Future) -> None:
+        with self._lock:
+            for key in keys:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+
+def _symbols(tickers: Sequence[str]) -> List[str]:
+    return list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
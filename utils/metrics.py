@@ -0,0 +1,199 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Límites (segundos) del histograma de latencia, estilo Prometheus.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (upstream, operación, status)
+SeriesKey = Tuple[str, str, str]
+
+
+class Span:
+    """Una llamada a un upstream. `bytes` y `status` se pueden ajustar dentro del bloque."""
+
+    def __init__(self, upstream: str, operation: str):
+        self.upstream = upstream
+        self.operation = operation
+        self.status = "ok"
+        self.bytes = 0
+
+
+class _Series:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+
+    def observe(self, seconds: float, size: int) -> None:
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.bytes += size
+
+
+class Metrics:
+    """
+    Registro de métricas del proceso (thread-safe): latencia, bytes y retries por
+    upstream/operación, espera por slot de concurrencia y gauges de colectores.
+    Se exporta en formato texto de Prometheus (`render`) o como tabla (`summary`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[SeriesKey, _Series] = {}
+        self._retries: Dict[Tuple[str, str], int] = {}
+        self._wait: Dict[str, float] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    @contextmanager
+    def span(self, upstream: str, operation: str) -> Iterator[Span]:
+        """Mide el bloque como una llamada a `upstream`; una excepción la marca como error."""
+        span = Span(upstream, operation)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            # Un status puesto a mano (ej. "throttled") es más específico que "error"
+            if span.status == "ok":
+                span.status = "error"
+            raise
+        finally:
+            self.observe(span, time.perf_counter() - start)
+
+    def observe(self, span: Span, seconds: float) -> None:
+        key = (span.upstream, span.operation, span.status)
+        with self._lock:
+            self._series.setdefault(key, _Series()).observe(seconds, span.bytes)
+
+    def record_retry(self, upstream: str, operation: str) -> None:
+        with self._lock:
+            key = (upstream, operation)
+            self._retries[key] = self._retries.get(key, 0) + 1
+
+    def record_wait(self, upstream: str, seconds: float) -> None:
+        """Tiempo esperando un slot de concurrencia del upstream (ver utils/concurrency.py)."""
+        with self._lock:
+            self._wait[upstream] = self._wait.get(upstream, 0.0) + seconds
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, float]]) -> None:
+        """Gauges leídos al exportar: cada clave de `collect()` sale como smartfolio_{name}_{clave}."""
+        self._collectors[name] = collect
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self._retries.clear()
+            self._wait.clear()
+
+    # ── Exportación ───────────────────────────────────────────────────
+
+    def render(self) -> str:
+        """Todas las métricas en formato de exposición de texto de Prometheus."""
+        with self._lock:
+            series = {key: _copy(s) for key, s in self._series.items()}
+            retries = dict(self._retries)
+            wait = dict(self._wait)
+
+        lines = [
+            "# HELP smartfolio_upstream_request_seconds Latencia de llamadas a upstreams.",
+            "# TYPE smartfolio_upstream_request_seconds histogram",
+        ]
+        for (upstream, operation, status), s in sorted(series.items()):
+            labels = f'upstream="{upstream}",operation="{_escape(operation)}",status="{status}"'
+            for bound, count in zip(LATENCY_BUCKETS, s.buckets):
+                lines.append(f'smartfolio_upstream_request_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'smartfolio_upstream_request_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+            lines.append(f"smartfolio_upstream_request_seconds_sum{{{labels}}} {s.total:.6f}")
+            lines.append(f"smartfolio_upstream_request_seconds_count{{{labels}}} {s.count}")
+
+        lines += [
+            "# HELP smartfolio_upstream_response_bytes_total Bytes recibidos de upstreams.",
+            "# TYPE smartfolio_upstream_response_bytes_total counter",
+        ]
+        for (upstream, operation, status), s in sorted(series.items()):
+            labels = f'upstream="{upstream}",operation="{_escape(operation)}",status="{status}"'
+            lines.append(f"smartfolio_upstream_response_bytes_total{{{labels}}} {s.bytes}")
+
+        lines += [
+            "# HELP smartfolio_upstream_retries_total Reintentos por upstream y operación.",
+            "# TYPE smartfolio_upstream_retries_total counter",
+        ]
+        for (upstream, operation), count in sorted(retries.items()):
+            lines.append(
+                f'smartfolio_upstream_retries_total{{upstream="{upstream}",operation="{_escape(operation)}"}} {count}'
+            )
+
+        lines += [
+            "# HELP smartfolio_upstream_wait_seconds_total Tiempo esperando un slot de concurrencia.",
+            "# TYPE smartfolio_upstream_wait_seconds_total counter",
+        ]
+        for upstream, seconds in sorted(wait.items()):
+            lines.append(f'smartfolio_upstream_wait_seconds_total{{upstream="{upstream}"}} {seconds:.6f}')
+
+        for name, collect in sorted(self._collectors.items()):
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"Metrics collector error ({name}): {e}")
+                continue
+            for key, value in values.items():
+                metric = f"smartfolio_{name}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Tabla por upstream/operación ordenada por tiempo total (para logs de daily_sync)."""
+        with self._lock:
+            rows: Dict[Tuple[str, str], List] = {}
+            for (upstream, operation, status), s in self._series.items():
+                row = rows.setdefault((upstream, operation), [0, 0, 0.0, 0.0, 0])
+                row[0] += s.count
+                row[1] += s.count if status == "error" else 0
+                row[2] += s.total
+                row[3] = max(row[3], s.max)
+                row[4] += s.bytes
+            retries = dict(self._retries)
+            wait = dict(self._wait)
+
+        if not rows:
+            return "No upstream calls recorded."
+        lines = [
+            f"{'upstream':<10} {'operation':<28} {'calls':>6} {'errors':>6} {'retries':>7} "
+            f"{'total s':>8} {'avg ms':>8} {'max ms':>8} {'KB':>9}"
+        ]
+        for (upstream, operation), (count, errors, total, peak, size) in sorted(
+            rows.items(), key=lambda item: -item[1][2]
+        ):
+            lines.append(
+                f"{upstream:<10} {operation[:28]:<28} {count:>6} {errors:>6} "
+                f"{retries.get((upstream, operation), 0):>7} {total:>8.2f} "
+                f"{total / count * 1000:>8.1f} {peak * 1000:>8.1f} {size / 1024:>9.1f}"
+            )
+        for upstream, seconds in sorted(wait.items()):
+            if seconds >= 0.01:
+                lines.append(f"{upstream}: {seconds:.2f}s waiting for a concurrency slot")
+        return "\n".join(lines)
+
+
+def _copy(series: _Series) -> _Series:
+    copy = _Series()
+    copy.buckets = list(series.buckets)
+    copy.count, copy.total, copy.max, copy.bytes = series.count, series.total, series.max, series.bytes
+    return copy
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+# Registro único del proceso (backend o daily_sync).
+metrics = Metrics()
+span = metrics.span
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.supabase_utils import fetch_all
+
+# Noticias por ticker que se piden a FMP (antes de descartar viejas y duplicadas).
+NEWS_FETCH_LIMIT = int(os.getenv("NEWS_FETCH_LIMIT", "10"))
+# Ventana de la primera corrida (tickers sin noticias guardadas) y tope hacia atrás.
+NEWS_LOOKBACK_DAYS = int(os.getenv("NEWS_LOOKBACK_DAYS", "3"))
+# Dos artículos con SimHash a esta distancia de Hamming (de 64 bits) o menos son la misma nota.
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "6"))
+
+SIMHASH_BITS = 64
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# ── SimHash ───────────────────────────────────────────────────────────
+
+def simhash(text: str) -> int:
+    """
+    Huella SimHash de 64 bits sobre palabras y bigramas: notas de agencia
+    reescritas (mismo cuerpo, otro título o fuente) quedan a pocos bits de distancia.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    features = tokens + [" ".join(pair) for pair in zip(tokens, tokens[1:])]
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def article_text(article: Dict[str, Any]) -> str:
+    """Texto con el que se compara un artículo (FMP: title/text; market_news: title/excerpt)."""
+    return f"{article.get('title') or ''} {article.get('text') or article.get('excerpt') or ''}".strip()
+
+
+def dedupe(articles: Iterable[Dict[str, Any]], seen: Optional[List[int]] = None,
+           seen_urls: Optional[set] = None) -> List[Dict[str, Any]]:
+    """
+    Descarta artículos con URL ya vista o casi idénticos (SimHash) a uno ya visto
+    o a otro anterior de la misma lista. Conserva el orden (los más nuevos primero).
+    """
+    fingerprints = list(seen or [])
+    urls = set(seen_urls or ())
+    unique = []
+    for article in articles:
+        url = article.get("url")
+        if url and url in urls:
+            continue
+        fingerprint = simhash(article_text(article))
+        if any(hamming(fingerprint, other) <= SIMHASH_MAX_DISTANCE for other in fingerprints):
+            continue
+        fingerprints.append(fingerprint)
+        if url:
+            urls.add(url)
+        unique.append(article)
+    return unique
+
+
+# ── Ingesta incremental ───────────────────────────────────────────────
+
+def stored_news_state(supabase, tickers: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Último análisis guardado por ticker (vista latest_market_news): cuándo se publicó
+    la noticia más nueva ya analizada y sus titulares, para no volver a pedirlos.
+    """
+    if not tickers:
+        return {}
+    try:
+        rows = fetch_all(
+            lambda: supabase.table("latest_market_news").select("ticker,published_at,headlines").in_("ticker", tickers),
+            operation="latest_market_news.select",
+        )
+    except Exception as e:
+        # Sin la vista (migración pendiente) se trabaja como en la primera corrida
+        print(f"  latest_market_news read error: {e}")
+        return {}
+    return {
+        str(row["ticker"]).upper(): {
+            "since": _parse_ts(row.get("published_at")),
+            "headlines": row.get("headlines") or [],
+        }
+        for row in rows
+    }
+
+
+def ingest_news(dm, supabase, tickers: List[str], limit: int = NEWS_FETCH_LIMIT) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Noticias nuevas y únicas por ticker para el análisis IA:
+    1. FMP solo desde la fecha de la última noticia guardada (`from`), en un request batch.
+    2. Se descartan las publicadas antes o en el mismo instante que la última analizada.
+    3. Se descartan duplicados (URL o SimHash) contra lo guardado y entre sí.
+    Los tickers sin noticias nuevas no aparecen en el resultado.
+    """
+    state = stored_news_state(supabase, tickers)
+    floor = datetime.now() - timedelta(days=NEWS_LOOKBACK_DAYS)
+    since = {t: state.get(t.upper(), {}).get("since") for t in tickers}
+    known = [s for s in since.values() if s is not None]
+    # Un solo `from` para el batch: la noticia guardada más vieja, sin ir más atrás del lookback
+    start = max(min(known), floor) if known and len(known) == len(tickers) else floor
+
+    news = dm.get_stock_news(tickers, limit=limit, since=start.strftime("%Y-%m-%d"))
+
+    fresh: Dict[str, List[Dict[str, Any]]] = {}
+    fetched = stale = duplicates = 0
+    for ticker in tickers:
+        articles = news.get(ticker.upper()) or []
+        fetched += len(articles)
+        last = since[ticker]
+        newer = [a for a in articles if last is None or _is_newer(a.get("publishedDate"), last)]
+        stale += len(articles) - len(newer)
+
+        stored = state.get(ticker.upper(), {}).get("headlines", [])
+        unique = dedupe(
+            newer,
+            seen=[simhash(article_text(h)) for h in stored],
+            seen_urls={h.get("url") for h in stored if h.get("url")},
+        )
+        duplicates += len(newer) - len(unique)
+        if unique:
+            fresh[ticker] = unique
+
+    print(
+        f"  News ingest: {fetched} fetched, {stale} already analyzed, "
+        f"{duplicates} duplicates, {sum(map(len, fresh.values()))} new for {len(fresh)} tickers"
+    )
+    return fresh
+
+
+def _is_newer(published: Optional[str], last: datetime) -> bool:
+    """Sin fecha no se puede filtrar: pasa y lo resuelve el dedupe."""
+    ts = _parse_ts(published)
+    return ts is None or ts > last
+
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    """
+    FMP manda "YYYY-MM-DD HH:MM:SS" sin zona y Supabase lo devuelve como ISO con +00:00:
+    se comparan sin zona para que el valor guardado y el de FMP sean equivalentes.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
@@ -0,0 +1,195 @@
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.fundamentals_store import CACHE_DIR
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join(CACHE_DIR, "prices"))
+# Antigüedad (segundos) a partir de la cual se piden barras nuevas a yfinance.
+PRICE_STORE_MAX_AGE = int(os.getenv("PRICE_STORE_MAX_AGE", str(4 * 3600)))
+# Si la última barra completa guardada difiere más que esto de la recién bajada, hubo un
+# ajuste retroactivo (split) y se vuelve a bajar la historia completa del ticker.
+REWRITE_TOLERANCE = 0.01
+
+# download(symbols, **kwargs) -> cierres (fechas x tickers), ej. DataManager._download_closes
+Downloader = Callable[..., pd.DataFrame]
+
+
+class PriceStore:
+    """
+    Cierres diarios por ticker en disco (un .npz por ticker: fechas + cierres).
+    La primera vez baja la historia completa; después solo agrega barras nuevas,
+    siempre con un único download batch para todos los tickers pendientes.
+    Las descargas no toman el lock de lectura: mientras una corre, los tickers
+    que ya están al día se siguen leyendo sin esperar a la red.
+    """
+
+    def __init__(self, download: Downloader, path: str = PRICE_STORE_DIR, max_age: int = PRICE_STORE_MAX_AGE):
+        self.download = download
+        self.path = path
+        self.max_age = max_age
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._download_lock = threading.Lock()
+        self._series: Dict[str, pd.Series] = {}
+        self._synced_at: Dict[str, float] = {}
+        try:
+            os.makedirs(self.path, exist_ok=True)
+        except OSError as e:
+            self._disable(e)
+
+    def get_closes(self, tickers: Iterable[str], start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """Matriz alineada (fechas x tickers) de cierres entre `start` y `end`, leída del store local."""
+        symbols = sorted({t.strip().upper() for t in tickers if t and t.strip()})
+        if not symbols:
+            return pd.DataFrame()
+
+        self.sync(symbols)
+        with self._lock:
+            series = {s: self._series[s] for s in symbols if not self._series.get(s, _EMPTY).empty}
+        if not series:
+            return pd.DataFrame()
+
+        closes = pd.concat(series, axis=1).sort_index()
+        closes.index.name = "Date"
+        return closes.loc[
+            pd.Timestamp(str(start)[:10]) if start else None: pd.Timestamp(str(end)[:10]) if end else None
+        ]
+
+    def sync(self, symbols: List[str]) -> None:
+        """Trae solo lo que falta: historia completa para tickers nuevos, barras nuevas para el resto."""
+        missing, stale = self._pending(symbols)
+        if not (missing or stale):
+            return
+        with self._download_lock:
+            # Otro thread pudo haber bajado lo mismo mientras se esperaba el lock
+            missing, stale = self._pending(symbols)
+            if stale:
+                missing += self._append(stale)
+            if missing:
+                self._download_full(missing)
+
+    def _pending(self, symbols: List[str]) -> Tuple[List[str], List[str]]:
+        """(sin historia local, con barras vencidas) entre `symbols`."""
+        with self._lock:
+            now = time.time()
+            missing, stale = [], []
+            for symbol in symbols:
+                if symbol not in self._series:
+                    self._load(symbol)
+                if symbol not in self._series:
+                    missing.append(symbol)
+                elif now - self._synced_at[symbol] > self.max_age:
+                    stale.append(symbol)
+            return missing, stale
+
+    # ── Descargas ─────────────────────────────────────────────────────
+
+    def _download_full(self, symbols: List[str]) -> None:
+        closes = self.download(symbols, period="max")
+        if closes.empty:
+            return  # Error de red: se reintenta en la próxima consulta
+        synced_at = time.time()
+        for symbol in symbols:
+            # Sin datos (ticker inválido o deslistado) se guarda vacío para no re-bajarlo
+            self._save(symbol, _column(closes, symbol), synced_at)
+
+    def _append(self, symbols: List[str]) -> List[str]:
+        """
+        Baja desde la anteúltima barra guardada más vieja y agrega lo nuevo.
+        Retorna los que requieren historia completa.
+        """
+        with self._lock:
+            current = {s: self._series[s] for s in symbols if not self._series[s].empty}
+        if not current:
+            return list(symbols)
+
+        # La última barra guardada puede haber sido parcial (intradía): el split se detecta
+        # comparando la anterior, que ya era un cierre completo, y la última se pisa con la nueva
+        reference = {s: series.index[-2] if len(series) > 1 else series.index[-1] for s, series in current.items()}
+        since = min(reference.values())
+        closes = self.download(list(current), start=since.strftime("%Y-%m-%d"))
+        if closes.empty:
+            return [s for s in symbols if s not in current]
+
+        synced_at = time.time()
+        rewrite = [s for s in symbols if s not in current]
+        for symbol, old in current.items():
+            fresh = _column(closes, symbol)
+            day = reference[symbol]
+            if day in fresh.index and abs(fresh[day] / old[day] - 1) > REWRITE_TOLERANCE:
+                rewrite.append(symbol)
+                continue
+            self._save(symbol, fresh.combine_first(old), synced_at)
+        return rewrite
+
+    # ── Persistencia ──────────────────────────────────────────────────
+
+    def _file(self, symbol: str) -> str:
+        return os.path.join(self.path, f"{symbol.replace('/', '_')}.npz")
+
+    def _load(self, symbol: str) -> None:
+        file = self._file(symbol)
+        if not self.enabled or not os.path.exists(file):
+            return
+        try:
+            with np.load(file) as data:
+                dates = data["dates"].astype("datetime64[ns]")
+                self._series[symbol] = pd.Series(data["closes"], index=pd.DatetimeIndex(dates, name="Date"))
+                self._synced_at[symbol] = float(data["synced_at"])
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+            # Archivo truncado o corrupto: se ignora y el ticker se vuelve a bajar completo
+            print(f"Price store: ignoring unreadable {file}: {e}")
+
+    def _save(self, symbol: str, series: pd.Series, synced_at: float) -> None:
+        with self._lock:
+            self._series[symbol] = series
+            self._synced_at[symbol] = synced_at
+        if not self.enabled:
+            return
+        file = self._file(symbol)
+        tmp = None
+        try:
+            # Escritura atómica: temporal propio (el backend y daily_sync pueden compartir
+            # el directorio), fsync y os.replace; un crash nunca deja un .npz a medias.
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix=f".{os.path.basename(file)}.", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    dates=series.index.values.astype("datetime64[D]"),
+                    closes=series.to_numpy(dtype=float),
+                    synced_at=np.float64(synced_at),
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, file)
+        except OSError as e:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            self._disable(e)
+
+    def _disable(self, error: Exception) -> None:
+        """Si el disco no es usable se sigue en memoria (se pierde entre reinicios)."""
+        print(f"Price store disabled ({self.path}): {error}")
+        self.enabled = False
+
+
+_EMPTY = pd.Series(dtype=float)
+
+
+def _column(closes: pd.DataFrame, symbol: str) -> pd.Series:
+    """Cierres de un símbolo sin NaN, con índice de fechas normalizado (sin tz ni hora)."""
+    if symbol not in closes:
+        return pd.Series(dtype=float, index=pd.DatetimeIndex([], name="Date"))
+    series = closes[symbol].dropna().astype(float)
+    index = pd.DatetimeIndex(series.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    series.index = index.normalize().rename("Date")
+    return series[~series.index.duplicated(keep="last")].sort_index()
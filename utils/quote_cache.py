@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+QUOTE_COLUMNS = ["price", "prev_close", "change_pct", "market_cap"]
+
+# TTL (segundos) por campo: el precio cambia intradía, el cierre anterior
+# y el market cap casi no se mueven durante la sesión.
+QUOTE_TTLS = {
+    "price": 60,
+    "change_pct": 60,
+    "prev_close": 6 * 3600,
+    "market_cap": 3600,
+}
+# Ventana extra en la que un valor vencido se sirve igual mientras se refresca en background.
+QUOTE_STALE_GRACE = int(os.getenv("QUOTE_STALE_GRACE", "300"))
+QUOTE_CACHE_MAX_SIZE = int(os.getenv("QUOTE_CACHE_MAX_SIZE", "1000"))
+
+
+class QuoteCache:
+    """
+    Cache LRU en memoria de cotizaciones, con TTL por campo y stale-while-revalidate.
+    Es thread-safe: la comparten todas las sesiones del proceso.
+    """
+
+    def __init__(self, ttls: Dict[str, int] = None, stale_grace: int = QUOTE_STALE_GRACE,
+                 max_size: int = QUOTE_CACHE_MAX_SIZE):
+        self.ttls = ttls or QUOTE_TTLS
+        self.stale_grace = stale_grace
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Tuple[float, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, tickers: List[str], fields: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        """Clasifica tickers en (frescos, vencidos-pero-servibles, faltantes) para los campos pedidos."""
+        fresh, stale, missing = [], [], []
+        now = time.monotonic()
+        with self._lock:
+            for ticker in tickers:
+                entry = self._entries.get(ticker)
+                status = "fresh"
+                for name in fields:
+                    cached = entry.get(name) if entry else None
+                    age = now - cached[1] if cached else None
+                    if age is None or age > self.ttls[name] + self.stale_grace:
+                        status = "missing"
+                        break
+                    if age > self.ttls[name]:
+                        status = "stale"
+
+                if status == "missing":
+                    missing.append(ticker)
+                    self.misses += 1
+                    continue
+
+                self._entries.move_to_end(ticker)
+                if status == "stale":
+                    stale.append(ticker)
+                    self.stale_hits += 1
+                else:
+                    fresh.append(ticker)
+                    self.hits += 1
+        return fresh, stale, missing
+
+    def store(self, quotes: pd.DataFrame) -> None:
+        """Guarda los campos presentes en `quotes` (columnas) con timestamp actual; los NaN se ignoran."""
+        now = time.monotonic()
+        fields = [c for c in quotes.columns if c in self.ttls]
+        with self._lock:
+            for ticker, row in quotes[fields].iterrows():
+                entry = self._entries.setdefault(ticker, {})
+                for name in fields:
+                    # Un NaN es un fetch fallido: no se cachea, así cuenta como miss y se reintenta
+                    if pd.notna(row[name]):
+                        entry[name] = (row[name], now)
+                self._entries.move_to_end(ticker)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def frame(self, tickers: List[str]) -> pd.DataFrame:
+        """Valores cacheados (sin importar su edad) como DataFrame ticker x campo."""
+        with self._lock:
+            rows = {
+                t: {f: v for f, (v, _) in self._entries[t].items()}
+                for t in tickers if t in self._entries
+            }
+        return pd.DataFrame.from_dict(rows, orient="index", columns=QUOTE_COLUMNS, dtype=float)
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de hit/miss para exportar a métricas."""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            }
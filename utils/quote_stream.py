@@ -0,0 +1,97 @@
+import asyncio
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from utils.market_service import MarketDataService
+
+# Un solo ciclo de polling por proceso, compartido por todas las sesiones.
+QUOTE_POLL_INTERVAL = float(os.getenv("QUOTE_POLL_INTERVAL", "60"))
+STREAM_FIELDS = ["price", "prev_close", "change_pct"]
+
+# {ticker: {campo: valor}} con solo los campos que cambiaron
+QuoteChanges = Dict[str, Dict[str, float]]
+
+
+class QuotePoller:
+    """
+    Poller de cotizaciones compartido del backend.
+    Cada suscriptor (una sesión) registra sus tickers; un único timer refresca la
+    unión de todos ellos con un download batch y entrega a cada suscriptor, por su
+    cola, solo los campos que cambiaron de sus tickers.
+    Todo corre en el event loop del backend: no hace falta locking.
+    """
+
+    def __init__(self, market: MarketDataService, interval: float = QUOTE_POLL_INTERVAL):
+        self.market = market
+        self.interval = interval
+        self._subscribers: Dict[str, Tuple[Set[str], asyncio.Queue]] = {}
+        self._last: Dict[str, Dict[str, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, key: str, tickers: Iterable[str]) -> asyncio.Queue:
+        """Registra (o actualiza) los tickers de un suscriptor y retorna su cola de cambios."""
+        tickers = {t.strip().upper() for t in tickers if t and t.strip()}
+        previous, queue = self._subscribers.get(key, (set(), None))
+        if queue is None:
+            queue = asyncio.Queue(maxsize=1)
+        self._subscribers[key] = (tickers, queue)
+
+        # Tickers nuevos para este suscriptor: se le entrega el último valor conocido
+        known = {t: dict(self._last[t]) for t in tickers - previous if t in self._last}
+        if known:
+            _offer(queue, known)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, key: str) -> None:
+        self._subscribers.pop(key, None)
+
+    def tickers(self) -> List[str]:
+        """Unión de los tickers de todos los suscriptores."""
+        return sorted(set().union(*(tickers for tickers, _ in self._subscribers.values())))
+
+    async def _run(self) -> None:
+        # Termina solo cuando no queda nadie suscrito; el próximo subscribe lo relanza.
+        while self._subscribers:
+            tickers = self.tickers()
+            if tickers:
+                try:
+                    quotes = await self.market.refresh_quotes(tickers)
+                    self._publish(quotes)
+                except Exception as e:
+                    print(f"Quote poller error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _publish(self, quotes: pd.DataFrame) -> None:
+        changes: QuoteChanges = {}
+        for ticker, row in quotes.iterrows():
+            last = self._last.setdefault(ticker, {})
+            diff = {
+                field: float(row[field])
+                for field in STREAM_FIELDS
+                if field in row and pd.notna(row[field]) and last.get(field) != float(row[field])
+            }
+            if diff:
+                last.update(diff)
+                changes[ticker] = diff
+
+        if not changes:
+            return
+        for tickers, queue in list(self._subscribers.values()):
+            mine = {t: changes[t] for t in tickers if t in changes}
+            if mine:
+                _offer(queue, mine)
+
+
+def _offer(queue: asyncio.Queue, changes: QuoteChanges) -> None:
+    """Encola sin bloquear; si el suscriptor todavía no consumió lo anterior, se fusiona."""
+    if queue.full():
+        pending = queue.get_nowait()
+        for ticker, fields in changes.items():
+            pending.setdefault(ticker, {}).update(fields)
+        changes = pending
+    queue.put_nowait(changes)
@@ -0,0 +1,221 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from utils.fundamentals_store import FundamentalsStore
+from utils.metrics import metrics
+
+# Clases de prioridad: menor número = se atiende antes.
+INTERACTIVE = 0  # la UI esperando una respuesta
+BATCH = 1        # daily_sync y refrescos de fondo
+
+# Presupuesto de FMP (0 = sin límite). El free tier corta en 250 requests por día.
+# El diario se cuenta en el SQLite de utils/fundamentals_store.py: lo comparten el backend
+# y daily_sync si usan el mismo SMARTFOLIO_CACHE_DIR y sobrevive reinicios. Si corren en
+# máquinas distintas (ej. daily_sync en GitHub Actions), repartir la cuota con FMP_RATE_PER_DAY
+# en cada uno. El límite por minuto y las prioridades son siempre por proceso: un
+# daily_sync en otro proceso no le cede tokens a la UI, solo comparten el contador diario.
+FMP_RATE_PER_MINUTE = int(os.getenv("FMP_RATE_PER_MINUTE", "300"))
+FMP_RATE_PER_DAY = int(os.getenv("FMP_RATE_PER_DAY", "250"))
+# Espera máxima por un token antes de dar el request por perdido (BATCH).
+FMP_QUEUE_TIMEOUT = float(os.getenv("FMP_QUEUE_TIMEOUT", "120"))
+# La UI no espera tanto: pasado este tiempo se sirve lo que haya cacheado.
+FMP_INTERACTIVE_TIMEOUT = float(os.getenv("FMP_INTERACTIVE_TIMEOUT", "5"))
+
+
+class RateLimiter:
+    """
+    Scheduler token-bucket para un upstream con cuota (thread-safe).
+    - Por minuto: bucket de `per_minute` tokens que se rellena de forma continua.
+    - Por día: contador que se reinicia a medianoche UTC; agotado, se rechaza sin esperar.
+      Con `store` el contador es persistente y compartido entre procesos (clave: nombre + día UTC).
+    - Prioridades: mientras haya alguien de mejor clase esperando, los demás no consumen.
+      INTERACTIVE espera a lo sumo `interactive_timeout`; el resto, `timeout`.
+    - Retry-After: `pause()` frena a todos hasta que el upstream vuelva a aceptar requests.
+    El incremento en el store (una escritura SQLite) se hace fuera del lock, para que
+    una escritura lenta no frene a los demás threads que esperan su turno.
+    """
+
+    def __init__(self, per_minute: int, per_day: int, timeout: float = FMP_QUEUE_TIMEOUT,
+                 store: Optional[FundamentalsStore] = None, name: str = "fmp",
+                 interactive_timeout: float = FMP_INTERACTIVE_TIMEOUT):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.timeout = timeout
+        self.interactive_timeout = interactive_timeout
+        self.store = store
+        self.name = name
+        self._cond = threading.Condition()
+        self._tokens = float(per_minute)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._day = _utc_day()
+        self._used_today = 0
+        self._exhausted = False
+        self._queue: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self.granted = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.pauses = 0
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: Optional[float] = None) -> bool:
+        """
+        Bloquea hasta obtener un token respetando la prioridad.
+        Retorna False si se agotó la cuota diaria o venció `timeout` esperando
+        (por defecto el de la clase: corto para INTERACTIVE, largo para BATCH).
+        """
+        if timeout is None:
+            timeout = self.interactive_timeout if priority == INTERACTIVE else self.timeout
+        deadline = time.monotonic() + timeout
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            waited = False
+            try:
+                while True:
+                    if self._day_exhausted():
+                        self.rejected += 1
+                        return False
+                    now = time.monotonic()
+                    delay = self._delay(now)
+                    if self._queue[0] == ticket and delay <= 0:
+                        self._tokens -= 1
+                        if self.store is None:
+                            # Sin store: contador solo de este proceso, se descuenta acá mismo
+                            self._used_today += 1
+                        break
+                    if now >= deadline:
+                        self.rejected += 1
+                        return False
+                    waited = True
+                    # El primero de la cola duerme lo justo; el resto espera a que avance
+                    wait = delay if self._queue[0] == ticket else deadline - now
+                    self._cond.wait(min(wait, deadline - now))
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+        # Token tomado: el contador diario compartido se actualiza ya sin el lock
+        if self.store is not None and not self._consume_day():
+            with self._cond:
+                self._tokens = min(self._tokens + 1, float(self.per_minute))
+                self.rejected += 1
+                self._cond.notify_all()
+            return False
+        with self._cond:
+            self.granted += 1
+            self.throttled += waited
+        return True
+
+    def pause(self, seconds: float) -> None:
+        """El upstream pidió frenar (429 / Retry-After): nadie consume hasta que pase `seconds`."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+            self.pauses += 1
+
+    def exhaust(self) -> None:
+        """El upstream avisó que la cuota diaria se agotó: se rechaza todo hasta el día siguiente."""
+        with self._cond:
+            self._exhausted = True
+            if self.store is not None:
+                self.store.exhaust_quota(self.name, self._day)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        """Uso de la cuota para el dashboard de métricas (-1 = sin límite)."""
+        with self._cond:
+            self._day_exhausted()
+            self._sync_day()
+            self._refill(time.monotonic())
+            remaining = max(self.per_day - self._used_today, 0) if self.per_day else -1
+            return {
+                "budget_per_minute": self.per_minute or -1,
+                "budget_per_day": self.per_day or -1,
+                "used_today": self._used_today,
+                "remaining_today": 0 if self._exhausted else remaining,
+                "tokens_available": round(self._tokens, 2) if self.per_minute else -1,
+                "waiting": len(self._queue),
+                "granted": self.granted,
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+                "pauses": self.pauses,
+            }
+
+    # ── Internos (con el lock tomado) ─────────────────────────────────
+
+    def _day_exhausted(self) -> bool:
+        today = _utc_day()
+        if today != self._day:
+            self._day, self._used_today, self._exhausted = today, 0, False
+        return self._exhausted or bool(self.per_day and self._used_today >= self.per_day)
+
+    def _consume_day(self) -> bool:
+        """
+        Descuenta un request del contador diario del store; False si otro proceso lo agotó.
+        Se llama sin el lock: solo lo toma para actualizar el estado local con el resultado.
+        """
+        used = self.store.consume_quota(self.name, self._day, self.per_day)
+        with self._cond:
+            if used is None:
+                # Store no usable (disco): contador solo de este proceso
+                self._used_today += 1
+                return True
+            if used < 0:
+                self._exhausted = True
+                self._cond.notify_all()
+                return False
+            self._used_today = max(self._used_today, used)
+            return True
+
+    def _sync_day(self) -> None:
+        """Trae el uso del día desde el store (incluye lo que gastaron otros procesos)."""
+        usage = self.store.quota_usage(self.name, self._day) if self.store is not None else None
+        if usage is not None:
+            self._used_today, exhausted = usage
+            self._exhausted = self._exhausted or exhausted
+
+    def _refill(self, now: float) -> None:
+        if self.per_minute:
+            elapsed = now - self._refilled
+            self._tokens = min(float(self.per_minute), self._tokens + elapsed * self.per_minute / 60)
+        self._refilled = now
+
+    def _delay(self, now: float) -> float:
+        """Segundos hasta que se pueda consumir un token (<= 0: ya)."""
+        self._refill(now)
+        delay = self._paused_until - now
+        if self.per_minute and self._tokens < 1:
+            delay = max(delay, (1 - self._tokens) * 60 / self.per_minute)
+        return delay
+
+
+def retry_after(headers: Dict[str, str]) -> Optional[float]:
+    """Segundos del header Retry-After (número o fecha HTTP); None si no viene o no se entiende."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _utc_day() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+# Una cuota por API key: compartida por todos los DataManager del proceso (y el día, entre procesos).
+fmp_limiter = RateLimiter(FMP_RATE_PER_MINUTE, FMP_RATE_PER_DAY, store=FundamentalsStore())
+metrics.register_collector("fmp_quota", fmp_limiter.stats)
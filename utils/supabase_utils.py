@@ -0,0 +1,33 @@
+from typing import Any, Callable, Dict, List
+
+from utils.concurrency import upstream_slot
+from utils.metrics import span
+
+# PostgREST corta las respuestas en 1000 filas por defecto
+PAGE_SIZE = 1000
+
+
+def execute(query: Any, operation: str) -> Any:
+    """
+    Ejecuta un query builder de Supabase con slot de concurrencia y span de métricas.
+    `operation` identifica la query en las métricas (ej. "assets.update").
+    """
+    with upstream_slot("supabase"), span("supabase", operation):
+        return query.execute()
+
+
+def fetch_all(build_query: Callable, page_size: int = PAGE_SIZE, operation: str = "select") -> List[Dict]:
+    """
+    Lee todas las filas de una query paginando con range().
+    `build_query` debe devolver un query builder nuevo en cada llamada
+    (ej. lambda: supabase.table("x").select("a,b").order("date")).
+    Cada página se registra en las métricas como `operation`.
+    """
+    rows: List[Dict] = []
+    offset = 0
+    while True:
+        page = execute(build_query().range(offset, offset + page_size - 1), operation).data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        offset += page_size
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import metrics
+
+# Pool por host: alcanza para los workers del sync y del backend sin abrir conexiones de más.
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+# (connect, read): fallar rápido si el host no responde, pero darle tiempo a respuestas grandes.
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+# Respuestas con ETag/Last-Modified que se guardan para revalidar (cantidad y tamaño máximo).
+REVALIDATE_CACHE_SIZE = int(os.getenv("REVALIDATE_CACHE_SIZE", "256"))
+REVALIDATE_MAX_BYTES = int(os.getenv("REVALIDATE_MAX_BYTES", str(5 * 1024 * 1024)))
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "SmartFolio/1.0",
+}
+
+
+class Transport:
+    """
+    Cliente HTTP compartido del proceso para los upstreams propios (FMP, Telegram).
+    - Un requests.Session con pool de conexiones keep-alive dimensionado.
+    - gzip y timeouts separados de conexión / lectura.
+    - GET con revalidación: si el upstream mandó ETag o Last-Modified, el próximo
+      GET es condicional y un 304 devuelve la respuesta guardada sin re-descargarla.
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE,
+                 timeout: Tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._validated: "OrderedDict[str, requests.Response]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+
+    def get(self, url: str, params: dict = None, timeout=None, revalidate: bool = True, **kwargs) -> requests.Response:
+        """GET por el pool; con `revalidate` usa ETag/Last-Modified de la respuesta anterior."""
+        key = _cache_key(url, params)
+        cached = self._cached(key) if revalidate else None
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            if cached.headers.get("ETag"):
+                headers["If-None-Match"] = cached.headers["ETag"]
+            if cached.headers.get("Last-Modified"):
+                headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+        response = self.session.get(url, params=params, headers=headers, timeout=timeout or self.timeout, **kwargs)
+        with self._lock:
+            self.requests += 1
+            if response.status_code == 304 and cached is not None:
+                self.not_modified += 1
+                self._validated.move_to_end(key)
+                return cached
+        if revalidate:
+            self._remember(key, response)
+        return response
+
+    def post(self, url: str, timeout=None, **kwargs) -> requests.Response:
+        with self._lock:
+            self.requests += 1
+        return self.session.post(url, timeout=timeout or self.timeout, **kwargs)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "not_modified": self.not_modified,
+                "revalidation_entries": len(self._validated),
+            }
+
+    def _cached(self, key: str) -> Optional[requests.Response]:
+        with self._lock:
+            return self._validated.get(key)
+
+    def _remember(self, key: str, response: requests.Response) -> None:
+        """Guarda respuestas 200 revalidables (con ETag o Last-Modified) y no demasiado grandes."""
+        if response.status_code != 200:
+            return
+        if not (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            return
+        if len(response.content) > REVALIDATE_MAX_BYTES:
+            return
+        with self._lock:
+            self._validated[key] = response
+            self._validated.move_to_end(key)
+            while len(self._validated) > REVALIDATE_CACHE_SIZE:
+                self._validated.popitem(last=False)
+
+
+def _cache_key(url: str, params: Optional[dict]) -> str:
+    clean = {k: v for k, v in (params or {}).items() if k != "apikey"}
+    return f"{url}?{json.dumps(clean, sort_keys=True, default=str)}"
+
+
+# Una sola instancia por proceso: todas las llamadas comparten pool y revalidación.
+transport = Transport()
+metrics.register_collector("http_transport", transport.stats)